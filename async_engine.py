@@ -0,0 +1,225 @@
+"""Asyncio send engine.
+
+:class:`AsyncEngine` runs a bulk send as stages connected by bounded queues, each
+stage working on a different chunk at the same time:
+
+- build: pulls the next chunk from the source iterator, which reads the rows and
+  builds the output dicts, on a reader thread;
+- submit: sends the chunks one after the other on the wallet thread (the outputs of
+  one account are spent serially), holding one of ``window`` slots per chunk;
+- confirm: a :class:`~confirmation.ConfirmationTracker` polls, reattaches and
+  promotes the blocks and hands the results back to the event loop;
+- record: passes confirmed and failed chunks to the callbacks, which write the
+  ledger and the journal, on a recorder thread.
+
+The blocking wallet, node and file calls run in those threads so the event loop
+only moves chunks between stages. A full queue, or no free slot, makes the stage
+before it wait: a slow node slows down reading instead of piling chunks up in memory.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from confirmation import INCLUDED, ConfirmationTracker
+
+logger = logging.getLogger(__name__)
+
+
+class EngineChunk:
+    """A chunk of outputs going through the engine.
+
+    ``block_id`` is set for a chunk sent by an earlier run, which is only tracked;
+    ``context`` is left to the callbacks.
+    """
+
+    def __init__(self, key, outputs, options=None, block_id=None, context=None):
+        self.key = key
+        self.outputs = outputs
+        self.options = options
+        self.block_id = block_id
+        self.context = context
+        self.transaction = None
+        self.state = None
+        self.submitted_at = None
+
+
+class AsyncEngine:
+    """Send chunks through the build, submit, confirm and record stages.
+
+    ``before_send(chunk)`` is called right before a chunk is sent and
+    ``on_submitted(chunk)`` once its transaction is known; ``on_confirmed(chunk)``
+    and ``on_failed(chunk, state)`` when it is settled. A chunk that got a block ID
+    is always settled by the confirmation of its block, even if an error stopped
+    the engine after it was sent; ``on_failed`` gets the error message as ``state``
+    only for chunks that were not sent. All of them run on the
+    recorder thread, one at a time. Extra keyword arguments configure the
+    :class:`~confirmation.ConfirmationTracker`.
+    """
+
+    def __init__(
+        self,
+        account,
+        client,
+        on_confirmed,
+        on_failed=None,
+        before_send=None,
+        on_submitted=None,
+        window=8,
+        queue_size=4,
+        **tracker_options,
+    ):
+        self.account = account
+        self.client = client
+        self.on_confirmed = on_confirmed
+        self.on_failed = on_failed
+        self.before_send = before_send
+        self.on_submitted = on_submitted
+        self.window = max(1, int(window))
+        self.queue_size = max(1, int(queue_size))
+        tracker_options.setdefault("workers", min(self.window, 8))
+        self.tracker_options = tracker_options
+        self.confirmed = 0
+        self.failed = 0
+        self._error = None
+
+    def run(self, chunks):
+        """Send every :class:`EngineChunk` of ``chunks`` and wait until all are settled.
+
+        Stops submitting at the first error, waits for the chunks in flight and
+        raises it.
+        """
+        asyncio.run(self.run_async(chunks))
+
+    async def run_async(self, chunks):
+        self._loop = asyncio.get_running_loop()
+        self._built = asyncio.Queue(self.queue_size)
+        self._settled = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.window)
+        self._reader = ThreadPoolExecutor(1, "engine-reader")
+        self._wallet = ThreadPoolExecutor(1, "engine-wallet")
+        self._recorder = ThreadPoolExecutor(1, "engine-recorder")
+        self._tracker = ConfirmationTracker(
+            self.client, self._tracked, self._tracked, **self.tracker_options
+        )
+        try:
+            await asyncio.gather(
+                self._build(iter(chunks)), self._submit(), self._record()
+            )
+        finally:
+            self._tracker.close()
+            for executor in (self._reader, self._wallet, self._recorder):
+                executor.shutdown()
+        logger.info(
+            f"Engine done: {self.confirmed} chunks confirmed, {self.failed} failed"
+        )
+        if self._error is not None:
+            raise self._error
+
+    async def _call(self, executor, function, *args):
+        return await self._loop.run_in_executor(executor, function, *args)
+
+    async def _build(self, chunks):
+        try:
+            while self._error is None:
+                chunk = await self._call(self._reader, next, chunks, None)
+                if chunk is None:
+                    break
+                await self._built.put(chunk)
+        except Exception as e:
+            logger.exception("Reading the chunks failed")
+            if self._error is None:
+                self._error = e
+        await self._built.put(None)
+
+    async def _submit(self):
+        while True:
+            chunk = await self._built.get()
+            if chunk is None:
+                break
+            if self._error is None:
+                await self._slots.acquire()
+                if self._error is None:
+                    await self._start(chunk)
+                    continue
+                self._slots.release()
+            # After an error the chunks already built are dropped
+
+        # Every slot back means every chunk in flight has been recorded
+        for _ in range(self.window):
+            await self._slots.acquire()
+        await self._settled.put(None)
+
+    async def _start(self, chunk):
+        try:
+            if chunk.block_id is None:
+                await self._send(chunk)
+            else:
+                logger.info(
+                    f"Chunk {chunk.key} was already sent in block {chunk.block_id}"
+                )
+        except Exception as e:
+            self._error = e
+            if chunk.block_id is None:
+                logger.error(f"Chunk {chunk.key} could not be sent: {e}")
+                await self._settle(chunk, self.on_failed, chunk, str(e))
+                self._slots.release()
+                return
+            # The node accepted the block, only its confirmation can settle the chunk
+            logger.error(f"Chunk {chunk.key} was sent but failed afterwards: {e}")
+        chunk.submitted_at = time.monotonic()
+        self._tracker.track(chunk.block_id, chunk)
+
+    async def _send(self, chunk):
+        if self.before_send is not None:
+            await self._call(self._recorder, self.before_send, chunk)
+        if chunk.options is None:
+            chunk.transaction = await self._call(
+                self._wallet, self.account.send_amount, chunk.outputs
+            )
+        else:
+            chunk.transaction = await self._call(
+                self._wallet, self.account.send_amount, chunk.outputs, chunk.options
+            )
+        chunk.block_id = chunk.transaction["blockId"]
+        logger.info(f"Chunk {chunk.key} sent in block {chunk.block_id}")
+        if self.on_submitted is not None:
+            await self._call(self._recorder, self.on_submitted, chunk)
+
+    def _tracked(self, tracked):
+        # Called on a tracker thread
+        self._loop.call_soon_threadsafe(self._settled.put_nowait, tracked)
+
+    async def _record(self):
+        while True:
+            tracked = await self._settled.get()
+            if tracked is None:
+                return
+            chunk = tracked.context
+            # The transaction may have been included through a reattached block
+            chunk.block_id = tracked.block_id
+            chunk.state = tracked.state
+            elapsed = time.monotonic() - chunk.submitted_at
+            if tracked.state == INCLUDED:
+                logger.info(f"Chunk {chunk.key} confirmed after {elapsed:.1f}s")
+                await self._settle(chunk, self.on_confirmed, chunk)
+            else:
+                logger.error(
+                    f"Chunk {chunk.key} in block {chunk.block_id} is {tracked.state}"
+                )
+                await self._settle(chunk, self.on_failed, chunk, tracked.state)
+            self._slots.release()
+
+    async def _settle(self, chunk, callback, *args):
+        if callback is self.on_confirmed:
+            self.confirmed += 1
+        else:
+            self.failed += 1
+        if callback is None:
+            return
+        try:
+            await self._call(self._recorder, callback, *args)
+        except Exception as e:
+            logger.exception(f"Callback for chunk {chunk.key} failed")
+            if self._error is None:
+                self._error = e
@@ -0,0 +1,145 @@
+"""Where the wallet and the node clients of a run come from.
+
+The scripts only use a few operations of them: validating addresses, syncing the
+account and reading its balance, ``send_amount``, ``pending_transactions`` and
+``get_block_metadata``. A backend builds the objects offering those operations:
+
+- ``iota``: the ``iota_client`` / ``iota_wallet`` bindings with a Stronghold secret
+  manager, talking to a real network;
+- ``mock``: the in-process node of :mod:`mock_node`, with configurable latency,
+  confirmation delay, failure rates and UTXO bookkeeping, to load-test a run
+  without funds or network.
+
+``SHIMMER_BACKEND`` selects it and ``SHIMMER_MOCK_OPTIONS`` configures the mock
+node, e.g. ``confirmation_delay=0.5,send_latency=0.05,output_count=16``.
+"""
+import os
+
+from mock_node import MockAccount, MockNode, MockReplica, MockWallet
+from shimmer_address import validate_addresses
+
+IOTA = "iota"
+MOCK = "mock"
+
+
+class IotaBackend:
+    """The real wallet and node clients; the bindings are imported on first use."""
+
+    name = IOTA
+
+    def client(self, client_options):
+        from iota_client import IotaClient
+
+        return IotaClient(client_options)
+
+    def secret_manager(self, db_name, password):
+        from iota_wallet import StrongholdSecretManager
+
+        return StrongholdSecretManager(db_name, password)
+
+    def wallet(self, db_name, client_options, coin_type, secret_manager):
+        from iota_wallet import IotaWallet
+
+        return IotaWallet(db_name, client_options, coin_type, secret_manager)
+
+    def validate_addresses(self, addresses, hrp=None, cache=None):
+        return validate_addresses(addresses, hrp, cache)
+
+
+class MockBackend(IotaBackend):
+    """An in-process mock node shared by every client and wallet of the backend.
+
+    The mock is deterministic for a given ``seed``: the conflicting blocks, the
+    failed requests and the rejected sends are drawn from seeded generators.
+    """
+
+    name = MOCK
+    OPTIONS = {
+        "confirmation_delay": 0.5,
+        "conflict_rate": 0.0,
+        "node_latency": 0.0,
+        "node_failure_rate": 0.0,
+        "send_latency": 0.05,
+        "send_failure_rate": 0.0,
+        "sync_latency": 0.0,
+        "unlock_latency": 0.0,
+        "output_count": 16,
+        "output_amount": 10**12,
+        "seed": 0,
+    }
+
+    def __init__(self, **options):
+        unknown = set(options) - set(self.OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown mock node options: {', '.join(sorted(unknown))}")
+        self.options = dict(self.OPTIONS, **options)
+        self.node = MockNode(
+            confirmation_delay=self.options["confirmation_delay"],
+            conflict_rate=self.options["conflict_rate"],
+            seed=self.options["seed"],
+        )
+        self.account = MockAccount(
+            self.node,
+            output_count=int(self.options["output_count"]),
+            output_amount=int(self.options["output_amount"]),
+            send_latency=self.options["send_latency"],
+            sync_latency=self.options["sync_latency"],
+            send_failure_rate=self.options["send_failure_rate"],
+            seed=self.options["seed"],
+        )
+        self.replicas = []
+        self._wallet = None
+
+    def client(self, client_options):
+        """Return a replica of the mock node with its own latency and failures."""
+        replica = MockReplica(
+            self.node,
+            latency=self.options["node_latency"],
+            failure_rate=self.options["node_failure_rate"],
+            seed=self.options["seed"] + len(self.replicas),
+        )
+        self.replicas.append(replica)
+        return replica
+
+    def secret_manager(self, db_name, password):
+        return None
+
+    def wallet(self, db_name, client_options, coin_type, secret_manager):
+        """Return the mock wallet, the same one on every call like the wallet database."""
+        if self._wallet is None:
+            self._wallet = MockWallet(
+                self.account, unlock_latency=self.options["unlock_latency"]
+            )
+        return self._wallet
+
+
+def parse_options(text):
+    """Parse ``key=value,key=value`` into a dict of numbers."""
+    options = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"Expected key=value, got {item.strip()!r}")
+        value = value.strip()
+        try:
+            options[key.strip()] = int(value)
+        except ValueError:
+            options[key.strip()] = float(value)
+    return options
+
+
+def get_backend(name=None, options=None):
+    """Return the backend ``name``, ``SHIMMER_BACKEND`` (``iota`` by default) if None.
+
+    ``options`` configures the mock backend, ``SHIMMER_MOCK_OPTIONS`` if None.
+    """
+    name = (name or os.getenv("SHIMMER_BACKEND") or IOTA).strip().lower()
+    if name == IOTA:
+        return IotaBackend()
+    if name == MOCK:
+        if options is None:
+            options = parse_options(os.getenv("SHIMMER_MOCK_OPTIONS"))
+        return MockBackend(**options)
+    raise ValueError(f"Unknown backend {name!r}, use {IOTA} or {MOCK}")
@@ -0,0 +1,58 @@
+"""Speed of the offline address validator on a synthetic column of addresses.
+
+Usage: python bench/bench_address.py [--rows 1000000] [--invalid 0.01]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from shimmer_address import (  # noqa: E402
+    CHARSET,
+    encode,
+    validate_address,
+    validate_addresses,
+)
+
+
+def make_addresses(rows, invalid):
+    rng = random.Random(0)
+    addresses = []
+    for _ in range(rows):
+        address = encode("smr", bytes([0]) + rng.randbytes(32))
+        if rng.random() < invalid:
+            characters = list(address)
+            characters[rng.randrange(4, len(address))] = rng.choice(CHARSET)
+            address = "".join(characters)
+        addresses.append(address)
+    return addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--invalid", type=float, default=0.01)
+    parser.add_argument("--scalar-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    addresses = make_addresses(args.rows, args.invalid)
+
+    start = time.perf_counter()
+    reasons = validate_addresses(addresses)
+    batch = time.perf_counter() - start
+    invalid = sum(reason is not None for reason in reasons)
+    print(f"batch:  {args.rows} addresses in {batch:.2f}s, {invalid} invalid")
+
+    sample = addresses[: args.scalar_rows]
+    start = time.perf_counter()
+    for address in sample:
+        validate_address(address)
+    scalar = (time.perf_counter() - start) / len(sample) * args.rows
+    print(f"scalar: {args.rows} addresses in {scalar:.2f}s (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
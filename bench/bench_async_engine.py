@@ -0,0 +1,132 @@
+"""End-to-end run of a recipients file with the sequential loop vs the async engine.
+
+Both read and validate a ``--recipients`` row CSV file, open a wallet session on the
+mock node, send chunks of 127 outputs, wait for their confirmation and write the
+sent-to ledger. The sequential run does one step after the other as
+``send_to_csv_array.py`` does without ``--window``; the async run opens the wallet
+while the file is read and then goes through :class:`async_engine.AsyncEngine`.
+
+Usage: python bench/bench_async_engine.py [--recipients 10000] [--window 8]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import write_recipients  # noqa: E402
+
+from async_engine import AsyncEngine, EngineChunk  # noqa: E402
+from confirmation import INCLUDED, ConfirmationTracker  # noqa: E402
+from ledger import LedgerWriter  # noqa: E402
+from mock_node import MockAccount, MockNode, MockWallet  # noqa: E402
+from recipients import load_recipients  # noqa: E402
+from shimmer_address import validate_addresses  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+CHUNK_SIZE = 127
+AMOUNT = 1_000_000
+
+
+def open_session(args):
+    node = MockNode(confirmation_delay=args.confirmation_delay)
+    account = MockAccount(node, output_count=32, send_latency=args.send_latency)
+    wallet = MockWallet(account, unlock_latency=args.unlock_latency)
+    return node, WalletSession(wallet, "bench", "password").open()
+
+
+def load(filename):
+    table, validation = load_recipients(
+        filename, lambda addresses: validate_addresses(addresses), AMOUNT
+    )
+    assert validation.is_valid
+    return table
+
+
+def run_sequential(args, filename, ledger_filename):
+    table = load(filename)
+    node, session = open_session(args)
+    tracker_options = {"min_interval": args.min_interval, "max_interval": 0.5}
+    with ConfirmationTracker(node, **tracker_options) as tracker, LedgerWriter(
+        ledger_filename
+    ) as ledger:
+        for _, start, stop in table.chunk_bounds(CHUNK_SIZE):
+            outputs = table.outputs(start, stop)
+            transaction = session.send_amount(outputs)
+            tracked = tracker.track(transaction["blockId"])
+            assert tracked.wait() == INCLUDED
+            session.confirmed(transaction)
+            ledger.write_chunk(outputs, tracked.block_id)
+    return len(table)
+
+
+def run_async(args, filename, ledger_filename):
+    async def prepare():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            loop.run_in_executor(None, load, filename),
+            loop.run_in_executor(None, open_session, args),
+        )
+
+    table, (node, session) = asyncio.run(prepare())
+
+    def chunks():
+        for index, start, stop in table.chunk_bounds(CHUNK_SIZE):
+            yield EngineChunk(index, table.outputs(start, stop))
+
+    with LedgerWriter(ledger_filename) as ledger:
+
+        def on_confirmed(chunk):
+            session.confirmed(chunk.transaction)
+            ledger.write_chunk(chunk.outputs, chunk.block_id)
+
+        engine = AsyncEngine(
+            session,
+            node,
+            on_confirmed,
+            window=args.window,
+            min_interval=args.min_interval,
+            max_interval=0.5,
+        )
+        engine.run(chunks())
+        assert engine.failed == 0
+    return len(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipients", type=int, default=10_000)
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--confirmation-delay", type=float, default=0.5)
+    parser.add_argument("--send-latency", type=float, default=0.05)
+    parser.add_argument("--unlock-latency", type=float, default=0.5)
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "recipients.csv")
+        write_recipients(filename, args.recipients)
+        print(
+            f"{args.recipients} recipients, {args.confirmation_delay}s to confirm, "
+            f"{args.send_latency}s per send"
+        )
+        results = {}
+        for name, run in (("sequential", run_sequential), ("async", run_async)):
+            ledger_filename = os.path.join(directory, f"sent-{name}.csv")
+            start = time.perf_counter()
+            count = run(args, filename, ledger_filename)
+            results[name] = time.perf_counter() - start
+            print(
+                f"{name:>10}: {results[name]:6.2f}s, "
+                f"{count / results[name]:7.0f} recipients/s"
+            )
+        print(f"speedup: {results['sequential'] / results['async']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
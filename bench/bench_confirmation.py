@@ -0,0 +1,73 @@
+"""Fixed vs adaptive confirmation polling against the local mock node.
+
+Every block gets a scripted inclusion latency (log-normal around ``--median-latency``
+seconds). All durations are multiplied by ``--scale`` so that the run is quick; the
+results are reported back in unscaled seconds.
+
+Usage: python bench/bench_confirmation.py [--blocks 200] [--scale 0.02]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from confirmation import ConfirmationTracker  # noqa: E402
+from mock_node import MockNode  # noqa: E402
+
+
+def scripted_latencies(blocks, median, seed):
+    rng = random.Random(seed)
+    return [median * rng.lognormvariate(0, 0.5) for _ in range(blocks)]
+
+
+def run(latencies, scale, **options):
+    node = MockNode(confirmation_delay=lambda index: latencies[index] * scale)
+    with ConfirmationTracker(node, workers=16, **options) as tracker:
+        tracked = [tracker.track(node.submit({})) for _ in latencies]
+        for block in tracked:
+            block.wait()
+    detect = [(block.detected_at - block.tracked_at) / scale for block in tracked]
+    lag = [
+        (block.detected_at - node.included_at(block.block_id)) / scale
+        for block in tracked
+    ]
+    polls = node.metadata_calls / len(tracked)
+    return statistics.median(detect), statistics.median(lag), max(lag), polls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--median-latency", type=float, default=6.0)
+    parser.add_argument("--scale", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    latencies = scripted_latencies(args.blocks, args.median_latency, args.seed)
+    scale = args.scale
+    cases = [
+        ("fixed 10s", dict(min_interval=10 * scale, backoff=1, jitter=0)),
+        (
+            "adaptive",
+            dict(min_interval=0.5 * scale, max_interval=5 * scale, backoff=2),
+        ),
+    ]
+
+    print(
+        f"{args.blocks} blocks tracked at once, "
+        f"median inclusion latency {statistics.median(latencies):.1f}s"
+    )
+    print(
+        f"{'polling':>10} {'detect p50':>11} {'lag p50':>8} "
+        f"{'lag max':>8} {'polls/block':>12}"
+    )
+    for name, options in cases:
+        detect, lag, worst, polls = run(latencies, scale, **options)
+        print(f"{name:>10} {detect:>10.1f}s {lag:>7.1f}s {worst:>7.1f}s {polls:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Pre-flight consolidation of an account holding thousands of dust outputs.
+
+Plans a job against a mock account whose balance is spread over ``--outputs`` small
+outputs, runs the consolidation stage and reports the rounds it took and the inputs
+per chunk before and after.
+
+Usage: python bench/bench_consolidation.py [--outputs 5000] [--chunks 40]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from confirmation import ConfirmationTracker  # noqa: E402
+from consolidation import Consolidator, assess  # noqa: E402
+from mock_node import MockAccount, MockNode, MockWallet  # noqa: E402
+from planner import MAX_CHUNK_SIZE, build_plan  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+AMOUNT = 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--outputs", type=int, default=5000)
+    parser.add_argument("--output-amount", type=int, default=50_000)
+    parser.add_argument("--chunks", type=int, default=1)
+    parser.add_argument("--confirmation-delay", type=float, default=0.02)
+    parser.add_argument("--parallel", type=int, default=8)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    node = MockNode(confirmation_delay=args.confirmation_delay)
+    account = MockAccount(
+        node,
+        output_count=args.outputs,
+        output_amount=args.output_amount,
+        send_latency=0.001,
+    )
+    session = WalletSession(MockWallet(account), "bench", "password").open()
+    chunks = [
+        (index, 0, 0, [AMOUNT] * MAX_CHUNK_SIZE, None) for index in range(args.chunks)
+    ]
+
+    def replan():
+        return build_plan(chunks, session.unspent.values())
+
+    plan = replan()
+    before = assess(plan)
+    print(
+        f"{args.outputs} outputs of {args.output_amount} glow, {args.chunks} chunks "
+        f"of {MAX_CHUNK_SIZE} x {AMOUNT} glow"
+    )
+    print(f"before: {before.max_inputs} inputs for the largest chunk ({before.reason})")
+
+    with ConfirmationTracker(node, min_interval=0.01, max_interval=0.05) as tracker:
+        consolidator = Consolidator(
+            session,
+            tracker,
+            replan,
+            parallel=args.parallel,
+        )
+        start = time.perf_counter()
+        plan = consolidator.run(plan)
+        elapsed = time.perf_counter() - start
+
+    after = assess(plan)
+    print(
+        f"after: {after.max_inputs} inputs for the largest chunk, "
+        f"{len(session.unspent)} outputs left"
+    )
+    print(
+        f"{consolidator.rounds} rounds, {consolidator.transactions} "
+        f"consolidation transactions in {elapsed:.2f}s, "
+        f"{len(plan.chunks)}/{args.chunks} chunks covered"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Deduplication of a large recipients table against a sent-to ledger.
+
+Builds a table of ``--rows`` recipients where ``--duplicates`` of the rows repeat an
+earlier address and ``--sent`` of the addresses are already in the ledger, then times
+reading the ledger and each duplicate policy.
+
+Usage: python bench/bench_dedup.py [--rows 1000000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dedup import KEEP_FIRST, SKIP, SUM, deduplicate  # noqa: E402
+from ledger import LedgerWriter, read_sent_addresses  # noqa: E402
+from recipients import RecipientTable  # noqa: E402
+
+
+def make_table(rows, duplicates, seed=0):
+    rng = np.random.default_rng(seed)
+    unique = rows - int(rows * duplicates)
+    addresses = [f"smr1q{i:058d}" for i in range(unique)]
+    addresses += [addresses[i] for i in rng.integers(0, unique, rows - unique)]
+    order = rng.permutation(rows)
+    return RecipientTable(
+        np.arange(1, rows + 1, dtype=np.int64),
+        np.array(addresses, dtype="S")[order],
+        np.full(rows, 1_000_000, dtype=np.int64),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--duplicates", type=float, default=0.05)
+    parser.add_argument("--sent", type=float, default=0.1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    table = make_table(args.rows, args.duplicates)
+    sent_count = int(args.rows * args.sent)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "sent.csv")
+        with LedgerWriter(filename) as ledger:
+            outputs = [
+                {"address": address.decode(), "amount": "1000000"}
+                for address in table.addresses[:sent_count].tolist()
+            ]
+            ledger.write_chunk(outputs, "0x" + "0" * 64)
+
+        start = time.perf_counter()
+        sent = read_sent_addresses(filename)
+        print(
+            f"read ledger of {len(sent)} addresses: "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+    for policy in (KEEP_FIRST, SUM):
+        start = time.perf_counter()
+        result, report = deduplicate(table, policy, sent, SKIP)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{policy:>10}: {elapsed:.2f}s, {args.rows / elapsed:,.0f} rows/s, "
+            f"{len(result)} recipients left ({report.summary()})"
+        )
+
+
+if __name__ == "__main__":
+    main()
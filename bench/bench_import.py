@@ -0,0 +1,103 @@
+"""Start-up cost of the scripts, as run from cron or CI for every list pre-check.
+
+Runs each script in a fresh interpreter ``--runs`` times, in an empty directory,
+and reports the median time of importing it and of ``--help`` where it has one, then of a
+``--validate-only`` run of ``send_to_csv_array.py`` on a ``--recipients`` row
+file. Also checks that importing loads neither pandas nor the wallet bindings and
+leaves no ``app.log`` behind.
+
+Usage: python bench/bench_import.py [--runs 10] [--recipients 10000]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import write_recipients  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS = ["compare_crew3", "send_to_csv", "send_to_csv_array"]
+ARGPARSE_SCRIPTS = ["send_to_csv", "send_to_csv_array"]
+HEAVY_MODULES = ["pandas", "iota_client", "iota_wallet"]
+
+
+def timed(command, directory, env=None):
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=directory, env=env, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, result
+
+
+def median_time(command, directory, runs, env=None):
+    times = []
+    for _ in range(runs):
+        elapsed, result = timed(command, directory, env)
+        times.append(elapsed)
+    return statistics.median(times), result
+
+
+def import_command(module):
+    code = (
+        f"import sys; sys.path.insert(0, {ROOT!r}); import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    return [sys.executable, "-c", code]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--recipients", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline, _ = median_time([sys.executable, "-c", "pass"], directory, args.runs)
+        print(f"python startup: {baseline * 1000:.0f} ms, median of {args.runs} runs")
+        print(f"{'script':>17} {'import ms':>10} {'--help ms':>10}  heavy modules")
+        for script in SCRIPTS:
+            imported, result = median_time(import_command(script), directory, args.runs)
+            assert result.returncode == 0, result.stderr
+            assert not os.path.exists(os.path.join(directory, "app.log"))
+            heavy = result.stdout.strip() or "none"
+            helped = "-"
+            if script in ARGPARSE_SCRIPTS:
+                elapsed, _ = median_time(
+                    [sys.executable, os.path.join(ROOT, f"{script}.py"), "--help"],
+                    directory,
+                    args.runs,
+                )
+                helped = f"{elapsed * 1000:.0f}"
+            print(f"{script:>17} {imported * 1000:>10.0f} {helped:>10}  {heavy}")
+
+        filename = os.path.join(directory, "recipients.csv")
+        write_recipients(filename, args.recipients)
+        env = dict(
+            os.environ,
+            SHIMMER_SMR_TOKEN_AMOUNT="1000000",
+            SHIMMER_ADDRESS_READ_FROM_FILENAME=filename,
+            SHIMMER_ADDRESS_SENT_TO_FILENAME=os.path.join(directory, "sent.csv"),
+        )
+        for name in ("STRONGHOLD_PASSWORD", "STRONGHOLD_DB_NAME", "SHIMMER_BACKEND"):
+            env.pop(name, None)
+        validated, result = median_time(
+            [sys.executable, os.path.join(ROOT, "send_to_csv_array.py")]
+            + ["--validate-only"],
+            directory,
+            args.runs,
+            env,
+        )
+        assert result.returncode == 0, result.stderr
+        print(
+            f"--validate-only of {args.recipients} recipients, without Stronghold: "
+            f"{validated * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
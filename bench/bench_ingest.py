@@ -0,0 +1,99 @@
+"""Memory and time of the legacy and streamed ingestion of a recipients file.
+
+A synthetic file with ``--rows`` recipients is generated in a temporary directory.
+Address validation is replaced by a cheap stand-in so that only the ingestion
+itself is measured.
+
+Usage: python bench/bench_ingest.py [--rows 1000000]
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recipients import load_recipients  # noqa: E402
+
+CHUNK_SIZE = 127
+ADDRESS = "smr1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32kt350w"
+
+
+def is_address_valid(address):
+    return address.startswith("smr1")
+
+
+def validate_addresses(addresses):
+    return [None if is_address_valid(a) else "invalid" for a in addresses]
+
+
+def write_file(filename, rows):
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Name", "answer", "amount"])
+        writer.writerows([f"user{i}", ADDRESS, 1000000 + i % 7] for i in range(rows))
+
+
+def legacy(filename):
+    """The read / splitlines / re-parse sequence send_to_list() used to run."""
+    with open(filename, encoding="UTF8") as file:
+        csv_content = file.read()
+    invalid_rows = []
+    csv_reader = csv.reader(csv_content.splitlines())
+    next(csv_reader)
+    for row in csv_reader:
+        if not is_address_valid(str(row[1])):
+            invalid_rows.append(str(row[1]))
+    chunks = 0
+    with open(filename, encoding="UTF8") as file:
+        while True:
+            rows = list(itertools.islice(csv.reader(file), CHUNK_SIZE))
+            if not rows:
+                break
+            [{"address": str(row[1]), "amount": "1000000"} for row in rows]
+            chunks += 1
+    return chunks
+
+
+def streamed(filename):
+    """A validation pass keeping compact per-row state, then each chunk read back."""
+    table, _ = load_recipients(filename, validate_addresses, amount_column="C")
+    chunks = 0
+    for _, start, stop in table.chunk_bounds(CHUNK_SIZE):
+        table.outputs(start, stop)
+        chunks += 1
+    return chunks
+
+
+def measure(function, filename):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = function(filename)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "recipients.csv")
+        write_file(filename, args.rows)
+        size = os.path.getsize(filename) / 2**20
+        print(f"{args.rows} rows, {size:.1f} MiB")
+        print(f"{'path':>10} {'chunks':>8} {'seconds':>9} {'peak MiB':>9}")
+        for name, function in (("legacy", legacy), ("streamed", streamed)):
+            chunks, elapsed, peak = measure(function, filename)
+            print(f"{name:>10} {chunks:>8} {elapsed:>9.2f} {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
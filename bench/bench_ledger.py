@@ -0,0 +1,79 @@
+"""Per-row vs per-chunk writes of the sent-to ledger.
+
+Usage: python bench/bench_ledger.py [--chunks 200]
+"""
+import argparse
+import csv
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ledger import LedgerWriter  # noqa: E402
+
+CHUNK_SIZE = 127
+ADDRESS = "smr1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32kt350w"
+
+logger = logging.getLogger("bench")
+
+
+def write_to_csv(filename, shimmer_receiver_address, amount, block_id):
+    """The per-row write_to_csv() the scripts used to call for every recipient."""
+    explorer_link = f"https://explorer.shimmer.network/shimmer/block/{block_id}"
+    date_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    data = [[shimmer_receiver_address, explorer_link, amount, date_time]]
+    with open(filename, "a", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerows(data)
+        logger.info(
+            f"Transaction details appended to CSV file for address: {shimmer_receiver_address}"
+        )
+
+
+def run_legacy(filename, chunks, outputs):
+    for chunk in range(chunks):
+        for output in outputs:
+            write_to_csv(
+                filename, output["address"], output["amount"], f"0x{chunk:064x}"
+            )
+
+
+def run_writer(filename, chunks, outputs):
+    with LedgerWriter(filename) as ledger:
+        for chunk in range(chunks):
+            ledger.write_chunk(outputs, f"0x{chunk:064x}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+    outputs = [{"address": ADDRESS, "amount": "1000000"}] * CHUNK_SIZE
+    cases = [
+        ("per-row csv", run_legacy, "sent.csv"),
+        ("chunk csv", run_writer, "sent.csv"),
+        ("chunk csv.gz", run_writer, "sent.csv.gz"),
+    ]
+    if importlib.util.find_spec("pyarrow") is not None:
+        cases.append(("chunk parquet", run_writer, "sent.parquet"))
+
+    rows = args.chunks * CHUNK_SIZE
+    print(f"{args.chunks} chunks, {rows} rows (fsync per chunk for the writer)")
+    print(f"{'path':>14} {'seconds':>9} {'rows/s':>10}")
+    for name, function, basename in cases:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, basename)
+            start = time.perf_counter()
+            function(filename, args.chunks, outputs)
+            elapsed = time.perf_counter() - start
+        print(f"{name:>14} {elapsed:>9.2f} {rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Already-paid lookups through the ledger index vs reading the whole ledger.
+
+Writes a sent-to ledger of ``--paid`` addresses, then checks a new list of ``--rows``
+addresses, ``--overlap`` of them already paid:
+
+- ``read ledger``: :func:`ledger.read_sent_addresses` into a set, then a set lookup
+  per address, what the scripts did before the index;
+- ``build index``: :func:`ledger_index.open_index` without an index file;
+- ``open index``: the same with an up to date index file;
+- ``lookup``: :meth:`ledger_index.LedgerIndex.contains` on the whole list.
+
+It also reports the cost of adding a chunk of 127 addresses to the index, which the
+ledger writer does for every confirmed chunk, and of one ``address in index``.
+
+Usage: python bench/bench_ledger_index.py [--paid 1000000] [--rows 1000000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import synthetic_addresses  # noqa: E402
+
+from ledger import LedgerWriter, read_sent_addresses  # noqa: E402
+from ledger_index import open_index  # noqa: E402
+
+CHUNK_SIZE = 127
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{label:>12}: {time.perf_counter() - start:.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paid", type=int, default=1_000_000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--overlap", type=float, default=0.1)
+    parser.add_argument("--chunks", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    paid = [a.decode() for a in synthetic_addresses(args.paid, rng)]
+    overlap = int(args.rows * args.overlap)
+    rows = [a.decode() for a in synthetic_addresses(args.rows - overlap, rng)]
+    rows += paid[:overlap]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "sent.csv")
+        with LedgerWriter(filename) as ledger:
+            ledger.write_chunk(
+                [{"address": address, "amount": "1000000"} for address in paid],
+                "0x" + "0" * 64,
+            )
+        print(f"ledger of {args.paid} addresses, {args.rows} to check")
+
+        def read_ledger():
+            sent = read_sent_addresses(filename)
+            return sum(address in sent for address in rows)
+
+        found = timed("read ledger", read_ledger)
+        timed("build index", lambda: open_index(filename)).close()
+        index = timed("open index", lambda: open_index(filename))
+        mask = timed("lookup", lambda: index.contains(rows))
+        assert int(mask.sum()) == found == overlap
+
+        chunks = [
+            [a.decode() for a in synthetic_addresses(CHUNK_SIZE, rng)]
+            for _ in range(args.chunks)
+        ]
+        start = time.perf_counter()
+        for chunk in chunks:
+            index.add(chunk)
+        elapsed = (time.perf_counter() - start) / args.chunks
+        print(f"{'add chunk':>12}: {elapsed * 1e3:.3f}ms")
+
+        sample = rows[:10_000]
+        start = time.perf_counter()
+        for address in sample:
+            address in index
+        elapsed = (time.perf_counter() - start) / len(sample)
+        print(f"{'one lookup':>12}: {elapsed * 1e6:.1f}us")
+        size = os.path.getsize(index.filename) / 1024 / 1024
+        print(f"{'index file':>12}: {size:.1f} MB, {len(index)} addresses")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Logging overhead per recipient, synchronous vs queued logging.
+
+Emits the log records of sending ``--chunks`` chunks of 127 recipients, as
+``send_to_csv_array.py`` logs them, through :func:`runtime.setup_logging`:
+
+- ``per-recipient``: synchronous, at DEBUG, with the INFO line the ledger used to
+  log for every recipient;
+- ``sync``: synchronous at DEBUG, the default of the scripts;
+- ``queued``: ``--log-queue``, at INFO from a background thread;
+- ``queued verbose``: ``--log-queue --verbose``.
+
+It reports the time the sending thread spent logging, per recipient, and the time
+the listener needed afterwards to write out its queue. Each mode runs in its own
+process, with the console sent to ``/dev/null``.
+
+Usage: python bench/bench_logging.py [--chunks 200] [--polls 3]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from runtime import setup_logging  # noqa: E402
+
+CHUNK_SIZE = 127
+ADDRESS = "smr1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32kt350w"
+MODES = {
+    "per-recipient": (logging.DEBUG, False, True),
+    "sync": (logging.DEBUG, False, False),
+    "queued": (logging.INFO, True, False),
+    "queued verbose": (logging.DEBUG, True, False),
+}
+
+logger = logging.getLogger()
+
+
+def log_chunk(index, outputs, polls, per_recipient):
+    """Log the records of sending, confirming and writing one chunk."""
+    block_id = f"0x{index:064x}"
+    logger.info("Received bulk outputs.")
+    logger.debug("Received bulk outputs: %s", outputs)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Chunk amount: {sum(int(o['amount']) for o in outputs)}")
+    logger.debug("Outputs: %s", outputs)
+    logger.info("Transaction sent")
+    logger.info(f"Block ID: {block_id}")
+    logger.debug(f"block_id: {block_id}")
+    logger.info("Checking transaction status...")
+    for _ in range(polls):
+        logger.debug("Block %s ledger inclusion state: %s", block_id, None)
+    logger.debug("Block %s ledger inclusion state: %s", block_id, "included")
+    logger.info(f"Block {block_id} confirmed after 10.0s, {polls + 1} polls")
+    logger.info("Transaction has been confirmed.")
+    if per_recipient:
+        for output in outputs:
+            logger.info(
+                f"Transaction details appended to CSV file for address: "
+                f"{output['address']}"
+            )
+    logger.info(
+        f"Transaction details appended to sent.csv for {len(outputs)} addresses in "
+        f"block {block_id}"
+    )
+
+
+def run(mode, chunks, polls):
+    level, queued, per_recipient = MODES[mode]
+    setup_logging(level=level, queued=queued)
+    outputs = [{"address": ADDRESS, "amount": "1000000"}] * CHUNK_SIZE
+    start = time.perf_counter()
+    for index in range(chunks):
+        log_chunk(index, outputs, polls, per_recipient)
+    logged = time.perf_counter() - start
+    if queued:
+        (handler,) = logger.handlers
+        while not handler.queue.empty():
+            time.sleep(0.001)
+    drained = time.perf_counter() - start - logged
+    recipients = chunks * CHUNK_SIZE
+    size = os.path.getsize("app.log") / 1024 / 1024
+    print(
+        f"{mode:>15} {logged * 1e6 / recipients:>14.2f} "
+        f"{drained * 1e6 / recipients:>13.2f} {size:>10.1f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=3)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+    if args.mode:
+        run(args.mode, args.chunks, args.polls)
+        return
+
+    print(f"{args.chunks} chunks of {CHUNK_SIZE} recipients, {args.polls} polls each")
+    print(f"{'mode':>15} {'logging us/rcp':>14} {'drain us/rcp':>13} {'log MB':>10}")
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), f"--mode={mode}"]
+                + [f"--chunks={args.chunks}", f"--polls={args.polls}"],
+                cwd=directory,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
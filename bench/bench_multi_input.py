@@ -0,0 +1,115 @@
+"""Blocks and time of sending many small payout files one by one vs together.
+
+Writes ``--files`` recipients files of random sizes up to ``--max-rows`` rows and
+sends them on a :class:`backend.MockBackend` through :class:`async_engine.AsyncEngine`:
+once file by file, each run ending with a partial chunk, and once read together with
+:func:`recipients.load_recipient_files` and packed into full chunks of 127 outputs.
+
+Usage: python bench/bench_multi_input.py [--files 30] [--max-rows 300]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import write_recipients  # noqa: E402
+
+from async_engine import AsyncEngine, EngineChunk  # noqa: E402
+from backend import MockBackend  # noqa: E402
+from dedup import deduplicate  # noqa: E402
+from ledger import LedgerWriter  # noqa: E402
+from recipients import load_recipient_files  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+CHUNK_SIZE = 127
+AMOUNT = 1_000_000
+
+
+def send(backend, session, table, ledger, window):
+    """Send ``table`` in chunks and return the number of blocks."""
+
+    def chunks():
+        for index, start, stop in table.chunk_bounds(CHUNK_SIZE):
+            yield EngineChunk(index, table.outputs(start, stop))
+
+    def on_confirmed(chunk):
+        session.confirmed(chunk.transaction)
+        ledger.write_chunk(chunk.outputs, chunk.block_id)
+
+    engine = AsyncEngine(
+        session,
+        backend.client({}),
+        on_confirmed,
+        window=window,
+        min_interval=0.05,
+        max_interval=0.5,
+    )
+    engine.run(chunks())
+    assert engine.failed == 0
+    return engine.confirmed
+
+
+def run(filenames, directory, window, merged, options):
+    backend = MockBackend(**options)
+    wallet = backend.wallet("bench", {}, 4219, backend.secret_manager("bench", "pw"))
+    session = WalletSession(wallet, "bench", "password").open()
+    groups = [filenames] if merged else [[filename] for filename in filenames]
+    ledger_filename = os.path.join(directory, f"sent-{merged}.csv")
+    blocks = 0
+    start = time.perf_counter()
+    with LedgerWriter(ledger_filename, sources=merged) as ledger:
+        for group in groups:
+            table, validation = load_recipient_files(
+                group, backend.validate_addresses, default_amount=AMOUNT
+            )
+            assert validation.is_valid
+            table, _ = deduplicate(table)
+            blocks += send(backend, session, table, ledger, window)
+    return blocks, time.perf_counter() - start, ledger.row_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--max-rows", type=int, default=300)
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--confirmation-delay", type=float, default=0.2)
+    parser.add_argument("--send-latency", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    options = {
+        "confirmation_delay": args.confirmation_delay,
+        "send_latency": args.send_latency,
+        "output_count": 2 * args.window,
+        "seed": args.seed,
+    }
+
+    rng = np.random.default_rng(args.seed)
+    sizes = rng.integers(1, args.max_rows + 1, size=args.files)
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = []
+        for i, size in enumerate(sizes):
+            filename = os.path.join(directory, f"payout-{i:03}.csv")
+            write_recipients(filename, int(size), seed=args.seed + i)
+            filenames.append(filename)
+        print(
+            f"{args.files} files, {sizes.sum()} recipients, mock node: "
+            f"{args.confirmation_delay}s to confirm, window {args.window}"
+        )
+        print(f"{'mode':>12} {'blocks':>8} {'seconds':>9} {'recipients':>11}")
+        for label, merged in (("one by one", False), ("merged", True)):
+            blocks, elapsed, rows = run(
+                filenames, directory, args.window, merged, options
+            )
+            print(f"{label:>12} {blocks:>8} {elapsed:>9.2f} {rows:>11}")
+
+
+if __name__ == "__main__":
+    main()
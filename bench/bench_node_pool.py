@@ -0,0 +1,85 @@
+"""Single node vs node pool for confirmation polling against local mock nodes.
+
+Three replicas of one mock network are used: the default node (slow and rate limited
+with some failures), a fast node and a flaky one. Half way through the run the fast
+node goes down for a while. The same blocks are confirmed through the default node
+alone and through a :class:`~node_pool.NodePool` of the three.
+
+Usage: python bench/bench_node_pool.py [--blocks 200]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from confirmation import ConfirmationTracker  # noqa: E402
+from mock_node import MockNode, MockReplica  # noqa: E402
+from node_pool import NodePool  # noqa: E402
+
+
+def make_nodes(node):
+    return {
+        "default": MockReplica(node, latency=0.05, failure_rate=0.2, seed=1),
+        "fast": MockReplica(node, latency=0.005, seed=2),
+        "flaky": MockReplica(node, latency=0.01, failure_rate=0.5, seed=3),
+    }
+
+
+def outage(replica, after, duration):
+    time.sleep(after)
+    replica.down = True
+    time.sleep(duration)
+    replica.down = False
+
+
+def run(blocks, use_pool, confirmation_delay):
+    node = MockNode(confirmation_delay=confirmation_delay)
+    replicas = make_nodes(node)
+    if use_pool:
+        client = NodePool(replicas, probe_interval=0.2, cooldown=0.5, seed=0)
+    else:
+        client = replicas["default"]
+    threading.Thread(
+        target=outage, args=(replicas["fast"], confirmation_delay, 1.0), daemon=True
+    ).start()
+
+    start = time.perf_counter()
+    with ConfirmationTracker(
+        client, min_interval=0.05, max_interval=0.2, workers=8
+    ) as tracker:
+        tracked = [tracker.track(node.submit({})) for _ in range(blocks)]
+        for block in tracked:
+            block.wait()
+    elapsed = time.perf_counter() - start
+    if use_pool:
+        client.close()
+
+    detect = statistics.median(
+        block.detected_at - block.tracked_at for block in tracked
+    )
+    calls = {name: replica.calls for name, replica in replicas.items()}
+    return elapsed, detect, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--confirmation-delay", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print(f"{args.blocks} blocks, inclusion after {args.confirmation_delay}s")
+    print(f"{'client':>8} {'seconds':>8} {'detect p50':>11}  calls per node")
+    for name, use_pool in (("single", False), ("pool", True)):
+        elapsed, detect, calls = run(args.blocks, use_pool, args.confirmation_delay)
+        calls = ", ".join(f"{node}={count}" for node, count in calls.items())
+        print(f"{name:>8} {elapsed:>8.2f} {detect:>10.2f}s  {calls}")
+
+
+if __name__ == "__main__":
+    main()
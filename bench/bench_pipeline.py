@@ -0,0 +1,71 @@
+"""Compare sequential and pipelined chunk sending against the local mock node.
+
+Usage: python bench/bench_pipeline.py [--chunks 40] [--confirmation-delay 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mock_node import MockAccount, MockNode  # noqa: E402
+from pipeline import PipelinedSender  # noqa: E402
+
+CHUNK_SIZE = 127
+
+
+def make_chunk(index):
+    return [
+        {"address": f"smr1recipient{index}x{i}", "amount": "1000000"}
+        for i in range(CHUNK_SIZE)
+    ]
+
+
+def run(window, chunks, confirmation_delay, send_latency, min_interval):
+    node = MockNode(confirmation_delay=confirmation_delay)
+    account = MockAccount(node, output_count=window, send_latency=send_latency)
+    confirmed = []
+
+    start = time.perf_counter()
+    with PipelinedSender(
+        account,
+        node,
+        confirmed.append,
+        window=window,
+        min_interval=min_interval,
+        max_interval=0.2,
+    ) as sender:
+        for index in range(chunks):
+            sender.submit(make_chunk(index))
+    elapsed = time.perf_counter() - start
+
+    assert len(confirmed) == chunks
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--confirmation-delay", type=float, default=0.5)
+    parser.add_argument("--send-latency", type=float, default=0.02)
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    recipients = args.chunks * CHUNK_SIZE
+    print(f"{args.chunks} chunks, {recipients} recipients")
+    print(f"{'window':>6} {'seconds':>9} {'recipients/s':>13}")
+    for window in args.windows:
+        elapsed = run(
+            window,
+            args.chunks,
+            args.confirmation_delay,
+            args.send_latency,
+            args.min_interval,
+        )
+        print(f"{window:>6} {elapsed:>9.2f} {recipients / elapsed:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Reconciliation of two synthetic crew3 exports.
+
+Writes an address quest export and an eligibility export of ``--rows`` rows each
+(with extra columns, repeated answers and half of the names in common), then runs
+the previous full ``pd.read_csv`` + ``pd.merge`` reconciliation and
+:func:`reconcile.reconcile` at once and chunked, each in its own process, and reports
+time and peak memory.
+
+Usage: python bench/bench_reconcile.py [--rows 5000000]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import peak_rss, synthetic_addresses  # noqa: E402
+
+from reconcile import CHUNK_SIZE, reconcile  # noqa: E402
+from shimmer_address import validate_addresses  # noqa: E402
+
+
+def write_exports(directory, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    addresses = np.array(synthetic_addresses(rows, rng), dtype="S").astype(str)
+    # About 2% of the users answered the address quest twice
+    names = np.char.add("user", np.arange(rows).astype(str))
+    repeated = rng.choice(rows, rows // 50, replace=False)
+    names[repeated] = names[rng.integers(0, rows, len(repeated))]
+    address_export = os.path.join(directory, "crew3_shimmer_address.csv")
+    pd.DataFrame(
+        {
+            "Quest": "SMR address",
+            "Name": names,
+            "Discord": "discord",
+            "answer": addresses,
+            "Date": "2023-02-20",
+        }
+    ).to_csv(address_export, index=False)
+    eligible_export = os.path.join(directory, "crew3_airdrop_export.csv")
+    eligible = np.char.add("user", np.arange(rows // 2, rows + rows // 2).astype(str))
+    pd.DataFrame({"Name": eligible, "Twitter": "twitter", "answer": "yes"}).to_csv(
+        eligible_export, index=False
+    )
+    return address_export, eligible_export
+
+
+def run_legacy(address_export, eligible_export, output):
+    """The previous compare_files(), with the second export filtered as meant."""
+    addresses = pd.read_csv(address_export)
+    eligible = pd.read_csv(eligible_export)
+    common_names = set(addresses["Name"]).intersection(set(eligible["Name"]))
+    df1 = addresses[addresses["Name"].isin(common_names)]
+    df2 = eligible[eligible["Name"].isin(common_names)]
+    reasons = validate_addresses(df1["answer"])
+    assert not reasons.notna().any()
+    merged = pd.merge(df1, df2, on="Name")
+    merged[["Name", "answer_x"]].to_csv(output, index=False, header=["Name", "answer"])
+    return len(merged)
+
+
+def run_case(case, address_export, eligible_export, output):
+    start = time.perf_counter()
+    if case == "legacy":
+        rows = run_legacy(address_export, eligible_export, output)
+    else:
+        chunksize = None if case == "at once" else CHUNK_SIZE
+        result = reconcile(address_export, eligible_export, output, chunksize)
+        assert result.is_valid, result.summary()
+        rows = result.matched
+    elapsed = time.perf_counter() - start
+    peak = peak_rss()
+    print(f"{case:>8}: {elapsed:6.2f}s, peak RSS {peak:7.0f} MB, {rows} rows written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--case")
+    parser.add_argument("--files", nargs=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.case:
+        run_case(args.case, *args.files)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        address_export, eligible_export = write_exports(directory, args.rows)
+        size = os.path.getsize(address_export) + os.path.getsize(eligible_export)
+        print(
+            f"wrote 2 exports of {args.rows} rows ({size / 2**20:.0f} MB) in "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+        output = os.path.join(directory, "recipients.csv")
+        for case in ("legacy", "at once", "chunked"):
+            # A fresh process per case so that peak RSS is its own
+            subprocess.run(
+                [sys.executable, __file__, "--case", case, "--files"]
+                + [address_export, eligible_export, output],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Cost of resuming a large job from the journal.
+
+Simulates a 1M-row job that stopped after all but the last ``--remaining`` chunks
+were confirmed, then measures what a restart does before sending anything: opening
+the journal (including the input fingerprint), reading the file into the recipient
+table and skipping the confirmed chunks, as ``send_to_csv_array.pending_chunks``
+does. Address validation is replaced by a cheap stand-in.
+
+Usage: python bench/bench_resume.py [--rows 1000000] [--remaining 10]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from job_journal import CONFIRMED, JobJournal  # noqa: E402
+from recipients import load_recipients  # noqa: E402
+
+CHUNK_SIZE = 127
+ADDRESS = "smr1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32kt350w"
+
+
+def validate_addresses(addresses):
+    return [None if a.startswith("smr1") else "invalid" for a in addresses]
+
+
+def write_file(filename, rows):
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Name", "answer"])
+        writer.writerows([f"user{i}", ADDRESS] for i in range(rows))
+
+
+def first_run(journal_filename, filename, rows, remaining):
+    chunks = -(-rows // CHUNK_SIZE)
+    journal = JobJournal(journal_filename, filename, CHUNK_SIZE)
+    start = time.perf_counter()
+    for index in range(chunks - remaining):
+        first_row = 2 + index * CHUNK_SIZE
+        journal.planned(index, first_row, first_row + CHUNK_SIZE - 1)
+        journal.submitted(index, {"blockId": f"0x{index:064x}", "transactionId": None})
+        journal.confirmed(index)
+    elapsed = time.perf_counter() - start
+    journal.close()
+    return chunks - remaining, elapsed
+
+
+def resume(journal_filename, filename):
+    start = time.perf_counter()
+    journal = JobJournal(journal_filename, filename, CHUNK_SIZE)
+    opened = time.perf_counter() - start
+    table, _ = load_recipients(filename, validate_addresses, default_amount=1000000)
+    pending = 0
+    for index, start_row, stop_row in table.chunk_bounds(CHUNK_SIZE):
+        if journal.state(index)[0] == CONFIRMED:
+            continue
+        table.outputs(start_row, stop_row)
+        pending += 1
+    journal.close()
+    return pending, opened, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--remaining", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "recipients.csv")
+        journal_filename = filename + ".journal"
+        write_file(filename, args.rows)
+
+        confirmed, elapsed = first_run(
+            journal_filename, filename, args.rows, args.remaining
+        )
+        per_chunk = elapsed / confirmed * 1000
+        print(f"journaled {confirmed} chunks, {per_chunk:.2f} ms per chunk (3 writes)")
+
+        pending, opened, total = resume(journal_filename, filename)
+        print(f"resume: journal opened in {opened:.2f}s, {pending} chunks left")
+        print(f"resume: {total:.2f}s to skip the confirmed chunks")
+
+
+if __name__ == "__main__":
+    main()
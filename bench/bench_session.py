@@ -0,0 +1,76 @@
+"""Per-chunk overhead of rebuilding the wallet vs reusing one WalletSession.
+
+The wallet binding is replaced by the stubs in mock_node.py, whose construction,
+Stronghold unlock and sync costs can be set from the command line.
+
+Usage: python bench/bench_session.py [--chunks 5] [--sync-latency 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mock_node import MockAccount, MockNode, MockWallet  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+OUTPUTS = [{"address": "smr1recipient", "amount": "1000000"}] * 127
+
+
+def legacy_chunk(account, args):
+    """What send_smr_tokens() used to do for every chunk, minus the send itself."""
+    wallet = MockWallet(
+        account, open_latency=args.open_latency, unlock_latency=args.unlock_latency
+    )
+    account = wallet.get_account("alice")
+    account.addresses()
+    account.get_balance()
+    time.sleep(args.legacy_sleep)
+    account.sync()
+    wallet.set_stronghold_password("password")
+
+
+def run_legacy(args):
+    node = MockNode(confirmation_delay=0)
+    account = MockAccount(node, send_latency=0, sync_latency=args.sync_latency)
+    start = time.perf_counter()
+    for _ in range(args.chunks):
+        legacy_chunk(account, args)
+        account.send_amount(OUTPUTS)
+    return (time.perf_counter() - start) / args.chunks
+
+
+def run_session(args):
+    node = MockNode(confirmation_delay=0)
+    account = MockAccount(node, send_latency=0, sync_latency=args.sync_latency)
+    wallet = MockWallet(
+        account, open_latency=args.open_latency, unlock_latency=args.unlock_latency
+    )
+    session = WalletSession(wallet, "alice", "password").open()
+    start = time.perf_counter()
+    for _ in range(args.chunks):
+        transaction = session.send_amount(OUTPUTS)
+        session.confirmed(transaction)
+    elapsed = (time.perf_counter() - start) / args.chunks
+    return elapsed, session.sync_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--open-latency", type=float, default=0.2)
+    parser.add_argument("--unlock-latency", type=float, default=0.3)
+    parser.add_argument("--sync-latency", type=float, default=0.5)
+    parser.add_argument("--legacy-sleep", type=float, default=5.0)
+    args = parser.parse_args()
+
+    legacy = run_legacy(args)
+    session, sync_count = run_session(args)
+    print(f"legacy per-chunk overhead:  {legacy * 1000:10.1f} ms")
+    print(f"session per-chunk overhead: {session * 1000:10.1f} ms")
+    print(f"full syncs with the session: {sync_count} for {args.chunks} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Throughput of one account vs a run sharded over several accounts.
+
+Every shard sends through a :class:`pipeline.PipelinedSender` on the mock node; the
+time includes opening the shard accounts and the funding transaction.
+
+Usage: python bench/bench_sharding.py [--chunks 200] [--shards 1 2 4 8]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from confirmation import ConfirmationTracker  # noqa: E402
+from ledger import LedgerWriter  # noqa: E402
+from mock_node import MockAccount, MockNode, MockWallet  # noqa: E402
+from pipeline import PipelinedSender  # noqa: E402
+from planner import MAX_CHUNK_SIZE  # noqa: E402
+from sharding import assign_chunks, fund_shards, open_shards, run_shards  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+AMOUNT = 1_000_000
+
+
+def make_chunk(index):
+    return [
+        {"address": f"smr1recipient{index}x{i}", "amount": str(AMOUNT)}
+        for i in range(MAX_CHUNK_SIZE)
+    ]
+
+
+def run(shard_count, args, ledger_filename):
+    node = MockNode(confirmation_delay=args.confirmation_delay)
+    account = MockAccount(
+        node, output_count=args.window, send_latency=args.send_latency
+    )
+    session = WalletSession(MockWallet(account), "bench", "password").open()
+    tracker_options = {"min_interval": args.min_interval, "max_interval": 0.5}
+
+    start = time.perf_counter()
+    shards = open_shards(session, shard_count)
+    assign_chunks(
+        shards, [(index, MAX_CHUNK_SIZE * AMOUNT) for index in range(args.chunks)]
+    )
+    with ConfirmationTracker(node, **tracker_options) as tracker, LedgerWriter(
+        ledger_filename
+    ) as ledger:
+        fund_shards(shards, tracker, args.window)
+
+        def send_shard(shard):
+            def on_confirmed(chunk):
+                shard.session.confirmed(chunk.transaction)
+                ledger.write_chunk(chunk.outputs, chunk.block_id)
+
+            with PipelinedSender(
+                shard.session,
+                node,
+                on_confirmed,
+                window=args.window,
+                **tracker_options,
+            ) as sender:
+                for index in shard.chunks:
+                    sender.submit(make_chunk(index), key=index)
+
+        run_shards(shards, send_shard)
+    elapsed = time.perf_counter() - start
+    assert ledger.row_count == args.chunks * MAX_CHUNK_SIZE
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--window", type=int, default=4)
+    parser.add_argument("--confirmation-delay", type=float, default=0.5)
+    parser.add_argument("--send-latency", type=float, default=0.1)
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    recipients = args.chunks * MAX_CHUNK_SIZE
+    print(
+        f"{args.chunks} chunks, {recipients} recipients, window {args.window} per "
+        f"shard, {args.send_latency}s per send"
+    )
+    print(f"{'shards':>6} {'seconds':>9} {'recipients/s':>13}")
+    for shard_count in args.shards:
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed = run(shard_count, args, os.path.join(directory, "sent.csv"))
+        print(f"{shard_count:>6} {elapsed:>9.2f} {recipients / elapsed:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
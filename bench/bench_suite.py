@@ -0,0 +1,129 @@
+"""Load test of full runs against the mock backend, from 1k to 1M recipients.
+
+Each run reads and validates a recipients CSV file, opens the wallet session, sends
+chunks of 127 outputs through :class:`async_engine.AsyncEngine` and writes the
+sent-to ledger, all on a :class:`backend.MockBackend`. It reports recipients per
+second, the time from sending a chunk to its confirmation and the peak memory; each
+run goes in its own process so that its peak memory is its own.
+
+Usage: python bench/bench_suite.py [--recipients 1000 100000 1000000] [--window 32]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import peak_rss, write_recipients  # noqa: E402
+
+from async_engine import AsyncEngine, EngineChunk  # noqa: E402
+from backend import MockBackend  # noqa: E402
+from ledger import LedgerWriter  # noqa: E402
+from recipients import load_recipients  # noqa: E402
+from wallet_session import WalletSession  # noqa: E402
+
+CHUNK_SIZE = 127
+AMOUNT = 1_000_000
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(args, filename, ledger_filename):
+    backend = MockBackend(
+        confirmation_delay=args.confirmation_delay,
+        send_latency=args.send_latency,
+        output_count=2 * args.window,
+        seed=args.seed,
+    )
+    started = time.perf_counter()
+    table, validation = load_recipients(
+        filename, lambda addresses: backend.validate_addresses(addresses), AMOUNT
+    )
+    assert validation.is_valid
+    wallet = backend.wallet("bench", {}, 4219, backend.secret_manager("bench", "pw"))
+    session = WalletSession(wallet, "bench", "password").open()
+    confirm_times = []
+
+    def chunks():
+        for index, start, stop in table.chunk_bounds(CHUNK_SIZE):
+            yield EngineChunk(index, table.outputs(start, stop))
+
+    with LedgerWriter(ledger_filename) as ledger:
+
+        def on_confirmed(chunk):
+            confirm_times.append(time.monotonic() - chunk.submitted_at)
+            session.confirmed(chunk.transaction)
+            ledger.write_chunk(chunk.outputs, chunk.block_id)
+
+        engine = AsyncEngine(
+            session,
+            backend.client({}),
+            on_confirmed,
+            window=args.window,
+            min_interval=args.min_interval,
+            max_interval=0.5,
+        )
+        engine.run(chunks())
+    elapsed = time.perf_counter() - started
+    assert engine.failed == 0 and ledger.row_count == len(table)
+    print(
+        f"{len(table):>10} {elapsed:>9.2f} {len(table) / elapsed:>13.0f} "
+        f"{sum(confirm_times) / len(confirm_times):>9.2f} "
+        f"{percentile(confirm_times, 0.95):>9.2f} {peak_rss():>9.0f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--recipients", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--window", type=int, default=32)
+    parser.add_argument("--confirmation-delay", type=float, default=0.2)
+    parser.add_argument("--send-latency", type=float, default=0.005)
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--files", nargs=2)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.files:
+        run(args, *args.files)
+        return
+
+    print(
+        f"mock node: {args.confirmation_delay}s to confirm, {args.send_latency}s per "
+        f"send, window {args.window}"
+    )
+    print(
+        f"{'recipients':>10} {'seconds':>9} {'recipients/s':>13} {'confirm':>9} "
+        f"{'p95':>9} {'peak MB':>9}"
+    )
+    options = [
+        f"--window={args.window}",
+        f"--confirmation-delay={args.confirmation_delay}",
+        f"--send-latency={args.send_latency}",
+        f"--min-interval={args.min_interval}",
+        f"--seed={args.seed}",
+    ]
+    for count in args.recipients:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "recipients.csv")
+            write_recipients(filename, count, args.seed)
+            ledger_filename = os.path.join(directory, "sent.csv")
+            subprocess.run(
+                [sys.executable, __file__, "--files", filename, ledger_filename]
+                + options,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Cold and warm validation of a recipients list through the validation cache.
+
+Validates ``--rows`` addresses with :func:`shimmer_address.validate_addresses`:
+
+- ``no cache``: the plain validator;
+- ``cold``: an empty cache, which then holds every valid address;
+- ``warm``: the same list again;
+- ``next week``: the list with ``--new`` of its addresses replaced by new ones.
+
+``lookup`` and ``save`` are the parts of the time spent looking the addresses up and
+rewriting the cache file.
+
+Usage: python bench/bench_validation_cache.py [--rows 1000000] [--new 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import synthetic_addresses  # noqa: E402
+
+from shimmer_address import validate_addresses  # noqa: E402
+from validation_cache import ValidationCache  # noqa: E402
+
+
+class TimedCache(ValidationCache):
+    """A :class:`ValidationCache` adding up the time of its lookups."""
+
+    lookup = 0.0
+
+    def contains(self, addresses):
+        start = time.perf_counter()
+        found = super().contains(addresses)
+        self.lookup += time.perf_counter() - start
+        return found
+
+
+def run(label, addresses, filename):
+    cache = None if filename is None else TimedCache(filename)
+    start = time.perf_counter()
+    reasons = validate_addresses(addresses, "smr", cache)
+    validated = time.perf_counter() - start
+    saved = 0.0
+    if cache is not None:
+        start = time.perf_counter()
+        cache.save()
+        saved = time.perf_counter() - start
+    lookup = 0.0 if cache is None else cache.lookup
+    hits = 0 if cache is None else cache.hits
+    invalid = sum(reason is not None for reason in reasons)
+    print(
+        f"{label:>10} {validated:>9.2f} {lookup:>8.2f} {saved:>6.2f} {hits:>9} "
+        f"{invalid:>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--new", type=float, default=0.05)
+    parser.add_argument("--invalid", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    addresses = [a.decode() for a in synthetic_addresses(args.rows, rng)]
+    for i in rng.choice(args.rows, int(args.rows * args.invalid), replace=False):
+        addresses[i] = addresses[i][:-1] + ("q" if addresses[i][-1] != "q" else "p")
+    next_week = list(addresses)
+    new = [a.decode() for a in synthetic_addresses(int(args.rows * args.new), rng)]
+    for i, address in zip(rng.choice(args.rows, len(new), replace=False), new):
+        next_week[i] = address
+
+    print(f"{args.rows} addresses, {args.invalid:.0%} invalid")
+    print(
+        f"{'run':>10} {'seconds':>9} {'lookup':>8} {'save':>6} {'hits':>9} "
+        f"{'invalid':>8}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "validation.cache")
+        run("no cache", addresses, None)
+        run("cold", addresses, filename)
+        run("warm", addresses, filename)
+        run("next week", next_week, filename)
+        size = os.path.getsize(filename) / 1024 / 1024
+        print(f"cache file: {size:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cross-check the offline address validator against address_corpus.csv.
+
+Every row of the corpus holds an address, the failure reason expected from
+:func:`shimmer_address.validate_address` (empty when valid) and the verdict of the
+``iota_client`` binding's ``is_address_valid``, recorded with the version named in
+the header comment of the file. The local validator must agree with the binding on
+every row, except where it is deliberately stricter (:data:`STRICTER`): the binding
+accepts any HRP, bech32m checksums and a 64 character address carrying one data
+character more than a 33 byte payload needs. When the binding is installed, its
+live verdicts are compared with the recorded column as well.
+
+Usage: python bench/check_address_corpus.py
+"""
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from shimmer_address import (  # noqa: E402
+    BECH32M_CHECKSUM,
+    INVALID_LENGTH,
+    UNKNOWN_HRP,
+    validate_address,
+)
+
+CORPUS = os.path.join(os.path.dirname(__file__), "address_corpus.csv")
+# Reasons the local validator rejects addresses the binding accepts for
+STRICTER = (UNKNOWN_HRP, BECH32M_CHECKSUM, INVALID_LENGTH)
+
+
+def load_corpus():
+    """Return ``(address, reason, binding_valid)`` for every row of the corpus."""
+    with open(CORPUS, encoding="UTF8", newline="") as file:
+        lines = (line for line in file if not line.startswith("#"))
+        return [
+            (row["address"], row["reason"] or None, row["binding"] == "valid")
+            for row in csv.DictReader(lines)
+        ]
+
+
+def main():
+    corpus = load_corpus()
+    failures = 0
+    for address, expected, binding_valid in corpus:
+        reason = validate_address(address)
+        if reason != expected:
+            failures += 1
+            print(f"local mismatch: {address!r} expected {expected}, got {reason}")
+        elif binding_valid != (reason is None) and reason not in STRICTER:
+            failures += 1
+            print(
+                f"binding mismatch: {address!r} binding {binding_valid}, local {reason}"
+            )
+    print(f"local validator: {len(corpus) - failures}/{len(corpus)} rows match")
+
+    try:
+        from iota_client import IotaClient
+    except ImportError:
+        print("iota_client is not installed, skipping the live binding check")
+        return 1 if failures else 0
+
+    client = IotaClient()
+    for address, _, binding_valid in corpus:
+        try:
+            client_valid = bool(client.is_address_valid(address))
+        except Exception:
+            client_valid = False
+        if client_valid != binding_valid:
+            failures += 1
+            print(f"binding changed: {address!r} now {client_valid}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
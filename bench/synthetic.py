@@ -0,0 +1,58 @@
+"""Synthetic data and measurements shared by the benchmarks."""
+import os
+import resource
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from shimmer_address import (  # noqa: E402
+    _HRP_STATES,
+    _TOP_TABLE,
+    BECH32_CONST,
+    CHARSET,
+    CHECKSUM_LENGTH,
+)
+
+
+def synthetic_addresses(count, rng, hrp="smr"):
+    """Return ``count`` random valid Ed25519 addresses, built column-wise with NumPy."""
+    # 53 data characters: type byte 0 then 32 random bytes, the last bit is padding
+    values = rng.integers(0, 32, size=(count, 53), dtype=np.uint32)
+    values[:, 0] = 0
+    values[:, 1] &= 0b00011
+    values[:, -1] &= 0b11110
+    checksum = np.full(count, _HRP_STATES[hrp], dtype=np.uint32)
+    table = np.array(_TOP_TABLE, dtype=np.uint32)
+    columns = list(values.T) + [0] * CHECKSUM_LENGTH
+    for column in columns:
+        checksum = ((checksum & 0x1FFFFFF) << 5) ^ column ^ table[checksum >> 25]
+    checksum ^= BECH32_CONST
+    digits = [(checksum >> 5 * (5 - i)) & 31 for i in range(CHECKSUM_LENGTH)]
+    values = np.column_stack([values] + digits).astype(np.uint8)
+    characters = np.frombuffer(CHARSET.encode(), dtype=np.uint8)[values]
+    prefix = (hrp + "1").encode()
+    return [prefix + row for row in characters.view(f"S{values.shape[1]}").ravel()]
+
+
+def write_recipients(filename, count, seed=0, hrp="smr"):
+    """Write a recipients CSV file of ``count`` rows with distinct valid addresses."""
+    rng = np.random.default_rng(seed)
+    with open(filename, "w", encoding="UTF8", newline="") as file:
+        file.write("Name,answer\n")
+        for i, address in enumerate(synthetic_addresses(count, rng, hrp)):
+            file.write(f"user{i},{address.decode()}\n")
+
+
+def peak_rss():
+    """Return the peak resident memory of this process in MB."""
+    # ru_maxrss survives exec() on Linux, VmHWM starts over with the new program
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
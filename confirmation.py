@@ -0,0 +1,207 @@
+"""Concurrent confirmation tracking for many blocks.
+
+:class:`ConfirmationTracker` polls the metadata of every tracked block on a small
+thread pool. Each block is polled at an adaptive interval: tight right after it was
+submitted, then backing off exponentially with jitter up to ``max_interval``. Blocks
+the node flags with ``shouldPromote`` / ``shouldReattach``, or that are still not
+included after ``reattach_after`` seconds, are promoted or reattached; a block that
+is still not included after ``max_reattachments`` is reported with the ``timeout``
+state. It may still be included later, so only a ``conflicting`` transaction is
+safe to send again.
+"""
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INCLUDED = "included"
+CONFLICTING = "conflicting"
+NO_TRANSACTION = "noTransaction"
+TIMEOUT = "timeout"
+
+
+class TrackedBlock:
+    """A block waiting for confirmation, possibly reattached under new block IDs."""
+
+    def __init__(self, block_id, context):
+        self.block_id = block_id
+        self.block_ids = [block_id]
+        self.context = context
+        self.state = None
+        self.polls = 0
+        self.reattachments = 0
+        self.tracked_at = time.monotonic()
+        self.last_reattached_at = self.tracked_at
+        self.detected_at = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the block is included or has failed and return its state."""
+        self._done.wait(timeout)
+        return self.state
+
+
+class ConfirmationTracker:
+    """Poll many blocks concurrently until each is included or has failed."""
+
+    def __init__(
+        self,
+        client,
+        on_confirmed=None,
+        on_failed=None,
+        min_interval=0.5,
+        max_interval=5,
+        backoff=2.0,
+        jitter=0.2,
+        reattach_after=60,
+        max_reattachments=3,
+        workers=8,
+    ):
+        self.client = client
+        self.on_confirmed = on_confirmed
+        self.on_failed = on_failed
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.reattach_after = reattach_after
+        self.max_reattachments = max_reattachments
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="confirm")
+        self._schedule = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._schedule_loop, name="confirmation-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def track(self, block_id, context=None):
+        """Start tracking ``block_id`` and return its :class:`TrackedBlock`."""
+        tracked = TrackedBlock(block_id, context)
+        self._push(tracked, self.min_interval)
+        return tracked
+
+    def wait(self, block_id, context=None):
+        """Track ``block_id`` and block until it is included or has failed."""
+        return self.track(block_id, context).wait()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _push(self, tracked, interval):
+        with self._condition:
+            self._sequence += 1
+            due = time.monotonic() + interval
+            heapq.heappush(self._schedule, (due, self._sequence, tracked, interval))
+            self._condition.notify_all()
+
+    def _schedule_loop(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._schedule:
+                        delay = self._schedule[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+                _, _, tracked, interval = heapq.heappop(self._schedule)
+            self._executor.submit(self._poll, tracked, interval)
+
+    def _next_interval(self, interval):
+        interval = min(interval * self.backoff, self.max_interval)
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _poll(self, tracked, interval):
+        try:
+            state, metadata = self._latest_state(tracked)
+            if state is None:
+                self._handle_pending(tracked, metadata)
+        except Exception:
+            logger.exception(f"Polling block {tracked.block_id} failed")
+            state = None
+        if state is not None:
+            self._finish(tracked, state)
+        elif not tracked.done:
+            self._push(tracked, self._next_interval(interval))
+
+    def _latest_state(self, tracked):
+        """Return the inclusion state of the block, looking at every reattachment.
+
+        The transaction is confirmed as soon as one of its blocks is included;
+        otherwise the state of the latest reattachment decides.
+        """
+        tracked.polls += 1
+        latest = None
+        for block_id in reversed(tracked.block_ids):
+            metadata = self.client.get_block_metadata(block_id)
+            state = metadata.get("ledgerInclusionState")
+            logger.debug("Block %s ledger inclusion state: %s", block_id, state)
+            if state == INCLUDED:
+                tracked.block_id = block_id
+                return state, metadata
+            latest = latest or metadata
+        return latest.get("ledgerInclusionState"), latest
+
+    def _handle_pending(self, tracked, metadata):
+        stuck_for = time.monotonic() - tracked.last_reattached_at
+        if metadata.get("shouldReattach") or stuck_for >= self.reattach_after:
+            if tracked.reattachments >= self.max_reattachments:
+                self._finish(tracked, TIMEOUT)
+                return
+            block_id, _ = self.client.reattach(tracked.block_ids[-1])
+            tracked.block_ids.append(block_id)
+            tracked.reattachments += 1
+            tracked.last_reattached_at = time.monotonic()
+            logger.info(f"Block {tracked.block_ids[0]} reattached as {block_id}")
+        elif metadata.get("shouldPromote"):
+            self.client.promote(tracked.block_ids[-1])
+            logger.info(f"Block {tracked.block_ids[-1]} promoted")
+
+    def _finish(self, tracked, state):
+        tracked.state = state
+        tracked.detected_at = time.monotonic()
+        metrics.observe_span("confirm", tracked.detected_at - tracked.tracked_at)
+        metrics.observe("polls_per_block", tracked.polls)
+        metrics.count("blocks_confirmed" if state == INCLUDED else "blocks_failed")
+        try:
+            if state == INCLUDED:
+                logger.info(
+                    f"Block {tracked.block_id} confirmed after "
+                    f"{tracked.detected_at - tracked.tracked_at:.1f}s, "
+                    f"{tracked.polls} polls"
+                )
+                if self.on_confirmed is not None:
+                    self.on_confirmed(tracked)
+            else:
+                logger.error(f"Block {tracked.block_id} is {state}")
+                if self.on_failed is not None:
+                    self.on_failed(tracked)
+        except Exception:
+            logger.exception(f"Callback for block {tracked.block_id} failed")
+        finally:
+            tracked._done.set()
@@ -0,0 +1,120 @@
+"""Pre-flight consolidation of fragmented accounts.
+
+An account that received many small outputs needs many inputs per transaction:
+past ``MAX_INPUTS`` a chunk cannot be sent at all, and well before that every chunk
+gets slower to build, sign and confirm. :func:`assess` looks at the execution plan
+of a job and :class:`Consolidator` merges outputs with ``consolidate_outputs`` only
+when the plan shows it is needed, round after round until it no longer is.
+
+Each round sends up to ``parallel`` consolidation transactions at once (the wallet
+locks the inputs of pending transactions, so they spend different outputs) and waits
+for all of them before syncing and planning again.
+"""
+import logging
+from collections import namedtuple
+
+from confirmation import INCLUDED
+from planner import MAX_INPUTS
+
+logger = logging.getLogger(__name__)
+
+# Chunks needing more inputs than this are slow enough to be worth consolidating for
+TARGET_INPUTS = 16
+
+Assessment = namedtuple(
+    "Assessment", ["needed", "reason", "max_inputs", "over_limit", "over_target"]
+)
+
+
+def assess(plan, target_inputs=TARGET_INPUTS):
+    """Tell whether the outputs of the account should be consolidated for ``plan``."""
+    counts = [len(chunk.inputs) for chunk in plan.chunks.values()]
+    max_inputs = max(counts, default=0)
+    over_limit = sum(count > MAX_INPUTS for count in counts)
+    over_target = sum(count > target_inputs for count in counts)
+    if over_limit:
+        reason = f"{over_limit} chunks need more than {MAX_INPUTS} inputs"
+    elif over_target:
+        reason = f"{over_target} chunks need more than {target_inputs} inputs"
+    else:
+        reason = None
+    return Assessment(reason is not None, reason, max_inputs, over_limit, over_target)
+
+
+class Consolidator:
+    """Consolidate the outputs of a :class:`~wallet_session.WalletSession`.
+
+    ``tracker`` is the :class:`~confirmation.ConfirmationTracker` that waits for the
+    consolidation transactions; ``replan`` returns a fresh execution plan once the
+    session has been synced.
+    """
+
+    def __init__(
+        self,
+        session,
+        tracker,
+        replan,
+        target_inputs=TARGET_INPUTS,
+        max_rounds=50,
+        threshold=2,
+        parallel=8,
+    ):
+        self.session = session
+        self.tracker = tracker
+        self.replan = replan
+        self.target_inputs = target_inputs
+        self.max_rounds = max_rounds
+        self.threshold = threshold
+        self.parallel = parallel
+        self.rounds = 0
+        self.transactions = 0
+
+    def run(self, plan):
+        """Consolidate while ``plan`` needs it and return the final plan."""
+        assessment = assess(plan, self.target_inputs)
+        if not assessment.needed:
+            logger.info(
+                f"No consolidation needed, at most {assessment.max_inputs} "
+                "inputs per chunk"
+            )
+            return plan
+
+        logger.info(f"Consolidating outputs: {assessment.reason}")
+        while assessment.needed and self.rounds < self.max_rounds:
+            before = len(self.session.unspent)
+            if not self._round():
+                break
+            after = len(self.session.unspent)
+            plan = self.replan()
+            assessment = assess(plan, self.target_inputs)
+            logger.info(
+                f"Consolidation round {self.rounds}: {before} -> {after} outputs, "
+                f"at most {assessment.max_inputs} inputs per chunk"
+            )
+            if after >= before:
+                logger.warning("Consolidation made no progress, stopping")
+                break
+
+        if assessment.needed:
+            logger.warning(f"Still fragmented after consolidation: {assessment.reason}")
+        return plan
+
+    def _round(self):
+        self.rounds += 1
+        block_ids = []
+        for _ in range(self.parallel):
+            try:
+                transaction = self.session.consolidate(self.threshold)
+            except Exception as e:
+                # Typically fewer outputs left than the threshold
+                logger.debug(f"Consolidation stopped: {e}")
+                break
+            block_ids.append(transaction["blockId"])
+        self.transactions += len(block_ids)
+        tracked = [self.tracker.track(block_id) for block_id in block_ids]
+        states = [block.wait() for block in tracked]
+        self.session.sync()
+        failed = [state for state in states if state != INCLUDED]
+        if failed:
+            logger.error(f"{len(failed)} consolidation transactions failed: {failed}")
+        return len(failed) < len(block_ids)
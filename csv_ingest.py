@@ -0,0 +1,91 @@
+"""Streaming reads of the recipients CSV file.
+
+The file is never held in memory as a whole. :mod:`recipients` makes a first pass
+with :func:`read_records`, which numbers the data rows by their line in the file and
+gives the byte offset each one starts at; it validates them in batches and only
+keeps compact per-row state (:class:`ValidationResult` holds one validity byte per
+row and the first invalid rows). The rows of a chunk are then read again, just
+before it is sent, with :func:`read_fields` from their offsets, so memory is bounded
+by the chunk size rather than the file size.
+"""
+import csv
+
+# Addresses are in column B, [0] for column A
+ADDRESS_COLUMN = 1
+# Number of rows validated at once
+BATCH_SIZE = 8192
+# Number of invalid rows kept with their content for the report
+MAX_REPORTED_INVALID_ROWS = 1000
+
+
+class ValidationResult:
+    """Outcome of the validation pass.
+
+    ``validity`` holds one byte per data row (1 when valid), ``invalid_rows`` the
+    first :data:`MAX_REPORTED_INVALID_ROWS` invalid rows as ``(row, address, reason)``.
+    """
+
+    def __init__(self):
+        self.validity = bytearray()
+        self.invalid_count = 0
+        self.invalid_rows = []
+
+    @property
+    def row_count(self):
+        return len(self.validity)
+
+    @property
+    def is_valid(self):
+        return self.invalid_count == 0
+
+    def add(self, row, address, reason):
+        self.validity.append(0 if reason else 1)
+        if reason:
+            self.invalid_count += 1
+            if len(self.invalid_rows) < MAX_REPORTED_INVALID_ROWS:
+                self.invalid_rows.append((row, address, reason))
+
+
+class _Lines:
+    """The decoded lines of a binary file, counting the bytes read so far."""
+
+    def __init__(self, file):
+        self.file = file
+        self.position = file.tell()
+
+    def __iter__(self):
+        for line in self.file:
+            self.position += len(line)
+            yield line.decode("UTF8")
+
+
+def read_records(file):
+    """Yield ``(row, offset, fields)`` for every data row of the binary ``file``.
+
+    ``row`` is the line number of the row, the header being line 1, and ``offset``
+    the position of its first byte, to read it again with :func:`read_fields`.
+    """
+    lines = _Lines(file)
+    csv_reader = csv.reader(lines)
+    next(csv_reader, None)  # skip the header row
+    # The reader takes the lines of one row at a time, so the row after the one
+    # just read starts where the lines read so far end
+    offset = lines.position
+    for row, fields in enumerate(csv_reader, start=2):
+        yield row, offset, fields
+        offset = lines.position
+
+
+def read_fields(filename, offsets):
+    """Return the fields of the rows of ``filename`` starting at ``offsets``."""
+    fields = []
+    with open(filename, "rb") as file:
+        lines = None
+        for offset in offsets:
+            # Consecutive rows are read on, without seeking
+            if lines is None or lines.position != offset:
+                file.seek(offset)
+                lines = _Lines(file)
+                csv_reader = csv.reader(lines)
+            fields.append(next(csv_reader, []))
+    return fields
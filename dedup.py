@@ -0,0 +1,206 @@
+"""Duplicate recipients and recipients already paid.
+
+:func:`deduplicate` groups the rows of a :class:`~recipients.RecipientTable` by the
+128 bit hash of their normalized address (see :func:`recipients.recipient_keys`),
+sorting the hashes rather than holding the addresses in a dict, and applies one of
+the policies below to the rows whose address is held by an earlier row:
+
+- ``allow``: report the duplicates and send every row as it is;
+- ``reject``: report the duplicates and send nothing;
+- ``keep-first``: send to the first row only;
+- ``sum``: send one output with the sum of the amounts (and native token amounts)
+  of every row of the address; rows of one address with different native tokens
+  cannot share an output, they are reported and nothing is sent.
+
+Addresses already present in the sent-to ledger are handled the same way with
+``allow``, ``skip`` (drop them) or ``reject``.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+REJECT = "reject"
+KEEP_FIRST = "keep-first"
+SUM = "sum"
+POLICIES = (ALLOW, REJECT, KEEP_FIRST, SUM)
+
+SKIP = "skip"
+SENT_POLICIES = (ALLOW, SKIP, REJECT)
+
+# Number of duplicate rows kept with their content for the report
+MAX_REPORTED_ROWS = 1000
+
+
+def normalize(address):
+    """Return the form of ``address`` duplicates are detected on."""
+    return address.strip().lower()
+
+
+class DedupReport:
+    """Outcome of :func:`deduplicate`.
+
+    ``rows`` lists the first :data:`MAX_REPORTED_ROWS` dropped or merged rows as
+    ``(row, address, reason)``, the reason naming the first row of the address, with
+    rows as ``file:line`` for a table read from several files;
+    ``sent_rows`` all the rows dropped because their address was already paid.
+    """
+
+    def __init__(self, policy, sent_policy):
+        self.policy = policy
+        self.sent_policy = sent_policy
+        self.row_count = 0
+        self.duplicate_count = 0
+        self.duplicate_addresses = 0
+        self.already_sent_count = 0
+        self.conflict_count = 0
+        self.rows = []
+        self.sent_rows = []
+        self.row_label = lambda row: row
+
+    @property
+    def rejected(self):
+        """True if the job must not be sent as is."""
+        return (
+            (self.policy == REJECT and self.duplicate_count > 0)
+            or (self.sent_policy == REJECT and self.already_sent_count > 0)
+            or self.conflict_count > 0
+        )
+
+    def add(self, row, address, reason, first_row=None):
+        if len(self.rows) < MAX_REPORTED_ROWS:
+            if first_row is not None:
+                reason = f"{reason} of row {self.row_label(first_row)}"
+            self.rows.append((self.row_label(row), address, reason))
+
+    def summary(self):
+        text = (
+            f"{self.row_count} rows, {self.duplicate_count} duplicate rows of "
+            f"{self.duplicate_addresses} addresses ({self.policy}), "
+            f"{self.already_sent_count} rows already sent ({self.sent_policy})"
+        )
+        if self.conflict_count:
+            text += (
+                f", {self.conflict_count} rows with a different native token "
+                "(rejected)"
+            )
+        return text
+
+
+def deduplicate(
+    table, policy=ALLOW, sent_addresses=None, sent_policy=ALLOW, excluded_rows=None
+):
+    """Apply ``policy`` to the duplicate addresses of ``table``.
+
+    ``sent_addresses`` is the set of normalized addresses already paid (see
+    :func:`ledger.read_sent_addresses`) or the :class:`ledger_index.LedgerIndex` of
+    the ledger, and ``excluded_rows`` the rows a previous run of the same job dropped
+    as already sent, which is used instead of the ledger when resuming. Returns the
+    deduplicated table and a :class:`DedupReport`.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown duplicate policy {policy!r}, use one of {POLICIES}")
+    if sent_policy not in SENT_POLICIES:
+        raise ValueError(
+            f"Unknown already sent policy {sent_policy!r}, use one of {SENT_POLICIES}"
+        )
+    report = DedupReport(policy, sent_policy)
+    report.row_label = table.row_label
+    report.row_count = len(table)
+    check_sent = sent_addresses is not None and sent_policy != ALLOW
+
+    keys = table.keys()
+    sent = np.zeros(len(table), dtype=bool)
+    if excluded_rows:
+        sent |= np.isin(table.rows, np.fromiter(excluded_rows, np.int64))
+    if check_sent:
+        sent |= _already_sent(keys[:, 0], sent_addresses)
+
+    # First row of the address of every row, by its key
+    candidates = np.flatnonzero(~sent)
+    _, first, inverse = np.unique(
+        np.ascontiguousarray(keys[candidates]).view("V16").ravel(),
+        return_index=True,
+        return_inverse=True,
+    )
+    first_of = np.arange(len(table))
+    first_of[candidates] = candidates[first[inverse.ravel()]]
+    duplicate = first_of != np.arange(len(table))
+
+    report.already_sent_count = int(sent.sum())
+    report.sent_rows = table.rows[sent].tolist()
+    report.duplicate_count = int(duplicate.sum())
+    report.duplicate_addresses = len(np.unique(first_of[duplicate]))
+    reported = np.flatnonzero(sent | duplicate)[:MAX_REPORTED_ROWS]
+    for i, address in zip(reported.tolist(), table.address_list(reported)):
+        row = int(table.rows[i])
+        if sent[i]:
+            report.add(row, normalize(address), "already sent")
+        else:
+            first_row = int(table.rows[first_of[i]])
+            report.add(row, normalize(address), "duplicate", first_row)
+
+    if report.rejected:
+        logger.info(f"Duplicates rejected: {report.summary()}")
+        return table, report
+
+    keep = np.flatnonzero(~sent if policy == ALLOW else ~sent & ~duplicate)
+    result = table.take(keep)
+    if policy == SUM and report.duplicate_count:
+        _sum_duplicates(table, result, keep, first_of, duplicate, report)
+        if report.rejected:
+            logger.info(f"Duplicates rejected: {report.summary()}")
+            return table, report
+    logger.info(f"Deduplicated recipients: {report.summary()}")
+    return result, report
+
+
+def _already_sent(keys, sent_addresses):
+    """Tell which of the ledger index ``keys`` are addresses of ``sent_addresses``."""
+    if hasattr(sent_addresses, "contains_keys"):
+        # The ledger index looks the whole column up at once
+        return sent_addresses.contains_keys(keys)
+    from ledger_index import address_keys
+
+    return np.isin(keys, address_keys(list(sent_addresses)))
+
+
+def _sum_duplicates(table, result, keep, first_of, duplicate, report):
+    """Add the amounts of the duplicate rows to the first row of their address.
+
+    Nothing is summed if rows of an address hold different native tokens: they are
+    reported as conflicts, which rejects the job.
+    """
+    duplicates = np.flatnonzero(duplicate)
+    positions = np.searchsorted(keep, first_of[duplicates])
+    if table.has_tokens:
+        # Only the rows of duplicate addresses are read for their native tokens
+        rows = np.union1d(duplicates, first_of[duplicates])
+        tokens = dict(zip(rows.tolist(), table.token_list(rows)))
+        merged = {}
+        for i, first in zip(duplicates.tolist(), first_of[duplicates].tolist()):
+            holders = merged.setdefault(first, [first] if tokens[first][0] else [])
+            if not tokens[i][0]:
+                continue
+            if holders and tokens[i][0] != tokens[holders[0]][0]:
+                report.conflict_count += 1
+                address = table.address_list([i])[0]
+                report.add(
+                    int(table.rows[i]),
+                    address,
+                    "different native token",
+                    int(table.rows[holders[0]]),
+                )
+                continue
+            holders.append(i)
+        if report.conflict_count:
+            return
+        for first, holders in merged.items():
+            if len(holders) > 1 or (holders and holders[0] != first):
+                token_id = tokens[holders[0]][0]
+                amount = sum(tokens[i][1] for i in holders)
+                result.set_token(int(np.searchsorted(keep, first)), token_id, amount)
+
+    np.add.at(result.amounts, positions, table.amounts[duplicates])
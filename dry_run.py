@@ -0,0 +1,153 @@
+"""Dry run of a bulk send: what a job costs and how long it should take.
+
+:func:`plan_dry_run` works on the recipient table alone, after validation and
+deduplication: nothing is signed, the wallet and Stronghold are not opened and no
+block is submitted. The duration comes from a simple pipeline model: every account
+sends its blocks one after the other, each taking ``send_seconds``, and keeps up to
+``window`` of them waiting ``confirm_seconds`` for their confirmation. The node
+round trips in both figures use the latency measured by a quick probe of the nodes
+when one was made.
+"""
+import datetime
+import logging
+import math
+
+import numpy as np
+
+from planner import MIN_STORAGE_DEPOSIT
+
+logger = logging.getLogger(__name__)
+
+# Signing, proof of work and submitting one block, on top of the node round trips
+SEND_SECONDS = 1.0
+SEND_ROUND_TRIPS = 2
+# From submission to the milestone that confirms the block, milestones coming every
+# 5 seconds or so
+CONFIRM_SECONDS = 10.0
+PROBE_ROUNDS = 3
+
+
+def probe_latency(pool, rounds=PROBE_ROUNDS):
+    """Probe the nodes of ``pool`` and return the latency of the fastest one.
+
+    Returns ``None`` if no node answered.
+    """
+    for _ in range(rounds):
+        pool.probe()
+    latencies = [
+        node["latency"]
+        for node in pool.status()
+        if node["healthy"] and node["latency"] is not None
+    ]
+    return min(latencies) if latencies else None
+
+
+def estimate_duration(blocks, send_seconds, confirm_seconds, window=1, accounts=1):
+    """Return the expected seconds to send and confirm ``blocks`` blocks.
+
+    The blocks are spread over ``accounts`` accounts sending in parallel; each one
+    is limited by its send time or by ``window`` blocks waiting for confirmation,
+    whichever is slower.
+    """
+    if blocks <= 0:
+        return 0.0
+    per_account = math.ceil(blocks / max(1, accounts))
+    interval = max(send_seconds, (send_seconds + confirm_seconds) / max(1, window))
+    return (per_account - 1) * interval + send_seconds + confirm_seconds
+
+
+class DryRunReport:
+    """The figures of a dry run, see :func:`plan_dry_run`."""
+
+    def __init__(self):
+        self.recipients = 0
+        self.blocks = 0
+        self.chunk_size = 0
+        self.amount = 0
+        self.cost = 0
+        self.largest_block_cost = 0
+        self.window = 1
+        self.accounts = 1
+        self.latency = None
+        self.send_seconds = 0.0
+        self.confirm_seconds = 0.0
+        self.duration = 0.0
+
+    @property
+    def deposit_top_up(self):
+        """Glow added to the amounts below the storage deposit of their output."""
+        return self.cost - self.amount
+
+    def summary(self):
+        latency = (
+            "not probed"
+            if self.latency is None
+            else f"{self.latency * 1000:.0f} ms to the fastest node"
+        )
+        duration = datetime.timedelta(seconds=round(self.duration))
+        return (
+            f"{self.recipients} recipients in {self.blocks} blocks of up to "
+            f"{self.chunk_size} outputs\n"
+            f" {self.amount} glow to send, {self.cost} glow with storage deposits "
+            f"({self.deposit_top_up} glow of deposits added), largest block "
+            f"{self.largest_block_cost} glow\n"
+            f" node latency {latency}: {self.send_seconds:.2f}s to send a block, "
+            f"{self.confirm_seconds:.2f}s to confirm it\n"
+            f" expected duration {duration} with {self.window} blocks in flight "
+            f"on {self.accounts} account(s)"
+        )
+
+
+def plan_dry_run(
+    table,
+    chunk_size,
+    window=1,
+    accounts=1,
+    latency=None,
+    send_seconds=None,
+    confirm_seconds=None,
+):
+    """Return the :class:`DryRunReport` of sending ``table`` in chunks of ``chunk_size``.
+
+    ``send_seconds`` and ``confirm_seconds`` default to :data:`SEND_SECONDS` and
+    :data:`CONFIRM_SECONDS` plus the node round trips at the probed ``latency``.
+    With several ``accounts`` the funding transaction of the shards comes first.
+    """
+    report = DryRunReport()
+    report.recipients = len(table)
+    report.chunk_size = chunk_size
+    report.blocks = math.ceil(len(table) / chunk_size)
+    report.window = max(1, window)
+    report.accounts = max(1, accounts)
+    report.latency = latency
+    round_trip = latency or 0.0
+    report.send_seconds = (
+        SEND_SECONDS + SEND_ROUND_TRIPS * round_trip
+        if send_seconds is None
+        else send_seconds
+    )
+    report.confirm_seconds = (
+        CONFIRM_SECONDS + round_trip if confirm_seconds is None else confirm_seconds
+    )
+    if report.recipients:
+        deposits = table.deposits()
+        amounts = np.asarray(table.amounts, dtype=np.int64)
+        costs = np.maximum(
+            amounts, MIN_STORAGE_DEPOSIT if deposits is None else deposits
+        )
+        report.amount = int(amounts.sum())
+        report.cost = int(costs.sum())
+        starts = np.arange(0, len(costs), chunk_size)
+        report.largest_block_cost = int(np.add.reduceat(costs, starts).max())
+
+    report.duration = estimate_duration(
+        report.blocks,
+        report.send_seconds,
+        report.confirm_seconds,
+        report.window,
+        report.accounts,
+    )
+    if report.accounts > 1 and report.blocks:
+        report.blocks += 1
+        report.duration += report.send_seconds + report.confirm_seconds
+    return report
@@ -0,0 +1,209 @@
+"""Crash-safe journal of the chunks of a sending job.
+
+Every chunk goes through ``planned`` (about to be sent), ``submitted`` (sent, with
+its block ID) and ``confirmed``. A chunk whose block was not seen confirmed is
+``unknown``: the block may still be included, so it is never sent again blindly.
+Only a chunk that never got a block ID, or whose transaction is conflicting, is
+``failed``, and sent again by the next run.
+The journal is a SQLite database in WAL mode with ``synchronous=FULL``, so a state
+change is on disk before the next step starts.
+
+On restart, confirmed chunks are skipped with a dictionary lookup, submitted and
+unknown ones are reattached to their block instead of being sent again, and planned
+ones are reported as in doubt because the process may have died after sending them.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from confirmation import CONFLICTING
+
+logger = logging.getLogger(__name__)
+
+PLANNED = "planned"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+UNKNOWN = "unknown"
+# States of the chunks that have a block ID to check before anything is sent again
+SENT = (SUBMITTED, UNKNOWN)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS excluded (
+    row INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk INTEGER PRIMARY KEY,
+    first_row INTEGER NOT NULL,
+    last_row INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    block_id TEXT,
+    transaction_id TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def file_fingerprint(filename):
+    """Return the size and SHA-256 of ``filename``."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return f"{os.path.getsize(filename)}:{digest.hexdigest()}"
+
+
+class JobJournal:
+    """The journal of the input files of a job, sent in chunks of ``chunk_size`` rows.
+
+    ``settings`` are other options that change how rows map to chunks, such as the
+    duplicate policy; resuming with different values is refused.
+    """
+
+    def __init__(self, filename, input_filename, chunk_size, settings=None):
+        self.filename = filename
+        self._lock = threading.Lock()
+        # Autocommit mode: every statement below is its own durable transaction
+        self._connection = sqlite3.connect(
+            filename, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(SCHEMA)
+        if isinstance(input_filename, str):
+            input_filename = [input_filename]
+        expected = {
+            # The rows of several files are numbered in their order
+            "input": ";".join(file_fingerprint(name) for name in input_filename),
+            "chunk_size": str(chunk_size),
+        }
+        expected.update((key, str(value)) for key, value in (settings or {}).items())
+        self._check_job(expected)
+        self._states = {
+            chunk: (state, block_id)
+            for chunk, state, block_id in self._connection.execute(
+                "SELECT chunk, state, block_id FROM chunks"
+            )
+        }
+        logger.info(f"Journal {filename}: {self.summary()}")
+
+    def _check_job(self, expected):
+        stored = dict(self._connection.execute("SELECT key, value FROM job"))
+        started = self._connection.execute("SELECT 1 FROM chunks LIMIT 1").fetchone()
+        if not stored or not started:
+            # Nothing was sent yet, the job can start over with other settings
+            self._connection.execute("DELETE FROM job")
+            self._connection.execute("DELETE FROM excluded")
+            self._connection.executemany(
+                "INSERT INTO job (key, value) VALUES (?, ?)", expected.items()
+            )
+            return
+        if {key: stored.get(key) for key in expected} != expected:
+            raise ValueError(
+                f"Journal {self.filename} belongs to another input file or chunk size. "
+                "Move it away to start a new job."
+            )
+
+    def summary(self):
+        """Return the number of chunks in each state."""
+        counts = {}
+        for state, _ in self._states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def state(self, chunk):
+        """Return ``(state, block_id)`` of ``chunk``, ``(None, None)`` if unknown."""
+        return self._states.get(chunk, (None, None))
+
+    def last_recorded(self):
+        """Return the highest chunk and row recorded, ``(0, -1)`` if there is none."""
+        chunk, row = self._connection.execute(
+            "SELECT MAX(chunk), MAX(last_row) FROM chunks"
+        ).fetchone()
+        return (0, -1) if chunk is None else (chunk, row)
+
+    def in_doubt(self):
+        """Return the chunks that were planned but never recorded as submitted."""
+        return sorted(c for c, (state, _) in self._states.items() if state == PLANNED)
+
+    def excluded_rows(self):
+        """Return the rows excluded when the job started, ``None`` if not recorded yet."""
+        recorded = self._connection.execute(
+            "SELECT value FROM job WHERE key = 'excluded'"
+        ).fetchone()
+        if recorded is None:
+            return None
+        return {row for (row,) in self._connection.execute("SELECT row FROM excluded")}
+
+    def exclude(self, rows):
+        """Record the rows excluded from the job, such as recipients already paid."""
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO excluded (row) VALUES (?)",
+                ((row,) for row in rows),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO job (key, value) VALUES ('excluded', ?)",
+                (str(len(rows)),),
+            )
+            self._connection.execute("COMMIT")
+
+    def _set(self, chunk, state, block_id=None, transaction_id=None, rows=None):
+        with self._lock:
+            if rows is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO chunks"
+                    " (chunk, first_row, last_row, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (chunk, rows[0], rows[1], state, time.time()),
+                )
+            else:
+                self._connection.execute(
+                    "UPDATE chunks SET state = ?,"
+                    " block_id = COALESCE(?, block_id),"
+                    " transaction_id = COALESCE(?, transaction_id),"
+                    " updated_at = ? WHERE chunk = ?",
+                    (state, block_id, transaction_id, time.time(), chunk),
+                )
+                block_id = block_id or self.state(chunk)[1]
+            self._states[chunk] = (state, block_id)
+
+    def planned(self, chunk, first_row, last_row):
+        self._set(chunk, PLANNED, rows=(first_row, last_row))
+
+    def submitted(self, chunk, transaction):
+        self._set(
+            chunk, SUBMITTED, transaction["blockId"], transaction["transactionId"]
+        )
+
+    def confirmed(self, chunk):
+        self._set(chunk, CONFIRMED)
+
+    def failed(self, chunk):
+        self._set(chunk, FAILED)
+
+    def unknown(self, chunk):
+        self._set(chunk, UNKNOWN)
+
+    def not_confirmed(self, chunk, state=None):
+        """Record that ``chunk`` was not seen confirmed, its block being in ``state``.
+
+        It is failed if it never got a block ID or if its transaction is conflicting,
+        which can never be included; unknown otherwise, as after a timeout.
+        """
+        if state == CONFLICTING or self.state(chunk)[1] is None:
+            self.failed(chunk)
+        else:
+            self.unknown(chunk)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
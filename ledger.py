@@ -0,0 +1,242 @@
+"""Buffered writer for the sent-to ledger.
+
+The ledger file stays open for the whole run and every confirmed chunk is written
+with one ``writerows`` call followed by one flush and fsync. The format follows the
+file name given in ``SHIMMER_ADDRESS_SENT_TO_FILENAME``:
+
+- ``*.csv``: plain CSV, appended to, as before;
+- ``*.csv.gz``: gzip compressed CSV, each run appends a new gzip member;
+- ``*.parquet``: a Parquet dataset directory with one part file per run, written in
+  row groups of ``row_group_size`` rows (needs ``pyarrow``). A part file can only be
+  read once it is closed, so every chunk is also appended and fsynced to a CSV
+  write-ahead log next to it (``_part-....parquet.wal.csv``, which Parquet readers
+  skip). The log is removed when the part file is closed; the logs of a run that
+  crashed are turned into part files by the next reader or writer of the dataset.
+
+A run over several input files also writes the file and line of every recipient,
+in the ``source_file`` and ``source_line`` columns.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["address", "explorer_link", "amount", "date_time"]
+SOURCE_COLUMNS = ["source_file", "source_line"]
+WAL_SUFFIX = ".wal.csv"
+EXPLORER_BLOCK_URL = "https://explorer.shimmer.network/shimmer/block/"
+
+
+def ledger_rows(outputs, block_id, sources=False):
+    """Return the ledger rows of the ``outputs`` confirmed in ``block_id``.
+
+    With ``sources``, every row ends with the file and line of its recipient, taken
+    from :class:`recipients.SourcedOutputs` (empty for plain outputs).
+    """
+    explorer_link = f"{EXPLORER_BLOCK_URL}{block_id}"
+    date_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        [output["address"], explorer_link, output["amount"], date_time]
+        for output in outputs
+    ]
+    if sources:
+        lines = getattr(outputs, "sources", None) or [("", "")] * len(rows)
+        for row, (filename, line) in zip(rows, lines):
+            row += [filename, line]
+    return rows
+
+
+def read_sent_addresses(filename, recover=True):
+    """Return the set of addresses already in the ledger ``filename``, lowercased.
+
+    A missing ledger is an empty one. Without ``recover`` a Parquet ledger is read
+    as it is: the part files left unclosed by a crash are read from their logs
+    instead of being rewritten.
+    """
+    if not os.path.exists(filename):
+        return set()
+    if filename.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        if recover:
+            recover_parquet(filename)
+            column = pq.read_table(filename, columns=["address"]).column("address")
+            return {address.lower() for address in column.to_pylist()}
+        addresses = set()
+        logs = {}
+        for entry in os.scandir(filename):
+            if entry.name.startswith("_") and entry.name.endswith(WAL_SUFFIX):
+                logs[entry.name[1:].replace(WAL_SUFFIX, "")] = entry.path
+        for log in logs.values():
+            with open(log, encoding="UTF8", newline="") as file:
+                rows = csv.reader(file)
+                addresses.update(row[0].strip().lower() for row in rows if row)
+        for entry in os.scandir(filename):
+            if not entry.name.startswith("_") and entry.name not in logs:
+                column = pq.read_table(entry.path, columns=["address"])["address"]
+                addresses.update(address.lower() for address in column.to_pylist())
+        return addresses
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", encoding="UTF8", newline="") as file:
+        return {row[0].strip().lower() for row in csv.reader(file) if row}
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def recover_parquet(directory):
+    """Rewrite the part files of ``directory`` left unclosed by a crash from their logs.
+
+    The logs of runs still going on are left alone.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for entry in os.scandir(directory):
+        if not (entry.name.startswith("_") and entry.name.endswith(WAL_SUFFIX)):
+            continue
+        part = entry.name[1:].replace(WAL_SUFFIX, "")
+        pid = part.rsplit("-", 1)[-1].split(".")[0]
+        if pid.isdigit() and _running(int(pid)):
+            continue
+        with open(entry.path, encoding="UTF8", newline="") as file:
+            rows = [row for row in csv.reader(file) if row]
+        if rows:
+            columns = (
+                COLUMNS + SOURCE_COLUMNS if len(rows[0]) > len(COLUMNS) else COLUMNS
+            )
+            schema = pa.schema([(column, pa.string()) for column in columns])
+            arrays = [list(column) for column in zip(*rows)]
+            pq.write_table(
+                pa.Table.from_arrays(arrays, schema=schema),
+                os.path.join(directory, part),
+            )
+            logger.warning(f"Recovered {len(rows)} ledger rows of {part} from its log")
+        else:
+            path = os.path.join(directory, part)
+            if os.path.exists(path):
+                os.remove(path)
+        os.remove(entry.path)
+
+
+class LedgerWriter:
+    """Append confirmed chunks to the ledger ``filename``.
+
+    With ``sources``, the rows also hold the file and line of their recipient. The
+    addresses of every chunk are added to ``index``, the
+    :class:`ledger_index.LedgerIndex` of the ledger, if given.
+    """
+
+    def __init__(self, filename, row_group_size=65536, sources=False, index=None):
+        self.filename = filename
+        self.sources = sources
+        self.index = index
+        self.row_count = 0
+        # Chunks are confirmed on tracker threads, and by every shard of a run
+        self._lock = threading.Lock()
+        if filename.endswith(".parquet"):
+            columns = COLUMNS + SOURCE_COLUMNS if sources else COLUMNS
+            self._sink = _ParquetSink(filename, row_group_size, columns)
+        elif filename.endswith(".gz"):
+            self._sink = _CsvSink(gzip.open(filename, "ab"))
+        else:
+            self._sink = _CsvSink(open(filename, "ab"))
+
+    def write_chunk(self, outputs, block_id):
+        """Write the rows of a confirmed chunk and make them durable."""
+        with metrics.span("write"):
+            rows = ledger_rows(outputs, block_id, self.sources)
+            with self._lock:
+                self._sink.write(rows)
+                self.row_count += len(rows)
+                if self.index is not None:
+                    self.index.add([row[0] for row in rows])
+        metrics.count("recipients_confirmed", len(rows))
+        logger.info(
+            f"Transaction details appended to {self.filename} for {len(rows)} "
+            f"addresses in block {block_id}"
+        )
+
+    def close(self):
+        with self._lock:
+            self._sink.close()
+            if self.index is not None:
+                self.index.sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _CsvSink:
+    def __init__(self, binary_file):
+        self._binary = binary_file
+        self._text = io.TextIOWrapper(binary_file, encoding="UTF8", newline="")
+        self._writer = csv.writer(self._text)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._text.flush()
+        self._binary.flush()
+        # GzipFile.fileobj is the underlying file, plain files are their own
+        raw = getattr(self._binary, "fileobj", None) or self._binary
+        os.fsync(raw.fileno())
+
+    def close(self):
+        self._text.close()
+
+
+class _ParquetSink:
+    def __init__(self, directory, row_group_size, columns=COLUMNS):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(directory, exist_ok=True)
+        recover_parquet(directory)
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in columns])
+        name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.parquet"
+        part = os.path.join(directory, name)
+        # The log is created first, a part file without one is always complete
+        self._wal_filename = os.path.join(directory, f"_{name}{WAL_SUFFIX}")
+        self._wal = _CsvSink(open(self._wal_filename, "ab"))
+        self._writer = pq.ParquetWriter(part, self._schema)
+        self._row_group_size = row_group_size
+        self._rows = []
+
+    def write(self, rows):
+        # Durable in the log, the part file is only readable once closed
+        self._wal.write(rows)
+        self._rows.extend(rows)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        columns = [[str(value) for value in column] for column in zip(*self._rows)]
+        table = self._pa.Table.from_arrays(columns, schema=self._schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        self._wal.close()
+        os.remove(self._wal_filename)
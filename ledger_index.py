@@ -0,0 +1,242 @@
+"""On-disk index of the addresses in the sent-to ledger.
+
+Telling whether a recipient was already paid used to mean reading the whole ledger
+into a set. The index is a hash table of 64 bit address hashes in a file next to the
+ledger (``sent.csv.index``), read through a memory map: looking an address up
+touches one or two slots, whatever the size of the ledger. It is a linear probing
+table, at most half full, doubled and rewritten when it gets fuller; a hash of 0
+marks an empty slot.
+
+:class:`ledger.LedgerWriter` adds the addresses of every confirmed chunk to it, then
+records the size of the ledger in its header. An index whose size does not match
+the ledger (missing, from an older run that crashed, or a ledger edited by hand) is
+rebuilt from the ledger when opened.
+
+A read-only index, for the checks that must not leave files behind, maps an up to
+date index file read-only and otherwise builds the table in memory.
+
+A hash collision can only make an unpaid address look paid, which for 64 bit hashes
+takes billions of addresses to become likely.
+"""
+import logging
+import os
+
+import numpy as np
+
+from dedup import normalize
+from ledger import read_sent_addresses
+from validation_cache import hash_row, hash_rows
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SMRLIDX1"
+HEADER = np.dtype(
+    [("magic", "S8"), ("capacity", "<u8"), ("count", "<u8"), ("ledger_size", "<u8")]
+)
+# Seed of the address hash, to change with MAGIC
+KEY_SEED = 0x4C
+MIN_CAPACITY = 1 << 16
+# Largest fraction of used slots before the table is doubled
+MAX_LOAD = 0.5
+
+
+def index_filename(ledger_filename):
+    return f"{ledger_filename.rstrip(os.sep)}.index"
+
+
+def ledger_size(filename):
+    """Return the size of the ledger ``filename``, in all its files for Parquet."""
+    if os.path.isdir(filename):
+        return sum(entry.stat().st_size for entry in os.scandir(filename))
+    if os.path.exists(filename):
+        return os.path.getsize(filename)
+    return 0
+
+
+def address_keys(addresses, seed=KEY_SEED):
+    """Return the 64 bit hash of every normalized address of ``addresses``, never 0."""
+    # dedup.normalize, inlined
+    encoded = [address.strip().lower().encode() for address in addresses]
+    lengths = np.fromiter(map(len, encoded), np.intp, len(encoded))
+    keys = np.zeros(len(encoded), dtype=np.uint64)
+    # Addresses of the same length are hashed together, usually all of them at once
+    for width in np.unique(lengths).tolist():
+        rows = np.flatnonzero(lengths == width)
+        raw = b"".join([encoded[i] for i in rows.tolist()])
+        characters = np.frombuffer(raw, dtype=np.uint8).reshape(len(rows), width)
+        keys[rows] = hash_rows(characters, seed)
+    keys[keys == 0] = 1
+    return keys
+
+
+def _unique(keys):
+    """``np.unique`` for 64 bit keys, which a plain sort does faster."""
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+
+def _capacity(count):
+    capacity = MIN_CAPACITY
+    while count > capacity * MAX_LOAD:
+        capacity *= 2
+    return capacity
+
+
+class LedgerIndex:
+    """The index file ``filename`` of the ledger ``ledger_filename``.
+
+    Use :func:`open_index` to open it; ``address in index`` tells if one address was
+    paid, :meth:`contains` does it for a whole list. Nothing can be added to a
+    ``read_only`` index.
+    """
+
+    def __init__(self, filename, ledger_filename, read_only=False):
+        self.filename = filename
+        self.ledger_filename = ledger_filename
+        self.read_only = read_only
+        self._header = None
+        self._slots = None
+
+    def _map(self):
+        mode = "r" if self.read_only else "r+"
+        self._header = np.memmap(self.filename, HEADER, mode, shape=(1,))
+        capacity = int(self._header["capacity"][0])
+        self._slots = np.memmap(
+            self.filename, np.uint64, mode, offset=HEADER.itemsize, shape=(capacity,)
+        )
+
+    def _valid(self):
+        """Map the index file, return False if it is missing or not an index."""
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        if size < HEADER.itemsize:
+            return False
+        header = np.fromfile(self.filename, HEADER, count=1)[0]
+        if header["magic"] != MAGIC:
+            return False
+        if size != HEADER.itemsize + 8 * int(header["capacity"]):
+            return False
+        self._map()
+        return True
+
+    @property
+    def ledger_size(self):
+        return int(self._header["ledger_size"][0])
+
+    def __len__(self):
+        return int(self._header["count"][0])
+
+    def __contains__(self, address):
+        key = hash_row(normalize(address).encode(), KEY_SEED) or 1
+        slots = self._slots
+        mask = len(slots) - 1
+        position = int(key) & mask
+        while True:
+            slot = slots[position]
+            if slot == key:
+                return True
+            if slot == 0:
+                return False
+            position = (position + 1) & mask
+
+    def contains(self, addresses):
+        """Return a boolean array telling which of ``addresses`` were paid."""
+        return self.contains_keys(address_keys(addresses))
+
+    def contains_keys(self, keys):
+        """:meth:`contains` for the :func:`address_keys` of the addresses."""
+        found = np.zeros(len(keys), dtype=bool)
+        mask = np.uint64(len(self._slots) - 1)
+        active = np.arange(len(keys))
+        positions = keys & mask
+        # One probe of every address still looking at a used slot at a time
+        while len(active):
+            slots = self._slots[positions]
+            hit = slots == keys[active]
+            found[active[hit]] = True
+            going_on = (slots != 0) & ~hit
+            active = active[going_on]
+            positions = (positions[going_on] + np.uint64(1)) & mask
+        return found
+
+    def add(self, addresses):
+        """Add ``addresses``, just written to the ledger."""
+        if self.read_only:
+            raise ValueError(f"{self.filename} is open read-only")
+        keys = _unique(address_keys(addresses))
+        keys = keys[~self.contains_keys(keys)]
+        if len(self) + len(keys) > len(self._slots) * MAX_LOAD:
+            old = np.asarray(self._slots)
+            self._write(np.concatenate((old[old != 0], keys)))
+            return
+        self._insert(keys)
+        self._header["count"] += len(keys)
+        self.sync()
+
+    def sync(self):
+        """Write out the table and record the current size of the ledger."""
+        if self.read_only:
+            return
+        self._slots.flush()
+        self._header["ledger_size"] = ledger_size(self.ledger_filename)
+        self._header.flush()
+
+    def _insert(self, keys):
+        """Put ``keys``, none of them in the table yet, in their slots."""
+        mask = np.uint64(len(self._slots) - 1)
+        positions = keys & mask
+        while len(keys):
+            # Of the keys whose slot is free, the first one for each slot takes it
+            free = np.flatnonzero(self._slots[positions] == 0)
+            _, first = np.unique(positions[free], return_index=True)
+            taken = free[first]
+            self._slots[positions[taken]] = keys[taken]
+            left = np.ones(len(keys), dtype=bool)
+            left[taken] = False
+            keys = keys[left]
+            positions = (positions[left] + np.uint64(1)) & mask
+
+    def _write(self, keys):
+        """Write a new index file holding the distinct ``keys``, in memory if read-only."""
+        self.close()
+        header = np.zeros(1, HEADER)
+        header["magic"] = MAGIC
+        header["capacity"] = _capacity(len(keys))
+        if self.read_only:
+            self._header = header
+            self._slots = np.zeros(int(header["capacity"][0]), dtype=np.uint64)
+        else:
+            temporary = f"{self.filename}.tmp"
+            with open(temporary, "wb") as file:
+                header.tofile(file)
+                file.truncate(HEADER.itemsize + 8 * int(header["capacity"][0]))
+            os.replace(temporary, self.filename)
+            self._map()
+        self._insert(keys)
+        self._header["count"] = len(keys)
+        self.sync()
+
+    def rebuild(self):
+        """Index every address of the ledger again."""
+        addresses = read_sent_addresses(self.ledger_filename, not self.read_only)
+        self._write(_unique(address_keys(list(addresses))))
+        logger.info(
+            f"Indexed the {len(self)} addresses of {self.ledger_filename} "
+            f"into {'memory' if self.read_only else self.filename}"
+        )
+
+    def close(self):
+        if self._slots is not None and not self.read_only:
+            self._slots.flush()
+        self._header = self._slots = None
+
+
+def open_index(ledger_filename, read_only=False):
+    """Open the index of the ledger ``ledger_filename``, rebuilding it if needed.
+
+    With ``read_only`` no file is written, see :class:`LedgerIndex`.
+    """
+    index = LedgerIndex(index_filename(ledger_filename), ledger_filename, read_only)
+    if not index._valid() or index.ledger_size != ledger_size(ledger_filename):
+        index.close()
+        index.rebuild()
+    return index
@@ -0,0 +1,67 @@
+"""Queued logging for long runs: handlers that write from a background thread.
+
+With :func:`queue_handlers` the loggers of a run only put their records on a queue;
+a :class:`logging.handlers.QueueListener` thread formats them and writes them to a
+log file that rotates every ``max_bytes`` bytes, compressing the old files with gzip,
+and to the console. Disk and terminal I/O, and the formatting of the messages, stay
+off the sending threads.
+"""
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+# Size of the log file before it is rotated, and rotated files kept
+LOG_MAX_BYTES = 64 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+
+
+class InProcessQueueHandler(logging.handlers.QueueHandler):
+    """Queue the records as they are, for a listener thread of the same process.
+
+    :class:`logging.handlers.QueueHandler` formats every message before queuing it,
+    so that the record can be pickled; the listener of a run lives in the same
+    process and formats it instead.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def gzip_namer(name):
+    return f"{name}.gz"
+
+
+def gzip_rotator(source, dest):
+    """Compress the rotated log file ``source`` into ``dest``."""
+    with open(source, "rb") as plain, gzip.open(dest, "wb") as compressed:
+        shutil.copyfileobj(plain, compressed)
+    os.remove(source)
+
+
+def rotating_file_handler(
+    filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT
+):
+    """Return a handler writing to ``filename``, rotated into ``filename.1.gz`` etc."""
+    handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding="UTF8"
+    )
+    handler.namer = gzip_namer
+    handler.rotator = gzip_rotator
+    return handler
+
+
+def queue_handlers(logger, handlers):
+    """Send the records of ``logger`` to ``handlers`` through a listener thread.
+
+    Returns the started listener; stopping it writes out the queued records.
+    """
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True
+    )
+    logger.addHandler(InProcessQueueHandler(records))
+    listener.start()
+    return listener
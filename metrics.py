@@ -0,0 +1,191 @@
+"""Timing spans, counters and histograms of a run, exported at exit.
+
+The hot path records into the module-level registry with :func:`span`,
+:func:`count` and :func:`observe`; each call costs a clock read, a lock and a
+bisect, whatever the log level. The spans of a run are:
+
+- ``parse`` and ``validate``: reading the CSV file and checking its addresses,
+  ``parse`` also reading the rows of a chunk again before it is sent;
+- ``sync``: full account syncs of the wallet session;
+- ``build``: building the output dicts of a chunk;
+- ``submit``: sending a transaction to the wallet;
+- ``confirm``: from tracking a block to its confirmation or failure;
+- ``write``: writing a confirmed chunk to the sent-to ledger.
+
+:func:`write` saves a JSON summary, or the Prometheus text format for a ``.prom`` or
+``.txt`` file name, for a node exporter textfile collector.
+"""
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "shimmer"
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# Buckets of the histograms that are not timings
+BUCKETS = {"polls_per_block": COUNT_BUCKETS}
+
+
+class Histogram:
+    """Cumulative bucket counts, sum, minimum and maximum of observed values."""
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket holding the ``fraction`` quantile."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6),
+            "min": round(self.min, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+        }
+
+
+class Metrics:
+    """A registry of counters, span timings and other histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.counters = {}
+            self.spans = {}
+            self.histograms = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(
+                    BUCKETS.get(name, SECONDS_BUCKETS)
+                )
+            histogram.observe(value)
+
+    def observe_span(self, name, seconds):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the ``with`` block as span ``name``, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_span(name, time.perf_counter() - start)
+
+    def summary(self):
+        """Return the metrics as a dict, ready for JSON."""
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            confirmed = self.counters.get("recipients_confirmed", 0)
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "recipients_per_second": round(confirmed / elapsed, 3)
+                if elapsed
+                else 0.0,
+                "counters": dict(self.counters),
+                "spans": {name: h.summary() for name, h in self.spans.items()},
+                "histograms": {
+                    name: h.summary() for name, h in self.histograms.items()
+                },
+            }
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            f"# TYPE {PREFIX}_run_seconds gauge",
+            f"{PREFIX}_run_seconds {summary['elapsed_seconds']}",
+            f"# TYPE {PREFIX}_recipients_per_second gauge",
+            f"{PREFIX}_recipients_per_second {summary['recipients_per_second']}",
+        ]
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                lines.append(f"{PREFIX}_{name}_total {value}")
+            if self.spans:
+                lines.append(f"# TYPE {PREFIX}_span_seconds histogram")
+            for name, histogram in sorted(self.spans.items()):
+                lines += _histogram_lines(
+                    f"{PREFIX}_span_seconds", histogram, f'span="{name}"'
+                )
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {PREFIX}_{name} histogram")
+                lines += _histogram_lines(f"{PREFIX}_{name}", histogram)
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        """Save the metrics to ``filename``, see the module docstring for the format."""
+        if filename.endswith((".prom", ".txt")):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.summary(), indent=2) + "\n"
+        with open(filename, "w", encoding="UTF8") as file:
+            file.write(text)
+
+
+def _histogram_lines(name, histogram, labels=""):
+    separator = "," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {round(histogram.sum, 6)}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+# The registry of the run
+registry = Metrics()
+count = registry.count
+observe = registry.observe
+observe_span = registry.observe_span
+span = registry.span
+summary = registry.summary
+write = registry.write
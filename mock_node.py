@@ -0,0 +1,401 @@
+"""In-process stand-ins for the Shimmer node and wallet account.
+
+They implement just enough of the ``iota_client`` / ``iota_wallet`` surface used by
+the scripts in this repository to run them locally without a network or real funds.
+"""
+import itertools
+import random
+import threading
+import time
+
+MAINNET_NETWORK_ID = "14364762045254553490"
+MAX_INPUTS = 128
+# Storage deposit of a basic output with only an address unlock condition
+MIN_STORAGE_DEPOSIT = 42600
+
+
+class MockNode:
+    """A fake node that includes every submitted block after a scriptable delay.
+
+    ``confirmation_delay`` is either a number of seconds or a callable receiving the
+    index of the block and returning its delay; ``None`` means the block is never
+    included and the node asks for it to be reattached. A ``conflict_rate`` fraction
+    of the blocks end up ``conflicting`` instead of ``included``.
+    """
+
+    def __init__(self, confirmation_delay=0.5, conflict_rate=0.0, seed=0):
+        self.confirmation_delay = confirmation_delay
+        self.conflict_rate = conflict_rate
+        self._random = random.Random(seed)
+        self._blocks = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._transactions = {}
+        self._incoming = {}
+        self._watched = set()
+        self.metadata_calls = 0
+
+    def watch(self, address):
+        """Keep track of the outputs sent to ``address``, see :meth:`received`."""
+        with self._lock:
+            self._watched.add(address)
+            self._incoming.setdefault(address, [])
+
+    def submit(self, payload, transaction_id=None):
+        """Store a block and return its ID."""
+        with self._lock:
+            index = next(self._counter)
+            block_id = f"0x{index:064x}"
+            delay = self.confirmation_delay
+            if callable(delay):
+                delay = delay(index)
+            transaction_id = transaction_id or block_id
+            self._blocks[block_id] = {
+                "submitted_at": time.monotonic(),
+                "delay": delay,
+                "conflicting": self._random.random() < self.conflict_rate,
+                "payload": payload,
+                "transaction_id": transaction_id,
+            }
+            self._transactions.setdefault(transaction_id, []).append(block_id)
+            for i, output in enumerate(payload or []):
+                if output.get("address") in self._watched:
+                    self._incoming[output["address"]].append(
+                        (block_id, i, int(output["amount"]))
+                    )
+        return block_id
+
+    def received(self, address):
+        """Return ``(block_id, index, amount)`` of the included outputs to ``address``.
+
+        Only the outputs to a watched address are kept.
+        """
+        with self._lock:
+            incoming = list(self._incoming.get(address, ()))
+        return [
+            item for item in incoming if self.inclusion_state(item[0]) == "included"
+        ]
+
+    def included_at(self, block_id):
+        """Return the monotonic time the block was included at, ``None`` if never."""
+        with self._lock:
+            block = self._blocks[block_id]
+        if block["delay"] is None:
+            return None
+        return block["submitted_at"] + block["delay"]
+
+    def inclusion_state(self, block_id):
+        included_at = self.included_at(block_id)
+        if included_at is None or time.monotonic() < included_at:
+            return None
+        return "conflicting" if self._blocks[block_id]["conflicting"] else "included"
+
+    def transaction_state(self, transaction_id):
+        """Return the state of the transaction over all the blocks that carry it."""
+        with self._lock:
+            block_ids = list(self._transactions.get(transaction_id, ()))
+        states = [self.inclusion_state(block_id) for block_id in block_ids]
+        if "included" in states:
+            return "included"
+        return states[-1] if states else None
+
+    def is_included(self, block_id):
+        return self.inclusion_state(block_id) is not None
+
+    def get_block_metadata(self, block_id):
+        """Return the block metadata in the same shape as ``IotaClient``."""
+        with self._lock:
+            self.metadata_calls += 1
+            block = self._blocks[block_id]
+        metadata = {"blockId": block_id, "isSolid": True}
+        state = self.inclusion_state(block_id)
+        if state is not None:
+            metadata["ledgerInclusionState"] = state
+        elif block["delay"] is None:
+            metadata["shouldReattach"] = True
+        return metadata
+
+    def reattach(self, block_id):
+        """Submit the payload of ``block_id`` again in a new block."""
+        with self._lock:
+            block = self._blocks[block_id]
+        new_block_id = self.submit(block["payload"], block["transaction_id"])
+        return new_block_id, {"payload": block["payload"]}
+
+    def promote(self, block_id):
+        return block_id, {}
+
+
+class MockReplica:
+    """A view of a :class:`MockNode` with its own latency and failures.
+
+    Several replicas of the same node behave like several nodes of one network: a
+    block submitted through one of them is seen by all of them. ``down`` makes every
+    call fail, as a node that is unreachable.
+    """
+
+    def __init__(self, node, latency=0.0, failure_rate=0.0, seed=0):
+        self.node = node
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.down = False
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.calls += 1
+            failed = self.down or self._random.random() < self.failure_rate
+        latency = self.latency() if callable(self.latency) else self.latency
+        time.sleep(latency)
+        if failed:
+            raise ConnectionError("mock node unavailable")
+
+    def get_info(self):
+        self._request()
+        return {"name": "mock", "status": {"isHealthy": True}}
+
+    def get_block_metadata(self, block_id):
+        self._request()
+        return self.node.get_block_metadata(block_id)
+
+    def reattach(self, block_id):
+        self._request()
+        return self.node.reattach(block_id)
+
+    def promote(self, block_id):
+        self._request()
+        return self.node.promote(block_id)
+
+
+class MockAccount:
+    """A fake wallet account holding ``output_count`` unspent outputs.
+
+    A ``send_failure_rate`` fraction of the sends is rejected before any output is
+    spent, as a node refusing the block.
+    """
+
+    def __init__(
+        self,
+        node,
+        output_count=16,
+        output_amount=10**12,
+        send_latency=0.05,
+        sync_latency=0.0,
+        address="smr1mock",
+        send_failure_rate=0.0,
+        seed=0,
+    ):
+        self.node = node
+        self.address = address
+        self.send_latency = send_latency
+        self.sync_latency = sync_latency
+        self.send_failure_rate = send_failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._unspent = {}
+        self._pending = {}
+        self._received = set()
+        for _ in range(output_count):
+            self._add_output(output_amount)
+        node.watch(address)
+
+    def _add_output(self, amount):
+        output_id = f"0x{next(self._counter):064x}0000"
+        self._unspent[output_id] = {
+            "outputId": output_id,
+            "output": {"type": 3, "amount": str(amount)},
+            "isSpent": False,
+        }
+        return output_id
+
+    def _release_confirmed(self):
+        """Turn the remainders of included transactions into spendable outputs."""
+        for block_id, (transaction, remainder) in list(self._pending.items()):
+            state = self.node.transaction_state(transaction["transactionId"])
+            if state is None:
+                continue
+            del self._pending[block_id]
+            if state == "conflicting":
+                # The transaction never happened, its input is unspent again
+                remainder = sum(
+                    int(item["output"]["amount"]) for item in transaction["inputs"]
+                )
+            if remainder:
+                self._add_output(remainder)
+        # Outputs sent to this account by others
+        for block_id, index, amount in self.node.received(self.address):
+            if (block_id, index) not in self._received:
+                self._received.add((block_id, index))
+                self._add_output(amount)
+
+    def sync(self):
+        time.sleep(self.sync_latency)
+        with self._lock:
+            self._release_confirmed()
+            available = sum(int(o["output"]["amount"]) for o in self._unspent.values())
+        return {"baseCoin": {"total": str(available), "available": str(available)}}
+
+    def get_balance(self):
+        with self._lock:
+            available = sum(int(o["output"]["amount"]) for o in self._unspent.values())
+        return {"baseCoin": {"total": str(available), "available": str(available)}}
+
+    def addresses(self):
+        return [{"address": self.address}]
+
+    def unspent_outputs(self):
+        with self._lock:
+            self._release_confirmed()
+            return list(self._unspent.values())
+
+    def send_amount(self, outputs, options=None):
+        """Spend unlocked outputs to pay ``outputs`` and return the transaction.
+
+        The ``mandatoryInputs`` of ``options`` are spent first, then the largest
+        outputs until the amount is covered, with at most ``MAX_INPUTS`` inputs.
+        """
+        below = [
+            o
+            for o in outputs
+            if "address" in o and int(o["amount"]) < MIN_STORAGE_DEPOSIT
+        ]
+        if below:
+            raise ValueError(
+                f"{len(below)} outputs below the storage deposit of "
+                f"{MIN_STORAGE_DEPOSIT} glow"
+            )
+        total = sum(int(o["amount"]) for o in outputs)
+        time.sleep(self.send_latency)
+        with self._lock:
+            if self._random.random() < self.send_failure_rate:
+                raise RuntimeError("mock node rejected the block")
+            self._release_confirmed()
+            mandatory = (options or {}).get("mandatoryInputs") or []
+            missing = [
+                output_id for output_id in mandatory if output_id not in self._unspent
+            ]
+            if missing:
+                raise ValueError(f"Mandatory inputs are not unspent: {missing}")
+            others = sorted(
+                (i for i in self._unspent if i not in mandatory),
+                key=lambda i: -int(self._unspent[i]["output"]["amount"]),
+            )
+            selected = []
+            amount = 0
+            for output_id in list(mandatory) + others:
+                if amount >= total and selected:
+                    break
+                selected.append(output_id)
+                amount += int(self._unspent[output_id]["output"]["amount"])
+            if amount < total:
+                raise ValueError("Insufficient funds")
+            if len(selected) > MAX_INPUTS:
+                raise ValueError(
+                    f"{len(selected)} inputs needed, the limit is {MAX_INPUTS}"
+                )
+            inputs = [
+                {"metadata": {"outputId": i}, "output": self._unspent.pop(i)["output"]}
+                for i in selected
+            ]
+            block_id = self.node.submit(outputs)
+            transaction = {
+                "blockId": block_id,
+                "transactionId": block_id,
+                "networkId": MAINNET_NETWORK_ID,
+                "inputs": inputs,
+            }
+            self._pending[block_id] = (transaction, amount - total)
+        return transaction
+
+    def prepare_output(self, options):
+        """Build a basic output from wallet ``OutputOptions``.
+
+        Like the wallet, the amount is raised to the storage deposit if it is below.
+        """
+        output = {
+            "type": 3,
+            "amount": str(max(int(options["amount"]), MIN_STORAGE_DEPOSIT)),
+            "unlockConditions": [
+                {"type": 0, "address": options["recipientAddress"]},
+            ],
+        }
+        if "features" in options:
+            output["features"] = options["features"]
+        if "assets" in options:
+            output["nativeTokens"] = options["assets"]["nativeTokens"]
+        return output
+
+    def send_outputs(self, outputs, options=None):
+        """Send prepared outputs, see :meth:`send_amount`."""
+        return self.send_amount(
+            [{"address": "", "amount": output["amount"]} for output in outputs],
+            options,
+        )
+
+    def consolidate_outputs(self, force=False, output_consolidation_threshold=None):
+        """Merge up to ``MAX_INPUTS`` unspent outputs into one, once included."""
+        time.sleep(self.send_latency)
+        with self._lock:
+            self._release_confirmed()
+            threshold = output_consolidation_threshold or 2
+            if len(self._unspent) < threshold:
+                raise ValueError("Not enough outputs to consolidate")
+            selected = list(self._unspent)[:MAX_INPUTS]
+            inputs = [
+                {"metadata": {"outputId": i}, "output": self._unspent.pop(i)["output"]}
+                for i in selected
+            ]
+            amount = sum(int(item["output"]["amount"]) for item in inputs)
+            block_id = self.node.submit([])
+            transaction = {
+                "blockId": block_id,
+                "transactionId": block_id,
+                "networkId": MAINNET_NETWORK_ID,
+                "inputs": inputs,
+            }
+            self._pending[block_id] = (transaction, amount)
+        return transaction
+
+    def pending_transactions(self):
+        with self._lock:
+            self._release_confirmed()
+            return [transaction for transaction, _ in self._pending.values()]
+
+
+class MockWallet:
+    """A fake ``IotaWallet`` with configurable construction and unlock costs."""
+
+    def __init__(self, account, open_latency=0.0, unlock_latency=0.0):
+        self.account = account
+        self.accounts = {}
+        self.unlock_latency = unlock_latency
+        time.sleep(open_latency)
+
+    def create_account(self, account_name):
+        """Add an empty account on the same node, with its own address."""
+        self.accounts[account_name] = MockAccount(
+            self.account.node,
+            output_count=0,
+            send_latency=self.account.send_latency,
+            sync_latency=self.account.sync_latency,
+            address=f"smr1mock{account_name}",
+            send_failure_rate=self.account.send_failure_rate,
+            seed=len(self.accounts) + 1,
+        )
+        return self.accounts[account_name]
+
+    def store_mnemonic(self, mnemonic):
+        pass
+
+    def get_accounts(self):
+        return [{"alias": name} for name in self.accounts]
+
+    def get_account(self, account_name):
+        """Return an account made by :meth:`create_account`, the main one otherwise."""
+        return self.accounts.get(account_name, self.account)
+
+    def set_stronghold_password(self, password):
+        time.sleep(self.unlock_latency)
@@ -0,0 +1,221 @@
+"""A pool of nodes with health checks and latency-based routing.
+
+:class:`NodePool` wraps one client per node URL and keeps, for every node, an
+exponentially weighted moving average (EWMA) of its latency and error rate. Calls go
+to the fastest healthy node and fail over to the next one on errors. Confirmation
+polls are spread over the healthy nodes that are not much slower than the fastest
+one, so that a large airdrop does not hammer (and get rate-limited by) a single node.
+
+A node that fails ``max_failures`` times in a row is taken out of rotation for
+``cooldown`` seconds; a background thread probes every node each ``probe_interval``
+seconds to refresh its latency and bring recovered nodes back.
+
+The pool has the same methods as ``IotaClient`` for what the scripts use, so it can
+be passed wherever a client is expected: status polls, reattachments and promotions
+go through it. The wallet does its own networking, so transactions are not routed
+by the pool: after a :meth:`NodePool.probe`, :meth:`NodePool.client_options` makes
+the fastest node the primary node of the wallet, for the whole run, with the others
+as the wallet's own fallbacks.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def node_urls(default):
+    """Return the node URLs of ``SHIMMER_NODE_URLS`` (comma separated) or ``default``."""
+    value = os.getenv("SHIMMER_NODE_URLS")
+    if not value:
+        return list(default)
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+class NodeStats:
+    """Latency and error statistics of one node."""
+
+    def __init__(self, url, client, alpha):
+        self.url = url
+        self.client = client
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.calls = 0
+        self.down_until = 0.0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def score(self):
+        """Expected cost of a call: latency inflated by the error rate."""
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + 4 * self.error_rate)
+
+    def record(self, latency=None, error=False):
+        self.calls += 1
+        self.error_rate += self.alpha * (float(error) - self.error_rate)
+        if error:
+            self.failures += 1
+            return
+        self.failures = 0
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+
+
+class NodePool:
+    """Route client calls to the fastest healthy node of ``clients``.
+
+    ``clients`` maps node URLs to client objects; see :meth:`from_urls`.
+    """
+
+    def __init__(
+        self,
+        clients,
+        probe_interval=30,
+        max_failures=3,
+        cooldown=60,
+        alpha=0.2,
+        spread=2.0,
+        seed=None,
+    ):
+        if not clients:
+            raise ValueError("The node pool needs at least one node")
+        self.nodes = [NodeStats(url, client, alpha) for url, client in clients.items()]
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.spread = spread
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+        if probe_interval:
+            self._thread = threading.Thread(
+                target=self._probe_loop,
+                args=(probe_interval,),
+                name="node-probe",
+                daemon=True,
+            )
+            self._thread.start()
+
+    @classmethod
+    def from_urls(cls, urls, client_factory, **options):
+        """Create a pool with one ``client_factory({"nodes": [url]})`` client per URL."""
+        return cls({url: client_factory({"nodes": [url]}) for url in urls}, **options)
+
+    def client_options(self):
+        """Return wallet client options listing the nodes, fastest first."""
+        urls = [node.url for node in self._ranked()]
+        return {"nodes": urls, "primaryNode": urls[0]}
+
+    def _ranked(self):
+        with self._lock:
+            healthy = [node for node in self.nodes if node.healthy]
+            down = [node for node in self.nodes if not node.healthy]
+        healthy.sort(key=NodeStats.score)
+        # Nodes in cooldown are only tried when every healthy node has failed
+        down.sort(key=lambda node: node.down_until)
+        return healthy + down
+
+    def _candidates(self, spread):
+        ranked = self._ranked()
+        if not spread:
+            return ranked
+        healthy = [node for node in ranked if node.healthy]
+        if len(healthy) < 2:
+            return ranked
+        # Pick among the nodes that are close enough to the fastest one
+        limit = healthy[0].score() * self.spread
+        close = [node for node in healthy if node.score() <= limit]
+        first = self._random.choice(close)
+        return [first] + [node for node in ranked if node is not first]
+
+    def call(self, method, *args, spread=False, **kwargs):
+        """Call ``method`` on the best node, failing over to the others on errors."""
+        error = None
+        for node in self._candidates(spread):
+            start = time.monotonic()
+            try:
+                result = getattr(node.client, method)(*args, **kwargs)
+            except Exception as e:
+                self._failed(node, e)
+                error = e
+                continue
+            with self._lock:
+                node.record(time.monotonic() - start)
+            return result
+        raise error
+
+    def _failed(self, node, error):
+        with self._lock:
+            node.record(error=True)
+            if node.failures >= self.max_failures and node.healthy:
+                node.down_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"Node {node.url} failed {node.failures} times in a row, "
+                    f"out of rotation for {self.cooldown}s: {error}"
+                )
+            else:
+                logger.debug(f"Node {node.url} failed: {error}")
+
+    def get_block_metadata(self, block_id):
+        return self.call("get_block_metadata", block_id, spread=True)
+
+    def reattach(self, block_id):
+        return self.call("reattach", block_id)
+
+    def promote(self, block_id):
+        return self.call("promote", block_id)
+
+    def get_info(self):
+        return self.call("get_info")
+
+    def probe(self):
+        """Call ``get_info`` on every node to refresh its latency and health."""
+        for node in self.nodes:
+            start = time.monotonic()
+            try:
+                node.client.get_info()
+            except Exception as e:
+                self._failed(node, e)
+                continue
+            with self._lock:
+                node.record(time.monotonic() - start)
+                if not node.healthy:
+                    logger.info(f"Node {node.url} is back")
+                    node.down_until = 0.0
+
+    def _probe_loop(self, interval):
+        while not self._closed.is_set():
+            self.probe()
+            self._closed.wait(interval)
+
+    def status(self):
+        """Return the statistics of every node, fastest first."""
+        return [
+            {
+                "url": node.url,
+                "healthy": node.healthy,
+                "latency": node.latency,
+                "error_rate": round(node.error_rate, 3),
+                "calls": node.calls,
+            }
+            for node in self._ranked()
+        ]
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
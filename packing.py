@@ -0,0 +1,123 @@
+"""Storage deposits of the recipients, checked before anything is sent.
+
+Every output locks at least its storage deposit: 42600 glow for a plain basic
+output, more with a tag or native tokens (see :func:`planner.storage_deposit`). The
+wallet rejects a plain ``send_amount`` output below it and raises the amount of a
+prepared output to it, so a chunk with such an amount fails in the middle of a run
+or costs more than planned. :func:`apply_deposits` computes the deposit of every
+recipient once, before the job is chunked, and applies one of these policies to the
+amounts below it:
+
+- ``allow`` (the default): log the rows and send the amounts as listed, as the
+  scripts always did;
+- ``raise``: send the deposit instead, the recipient receives more than listed;
+- ``reject``: report the rows and send nothing.
+
+``raise`` and ``reject`` are opt-in. With them the amounts are final before
+anything is sent: the planner, the dry run and the sent-to ledger all see what is
+actually sent. Chunks stay runs of up to 127 consecutive rows, which is
+already the fewest blocks for the 128-output limit (one output is kept for the
+remainder) and keeps the chunks of a job the same from one run to the next.
+
+The remainder of a transaction goes back to the account as one more output;
+:func:`remainder_option` picks where: ``reuse`` the first address of the account (the
+wallet default) or ``change`` a new internal address.
+"""
+import logging
+
+import numpy as np
+
+from planner import MIN_STORAGE_DEPOSIT
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+RAISE = "raise"
+REJECT = "reject"
+DEPOSIT_POLICIES = (ALLOW, RAISE, REJECT)
+
+REUSE = "reuse"
+CHANGE = "change"
+REMAINDER_STRATEGIES = {REUSE: "ReuseAddress", CHANGE: "ChangeAddress"}
+
+# Number of rows below their deposit kept with their content for the report
+MAX_REPORTED_ROWS = 1000
+
+
+class DepositReport:
+    """Outcome of :func:`apply_deposits`.
+
+    ``rows`` lists the first :data:`MAX_REPORTED_ROWS` rows below their deposit as
+    ``(row, address, amount, deposit)``.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.row_count = 0
+        self.below_count = 0
+        self.top_up = 0
+        self.rows = []
+
+    @property
+    def rejected(self):
+        """True if the job must not be sent as is."""
+        return self.policy == REJECT and self.below_count > 0
+
+    def summary(self):
+        text = (
+            f"{self.below_count} of {self.row_count} amounts below their storage "
+            f"deposit ({self.policy})"
+        )
+        if self.top_up:
+            text += f", {self.top_up} glow added to reach it"
+        return text
+
+
+def apply_deposits(table, policy=ALLOW):
+    """Apply ``policy`` to the amounts of ``table`` below their storage deposit.
+
+    With ``raise`` the amounts of ``table`` are raised in place. Returns the table
+    and a :class:`DepositReport`.
+    """
+    if policy not in DEPOSIT_POLICIES:
+        raise ValueError(
+            f"Unknown storage deposit policy {policy!r}, use one of {DEPOSIT_POLICIES}"
+        )
+    report = DepositReport(policy)
+    report.row_count = len(table)
+    deposits = table.deposits()
+    if deposits is None:
+        deposits = np.full(len(table), MIN_STORAGE_DEPOSIT, dtype=np.int64)
+    below = np.flatnonzero(table.amounts < deposits)
+    report.below_count = len(below)
+    reported = below[:MAX_REPORTED_ROWS]
+    for i, address in zip(reported.tolist(), table.address_list(reported)):
+        report.rows.append(
+            (
+                table.row_label(int(table.rows[i])),
+                address,
+                int(table.amounts[i]),
+                int(deposits[i]),
+            )
+        )
+    if policy == RAISE and len(below):
+        report.top_up = int((deposits[below] - table.amounts[below]).sum())
+        table.amounts[below] = deposits[below]
+    if report.below_count:
+        logger.info(f"Storage deposits: {report.summary()}")
+    return table, report
+
+
+def remainder_option(strategy=REUSE):
+    """Return the wallet ``remainderValueStrategy`` of ``strategy``.
+
+    Returns ``None`` for ``reuse``, which is what the wallet does without options.
+    """
+    if strategy not in REMAINDER_STRATEGIES:
+        raise ValueError(
+            f"Unknown remainder strategy {strategy!r}, "
+            f"use one of {tuple(REMAINDER_STRATEGIES)}"
+        )
+    if strategy == REUSE:
+        return None
+    return {"strategy": REMAINDER_STRATEGIES[strategy], "value": None}
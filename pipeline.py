@@ -0,0 +1,178 @@
+"""Pipelined bulk sending.
+
+Instead of waiting for every chunk to be confirmed before building the next one,
+:class:`PipelinedSender` keeps up to ``window`` chunks in flight and confirms them on a
+background thread. A chunk is handed to ``on_confirmed`` only once its block has been
+included in the ledger; confirmation polling, reattachment and promotion are done by
+a :class:`~confirmation.ConfirmationTracker`.
+"""
+import logging
+import threading
+import time
+
+from confirmation import ConfirmationTracker
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightChunk:
+    """A submitted chunk that is waiting for confirmation."""
+
+    def __init__(self, index, outputs, transaction, key=None):
+        self.index = index
+        self.key = key
+        self.outputs = outputs
+        self.transaction = transaction
+        self.block_id = transaction["blockId"]
+        self.transaction_id = transaction.get("transactionId")
+        self.spent_output_ids = spent_output_ids(transaction)
+        self.submitted_at = time.monotonic()
+
+    @property
+    def name(self):
+        return self.index if self.key is None else self.key
+
+
+def spent_output_ids(transaction):
+    """Return the IDs of the wallet outputs consumed by ``transaction``."""
+    output_ids = set()
+    for item in transaction.get("inputs") or []:
+        metadata = item.get("metadata", item)
+        if "outputId" in metadata:
+            output_ids.add(metadata["outputId"])
+    return output_ids
+
+
+class PipelinedSender:
+    """Submit chunks without blocking on the confirmation of the previous ones.
+
+    Extra keyword arguments configure the :class:`~confirmation.ConfirmationTracker`
+    (``min_interval``, ``max_interval``, ``reattach_after``...).
+    """
+
+    def __init__(
+        self, account, client, on_confirmed, on_failed=None, window=4, **tracker_options
+    ):
+        self.account = account
+        self.client = client
+        self.on_confirmed = on_confirmed
+        self.on_failed = on_failed
+        self.window = max(1, int(window))
+        self._in_flight = {}
+        self._locked_outputs = set()
+        self._next_index = 0
+        self._condition = threading.Condition()
+        self._error = None
+        tracker_options.setdefault("workers", min(self.window, 8))
+        self.tracker = ConfirmationTracker(
+            client, self._confirmed, self._failed, **tracker_options
+        )
+
+    def submit(self, outputs, key=None, on_submitted=None, options=None):
+        """Send one chunk, waiting first if ``window`` chunks are already in flight.
+
+        ``key`` is stored on the chunk for the callbacks; ``on_submitted`` is called
+        with the transaction as soon as it has been sent. ``options`` are passed to
+        ``send_amount``.
+        """
+        self._wait_for_slot()
+        if options is None:
+            transaction = self.account.send_amount(outputs)
+        else:
+            transaction = self.account.send_amount(outputs, options)
+        if on_submitted is not None:
+            on_submitted(transaction)
+        return self._track(transaction, outputs, key)
+
+    @property
+    def error(self):
+        """The callback error that stopped the sender, ``None`` while it works."""
+        return self._error
+
+    def attach(self, transaction, outputs, key=None):
+        """Wait for the confirmation of a chunk that was sent earlier."""
+        self._wait_for_slot()
+        return self._track(transaction, outputs, key)
+
+    def _wait_for_slot(self):
+        with self._condition:
+            while len(self._in_flight) >= self.window and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+
+    def _track(self, transaction, outputs, key):
+        chunk = InFlightChunk(self._next_index, outputs, transaction, key)
+        self._next_index += 1
+
+        with self._condition:
+            reused = chunk.spent_output_ids & self._locked_outputs
+            if reused:
+                raise RuntimeError(
+                    f"Chunk {chunk.name} spends outputs of an in-flight chunk: {reused}"
+                )
+            self._locked_outputs |= chunk.spent_output_ids
+            self._in_flight[chunk.index] = chunk
+            self._condition.notify_all()
+        logger.info(
+            f"Chunk {chunk.name} in block {chunk.block_id} "
+            f"({len(self._in_flight)}/{self.window} in flight)"
+        )
+        self.tracker.track(chunk.block_id, chunk)
+        return chunk
+
+    def drain(self):
+        """Block until every submitted chunk has been confirmed or has failed."""
+        with self._condition:
+            while self._in_flight and self._error is None:
+                self._condition.wait()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Wait for the in-flight chunks and stop the confirmation tracker."""
+        try:
+            self.drain()
+        finally:
+            self.tracker.close()
+
+    def retire(self):
+        """Wait for every in-flight chunk, even after an error, and stop the tracker."""
+        with self._condition:
+            while self._in_flight:
+                self._condition.wait()
+        self.tracker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _confirmed(self, tracked):
+        chunk = tracked.context
+        # The transaction may have been included through a reattached block
+        chunk.block_id = tracked.block_id
+        elapsed = time.monotonic() - chunk.submitted_at
+        logger.info(f"Chunk {chunk.name} confirmed after {elapsed:.1f}s")
+        self._release(chunk, self.on_confirmed, chunk)
+
+    def _failed(self, tracked):
+        chunk = tracked.context
+        logger.error(f"Chunk {chunk.name} in block {chunk.block_id} is {tracked.state}")
+        self._release(chunk, self.on_failed, chunk, tracked.state)
+
+    def _release(self, chunk, callback, *args):
+        error = None
+        try:
+            if callback is not None:
+                callback(*args)
+        except Exception as e:
+            logger.exception(f"Callback for chunk {chunk.name} failed")
+            error = e
+        with self._condition:
+            del self._in_flight[chunk.index]
+            self._locked_outputs -= chunk.spent_output_ids
+            if error is not None and self._error is None:
+                self._error = error
+            self._condition.notify_all()
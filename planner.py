@@ -0,0 +1,218 @@
+"""Up-front execution plan of a bulk send.
+
+:func:`build_plan` walks the chunks of a job and the unspent outputs of the account
+once, before anything is sent, and returns an :class:`ExecutionPlan` with, for every
+chunk, its rows, its cost including storage deposits and the outputs it consumes.
+The sender then knows from the start how many recipients the balance can cover and
+stops cleanly at that point instead of exiting in the middle of the run.
+
+Input selection mirrors the wallet: largest outputs first, and the remainder of a
+chunk is only spendable by a later chunk once that chunk is confirmed. Such a
+remainder is listed in the plan as ``remainder:<chunk>`` since its output ID is not
+known yet.
+"""
+import heapq
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from wallet_session import output_amount
+
+logger = logging.getLogger(__name__)
+
+# A transaction has at most 128 outputs, one of which is kept for the remainder
+MAX_OUTPUTS = 128
+MAX_CHUNK_SIZE = MAX_OUTPUTS - 1
+MAX_INPUTS = 128
+# Minimum amount of a basic output holding an Ed25519 address and no other feature:
+# (offset 380 + output 46 weighted bytes) * v_byte_cost 100
+V_BYTE_COST = 100
+MIN_STORAGE_DEPOSIT = 42600
+# Serialized size of a tag feature (type and length bytes) and of a native token
+# (token ID and 256 bit amount); the 46 bytes of the output already hold the count
+# bytes of the native tokens and of the features
+TAG_FEATURE_BYTES = 2
+NATIVE_TOKEN_BYTES = 38 + 32
+
+PlannedChunk = namedtuple(
+    "PlannedChunk",
+    [
+        "index",
+        "first_row",
+        "last_row",
+        "count",
+        "amount",
+        "cost",
+        "inputs",
+        "input_amount",
+        "remainder",
+    ],
+)
+
+
+def remainder_id(index):
+    """Return the placeholder ID of the remainder output of chunk ``index``."""
+    return f"remainder:{index}"
+
+
+def storage_deposit(tag_length=0, native_tokens=0):
+    """Return the minimum amount of a basic output with a tag and native tokens.
+
+    Works on scalars and on NumPy arrays of tag lengths / native token counts.
+    """
+    extra = np.where(np.asarray(tag_length) > 0, TAG_FEATURE_BYTES + tag_length, 0)
+    extra = extra + np.asarray(native_tokens) * NATIVE_TOKEN_BYTES
+    deposit = MIN_STORAGE_DEPOSIT + V_BYTE_COST * extra
+    return int(deposit) if np.ndim(deposit) == 0 else deposit
+
+
+def recipient_cost(amounts, deposits=MIN_STORAGE_DEPOSIT):
+    """Return what sending ``amounts`` locks in total: at least the storage deposits."""
+    return int(np.maximum(np.asarray(amounts, dtype=np.int64), deposits).sum())
+
+
+class ExecutionPlan:
+    """The chunks of a job that the current balance can pay for."""
+
+    def __init__(self, available, unspent_count):
+        self.available = available
+        self.unspent_count = unspent_count
+        self.chunks = {}
+        self.recipients = 0
+        self.total_cost = 0
+        self.uncovered_recipients = 0
+        self.uncovered_cost = 0
+        self.shortfall = 0
+        self.first_uncovered = None
+
+    @property
+    def coverable_recipients(self):
+        return self.recipients - self.uncovered_recipients
+
+    @property
+    def planned_cost(self):
+        return self.total_cost - self.uncovered_cost
+
+    @property
+    def is_complete(self):
+        """True if every chunk of the job can be paid for."""
+        return self.first_uncovered is None
+
+    def over_input_limit(self):
+        """Return the chunks that would need more than ``MAX_INPUTS`` inputs."""
+        return [
+            chunk for chunk in self.chunks.values() if len(chunk.inputs) > MAX_INPUTS
+        ]
+
+    def __contains__(self, index):
+        return index in self.chunks
+
+    def __getitem__(self, index):
+        return self.chunks[index]
+
+    def mandatory_inputs(self, index):
+        """Return the outputs chunk ``index`` must spend, ``None`` to let the wallet pick.
+
+        Remainders of earlier chunks have no output ID yet, so chunks that depend on
+        one are left to the wallet's own input selection.
+        """
+        inputs = self.chunks[index].inputs
+        if not inputs or any(i.startswith("remainder:") for i in inputs):
+            return None
+        return list(inputs)
+
+    def summary(self):
+        text = (
+            f"{len(self.chunks)} chunks for {self.coverable_recipients}/"
+            f"{self.recipients} recipients, {self.planned_cost} glow of "
+            f"{self.available} available in {self.unspent_count} outputs"
+        )
+        if not self.is_complete:
+            text += (
+                f"; {self.uncovered_recipients} recipients from chunk "
+                f"{self.first_uncovered} on need {self.shortfall} more glow"
+            )
+        over_limit = len(self.over_input_limit())
+        if over_limit:
+            text += f"; {over_limit} chunks need more than {MAX_INPUTS} inputs"
+        return text
+
+
+def build_plan(chunks, unspent_outputs, storage_deposit=MIN_STORAGE_DEPOSIT):
+    """Plan ``chunks`` against ``unspent_outputs``.
+
+    ``chunks`` yields ``(index, first_row, last_row, amounts, deposits)`` in sending
+    order, ``amounts`` being an array of the amounts of the chunk and ``deposits`` the
+    minimum amount of each output (``None`` for plain outputs). ``unspent_outputs``
+    is an iterable of ``OutputData`` dicts. Chunks are planned in order until one
+    cannot be paid for; the rest of the job is only counted.
+    """
+    # Max-heap of the spendable outputs, largest first as the wallet picks them
+    pool = [(-output_amount(output), output["outputId"]) for output in unspent_outputs]
+    heapq.heapify(pool)
+    plan = ExecutionPlan(-sum(amount for amount, _ in pool), len(pool))
+
+    for index, first_row, last_row, amounts, deposits in chunks:
+        if len(amounts) > MAX_CHUNK_SIZE:
+            raise ValueError(
+                f"Chunk {index} has {len(amounts)} outputs, the limit is {MAX_CHUNK_SIZE}"
+            )
+        amounts = np.asarray(amounts, dtype=np.int64)
+        amount = int(amounts.sum())
+        cost = recipient_cost(
+            amounts, storage_deposit if deposits is None else deposits
+        )
+        plan.recipients += len(amounts)
+        plan.total_cost += cost
+        if plan.first_uncovered is not None:
+            plan.uncovered_recipients += len(amounts)
+            plan.uncovered_cost += cost
+            continue
+
+        inputs, input_amount = _select_inputs(pool, cost, storage_deposit)
+        if inputs is None:
+            plan.first_uncovered = index
+            plan.uncovered_recipients += len(amounts)
+            plan.uncovered_cost += cost
+            continue
+
+        remainder = input_amount - cost
+        if remainder:
+            heapq.heappush(pool, (-remainder, remainder_id(index)))
+        plan.chunks[index] = PlannedChunk(
+            index,
+            first_row,
+            last_row,
+            len(amounts),
+            amount,
+            cost,
+            inputs,
+            input_amount,
+            remainder,
+        )
+
+    # What is left in the pool also goes towards the uncovered chunks
+    plan.shortfall = max(0, plan.uncovered_cost + sum(amount for amount, _ in pool))
+    logger.info(f"Execution plan: {plan.summary()}")
+    return plan
+
+
+def _select_inputs(pool, cost, storage_deposit):
+    """Pop the largest outputs of the ``pool`` heap until ``cost`` is covered.
+
+    The remainder must be zero or at least ``storage_deposit`` to be a valid output.
+    Returns ``(output_ids, total)``, or ``(None, 0)`` with the pool left untouched if
+    it cannot pay for ``cost``.
+    """
+    selected = []
+    total = 0
+    while pool:
+        amount, output_id = heapq.heappop(pool)
+        selected.append((amount, output_id))
+        total -= amount
+        if total == cost or total >= cost + storage_deposit:
+            return [output_id for _, output_id in selected], total
+    for item in selected:
+        heapq.heappush(pool, item)
+    return None, 0
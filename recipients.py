@@ -0,0 +1,610 @@
+"""Columnar recipient table with per-row amounts, tags and native tokens.
+
+:func:`load_recipients` reads and validates the recipients CSV file in one streaming
+pass and only keeps compact per-row state of the valid rows in NumPy arrays: line
+numbers, byte offsets in the file, ``int64`` amounts, a 128 bit hash of the address
+and, with the optional columns, the tag length and whether the row holds a native
+token. Totals, balance checks, duplicate detection and chunk costs are array
+operations on them. The text of a chunk (addresses, tags and native tokens) is read
+again from the file only when the chunk is sent, so memory is bounded by the chunk
+size and a few dozen bytes per row rather than by the content of the file.
+
+Optional columns are given as spreadsheet letters (``"C"``) or 0-based indexes:
+
+- amount: the amount in glow of the row, ``default_amount`` when not set;
+- tag: a text tag attached to the output;
+- native token ID and native token amount: a native token sent with the output.
+
+:func:`load_recipient_files` reads several files into one table, so that they are
+deduplicated and chunked together. Their rows are numbered one after the other and
+the table maps every row back to its file and line.
+"""
+import glob
+import itertools
+import logging
+import os
+
+import numpy as np
+
+import metrics
+from csv_ingest import (
+    ADDRESS_COLUMN,
+    BATCH_SIZE,
+    MAX_REPORTED_INVALID_ROWS,
+    ValidationResult,
+    read_fields,
+    read_records,
+)
+from ledger_index import address_keys
+from planner import storage_deposit
+
+logger = logging.getLogger(__name__)
+
+# Tag features are limited to 64 bytes
+MAX_TAG_LENGTH = 64
+# 0x followed by the 38 bytes of a foundry ID
+NATIVE_TOKEN_ID_LENGTH = 2 + 2 * 38
+# Seed of the second half of the address keys, the first half is the ledger index's
+KEY_SEED = 0x44
+
+
+def column_index(column):
+    """Return the 0-based index of a column given as a letter or an index."""
+    if column is None or isinstance(column, int):
+        return column
+    column = column.strip()
+    if column.isdigit():
+        return int(column)
+    index = 0
+    for letter in column.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def recipient_keys(addresses):
+    """Return the 128 bit key of every address of ``addresses``, as ``(n, 2)`` words.
+
+    Duplicates are detected on these keys. The first word is the
+    :func:`ledger_index.address_keys` hash, looked up as is in the ledger index.
+    """
+    keys = np.empty((len(addresses), 2), dtype=np.uint64)
+    if len(addresses):
+        keys[:, 0] = address_keys(addresses)
+        keys[:, 1] = address_keys(addresses, KEY_SEED)
+    return keys
+
+
+class SourcedOutputs(list):
+    """The output dicts of a chunk, with the ``(file, line)`` each one comes from."""
+
+    def __init__(self, outputs, sources):
+        super().__init__(outputs)
+        self.sources = sources
+
+
+class RecipientTable:
+    """The valid rows of a recipients list, one array per column."""
+
+    def __init__(self, rows, addresses, amounts, tags=None, tokens=None, sources=None):
+        self.rows = rows
+        self.addresses = addresses
+        self.amounts = amounts
+        # Tags as UTF-8 bytes, b"" for no tag
+        self.tags = tags
+        # Native tokens as (ids, amounts), "" for no token
+        self.tokens = tokens
+        # (file names, row offsets) of a table read from several files: the rows
+        # of file i are its line numbers plus offsets[i]
+        self.sources = sources
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def total_amount(self):
+        return int(self.amounts.sum())
+
+    @property
+    def has_tokens(self):
+        """True if the rows have a native token column."""
+        return self.tokens is not None
+
+    def take(self, indices):
+        """Return a new table with the rows at ``indices``, in that order."""
+        return RecipientTable(
+            self.rows[indices],
+            self.addresses[indices],
+            self.amounts[indices],
+            None if self.tags is None else self.tags[indices],
+            (
+                None
+                if self.tokens is None
+                else (self.tokens[0][indices], self.tokens[1][indices])
+            ),
+            self.sources,
+        )
+
+    def keys(self):
+        """Return the :func:`recipient_keys` of the addresses."""
+        return recipient_keys([address.decode() for address in self.addresses.tolist()])
+
+    def address_list(self, indices):
+        """Return the addresses of the rows at ``indices``."""
+        return [address.decode() for address in self.addresses[indices].tolist()]
+
+    def token_list(self, indices):
+        """Return the ``(id, amount)`` native token of the rows at ``indices``."""
+        ids, amounts = self.tokens
+        return list(zip(ids[indices].tolist(), amounts[indices].tolist()))
+
+    def set_token(self, index, token_id, amount):
+        """Make row ``index`` send ``amount`` of the native token ``token_id``."""
+        ids, amounts = self.tokens
+        if len(token_id) > ids.itemsize:
+            ids = ids.astype(f"S{len(token_id)}")
+        ids[index] = token_id
+        amounts[index] = amount
+        self.tokens = (ids, amounts)
+
+    def source_lines(self, rows):
+        """Return the ``(file, line)`` of every row of ``rows``."""
+        names, offsets = self.sources
+        rows = np.asarray(rows, dtype=np.int64)
+        files = np.searchsorted(offsets, rows) - 1
+        return [
+            (names[file], line)
+            for file, line in zip(files.tolist(), (rows - offsets[files]).tolist())
+        ]
+
+    def row_label(self, row):
+        """Return ``row`` as reported to the user, ``file:line`` with several files."""
+        if self.sources is None:
+            return row
+        ((name, line),) = self.source_lines([row])
+        return f"{name}:{line}"
+
+    def deposits(self):
+        """Return the storage deposit of every output, ``None`` if all are plain."""
+        if self.tags is None and self.tokens is None:
+            return None
+        tag_lengths = 0 if self.tags is None else np.char.str_len(self.tags)
+        native_tokens = 0 if self.tokens is None else (self.tokens[0] != b"")
+        return storage_deposit(tag_lengths, native_tokens)
+
+    def chunk_bounds(self, chunk_size):
+        """Yield ``(index, start, stop)`` for every chunk of at most ``chunk_size`` rows."""
+        for index, start in enumerate(range(0, len(self), chunk_size)):
+            yield index, start, min(start + chunk_size, len(self))
+
+    def outputs(self, start, stop):
+        """Return the output dicts of rows ``start`` to ``stop`` for ``send_amount``."""
+        with metrics.span("build"):
+            outputs = [
+                {"address": address.decode(), "amount": str(amount)}
+                for address, amount in zip(
+                    self.addresses[start:stop].tolist(),
+                    self.amounts[start:stop].tolist(),
+                )
+            ]
+            if self.tags is not None:
+                for output, tag in zip(outputs, self.tags[start:stop].tolist()):
+                    if tag:
+                        output["tag"] = "0x" + tag.hex()
+            if self.tokens is not None:
+                ids, amounts = self.tokens
+                for output, token_id, amount in zip(
+                    outputs, ids[start:stop].tolist(), amounts[start:stop].tolist()
+                ):
+                    if token_id:
+                        output["nativeTokens"] = [
+                            {"id": token_id.decode(), "amount": hex(int(amount))}
+                        ]
+            if self.sources is not None:
+                return SourcedOutputs(outputs, self.source_lines(self.rows[start:stop]))
+            return outputs
+
+
+class FileRecipientTable(RecipientTable):
+    """A :class:`RecipientTable` whose text columns stay in the CSV files.
+
+    It holds the line number, byte offset, amount and :func:`recipient_keys` of every
+    row, and with the optional columns its tag length and whether it has a native
+    token. :meth:`read` reads rows back from ``filenames`` into a plain
+    :class:`RecipientTable`.
+    """
+
+    def __init__(
+        self,
+        filenames,
+        columns,
+        rows,
+        offsets,
+        amounts,
+        keys,
+        tag_lengths=None,
+        token_flags=None,
+        sources=None,
+        token_overrides=None,
+        stamps=None,
+    ):
+        super().__init__(rows, None, amounts, sources=sources)
+        self.filenames = filenames
+        # (size, modification time) of every file when it was validated
+        self.stamps = stamps or [_stamp(filename) for filename in filenames]
+        # Column indexes of the address, tag, token id and token amount
+        self.columns = columns
+        self.offsets = offsets
+        self._keys = keys
+        self.tag_lengths = tag_lengths
+        self.token_flags = token_flags
+        # Native tokens of the rows merged by deduplication, by row
+        self.token_overrides = token_overrides or {}
+
+    @property
+    def has_tokens(self):
+        return self.token_flags is not None
+
+    def take(self, indices):
+        return FileRecipientTable(
+            self.filenames,
+            self.columns,
+            self.rows[indices],
+            self.offsets[indices],
+            self.amounts[indices],
+            self._keys[indices],
+            None if self.tag_lengths is None else self.tag_lengths[indices],
+            None if self.token_flags is None else self.token_flags[indices],
+            self.sources,
+            dict(self.token_overrides),
+            self.stamps,
+        )
+
+    def keys(self):
+        return self._keys
+
+    def _fields(self, indices):
+        """Read the fields of the rows at ``indices`` from their files."""
+        indices = np.asarray(indices, dtype=np.intp)
+        if self.sources is None:
+            files = np.zeros(len(indices), dtype=np.intp)
+        else:
+            files = np.searchsorted(self.sources[1], self.rows[indices]) - 1
+        fields = [None] * len(indices)
+        for file in np.unique(files).tolist():
+            if _stamp(self.filenames[file]) != self.stamps[file]:
+                raise RuntimeError(
+                    f"{self.filenames[file]} changed since it was validated"
+                )
+            where = np.flatnonzero(files == file)
+            offsets = self.offsets[indices[where]].tolist()
+            for i, row in zip(
+                where.tolist(), read_fields(self.filenames[file], offsets)
+            ):
+                fields[i] = row
+        return fields
+
+    def _tokens(self, indices, fields):
+        """Return the native token IDs and amounts of the rows at ``indices``."""
+        _, _, token_id_column, token_amount_column = self.columns
+        ids, amounts, _ = _parse_tokens(fields, token_id_column, token_amount_column)
+        ids = ids.tolist()
+        amounts = amounts.tolist()
+        for i, row in enumerate(self.rows[indices].tolist()):
+            if row in self.token_overrides:
+                ids[i], amounts[i] = self.token_overrides[row]
+        return ids, amounts
+
+    def address_list(self, indices):
+        address_column = self.columns[0]
+        return [_field(fields, address_column) for fields in self._fields(indices)]
+
+    def token_list(self, indices):
+        ids, amounts = self._tokens(indices, self._fields(indices))
+        return list(zip(ids, amounts))
+
+    def set_token(self, index, token_id, amount):
+        self.token_overrides[int(self.rows[index])] = (token_id, amount)
+        self.token_flags[index] = True
+
+    def deposits(self):
+        if self.tag_lengths is None and self.token_flags is None:
+            return None
+        tag_lengths = 0 if self.tag_lengths is None else self.tag_lengths
+        native_tokens = 0 if self.token_flags is None else self.token_flags
+        return storage_deposit(tag_lengths, native_tokens)
+
+    def read(self, start, stop):
+        """Return rows ``start`` to ``stop`` as a :class:`RecipientTable`, from the files."""
+        address_column, tag_column, _, _ = self.columns
+        indices = np.arange(start, stop)
+        with metrics.span("parse"):
+            fields = self._fields(indices)
+        tags = None
+        if self.tag_lengths is not None:
+            tags = np.array(
+                [(_field(row, tag_column) or "").encode() for row in fields], dtype="S"
+            )
+        tokens = None
+        if self.token_flags is not None:
+            ids, amounts = self._tokens(indices, fields)
+            tokens = (np.array(ids, dtype="S"), np.array(amounts, dtype=object))
+        return RecipientTable(
+            self.rows[start:stop],
+            np.array([_field(row, address_column) for row in fields], dtype="S"),
+            self.amounts[start:stop],
+            tags,
+            tokens,
+            self.sources,
+        )
+
+    def outputs(self, start, stop):
+        return self.read(start, stop).outputs(0, stop - start)
+
+
+def _parse_amounts(values):
+    """Return ``(amounts, reasons)`` for a list of amount strings (``None`` if missing)."""
+    try:
+        amounts = np.array(values, dtype=np.int64)
+    except (TypeError, ValueError, OverflowError):
+        amounts = np.zeros(len(values), dtype=np.int64)
+        reasons = [None] * len(values)
+        for i, value in enumerate(values):
+            if value is None or not value.strip():
+                reasons[i] = "missing amount"
+                continue
+            try:
+                amounts[i] = int(value)
+            except (ValueError, OverflowError):
+                reasons[i] = "invalid amount"
+    else:
+        reasons = [None] * len(values)
+    for i in np.flatnonzero(amounts <= 0):
+        reasons[i] = reasons[i] or "invalid amount"
+    return amounts, reasons
+
+
+def _stamp(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _field(fields, column):
+    return fields[column] if column is not None and len(fields) > column else None
+
+
+def load_recipients(
+    filename,
+    validate_addresses,
+    default_amount=None,
+    address_column=ADDRESS_COLUMN,
+    amount_column=None,
+    tag_column=None,
+    token_id_column=None,
+    token_amount_column=None,
+    batch_size=BATCH_SIZE,
+):
+    """Read and validate ``filename`` into a :class:`FileRecipientTable`.
+
+    ``validate_addresses`` takes a list of addresses and returns the failure reason
+    of each one (``None`` when valid). Returns the table of the valid rows and the
+    :class:`~csv_ingest.ValidationResult` of the whole file.
+    """
+    address_column = column_index(address_column)
+    amount_column = column_index(amount_column)
+    tag_column = column_index(tag_column)
+    token_id_column = column_index(token_id_column)
+    token_amount_column = column_index(token_amount_column)
+    if amount_column is None and default_amount is None:
+        raise ValueError("Either an amount column or a default amount is needed")
+
+    result = ValidationResult()
+    parts = {
+        name: [] for name in ("rows", "offsets", "amounts", "keys", "tags", "tokens")
+    }
+    with open(filename, "rb") as file:
+        records = read_records(file)
+        while True:
+            with metrics.span("parse"):
+                batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            fields = [row_fields for _, _, row_fields in batch]
+            addresses = [_field(row_fields, address_column) for row_fields in fields]
+            with metrics.span("validate"):
+                reasons = list(validate_addresses(addresses))
+            for i, address in enumerate(addresses):
+                if address is None:
+                    reasons[i] = "missing address"
+
+            if amount_column is None:
+                amounts = np.full(len(batch), int(default_amount), dtype=np.int64)
+            else:
+                amounts, amount_reasons = _parse_amounts(
+                    [_field(row_fields, amount_column) for row_fields in fields]
+                )
+                reasons = [a or b for a, b in zip(reasons, amount_reasons)]
+
+            tag_lengths = None
+            if tag_column is not None:
+                tag_lengths = np.array(
+                    [len((_field(f, tag_column) or "").encode()) for f in fields],
+                    dtype=np.int64,
+                )
+                for i in np.flatnonzero(tag_lengths > MAX_TAG_LENGTH).tolist():
+                    reasons[i] = reasons[i] or "tag too long"
+
+            token_flags = None
+            if token_id_column is not None:
+                ids, _, token_reasons = _parse_tokens(
+                    fields, token_id_column, token_amount_column
+                )
+                token_flags = ids != b""
+                reasons = [a or b for a, b in zip(reasons, token_reasons)]
+
+            valid = []
+            for i, ((row, _, _), address, reason) in enumerate(
+                zip(batch, addresses, reasons)
+            ):
+                result.add(row, address, reason)
+                if not reason:
+                    valid.append(i)
+            valid = np.array(valid, dtype=np.intp)
+            parts["rows"].append(np.array([row for row, _, _ in batch])[valid])
+            parts["offsets"].append(np.array([offset for _, offset, _ in batch])[valid])
+            parts["amounts"].append(amounts[valid])
+            parts["keys"].append(recipient_keys([addresses[i] for i in valid]))
+            if tag_lengths is not None:
+                parts["tags"].append(tag_lengths[valid])
+            if token_flags is not None:
+                parts["tokens"].append(token_flags[valid])
+
+    table = FileRecipientTable(
+        [filename],
+        (address_column, tag_column, token_id_column, token_amount_column),
+        _concatenate(parts["rows"], np.int64),
+        _concatenate(parts["offsets"], np.int64),
+        _concatenate(parts["amounts"], np.int64),
+        _concatenate(parts["keys"], np.uint64).reshape(-1, 2),
+        _concatenate(parts["tags"], np.int64) if tag_column is not None else None,
+        _concatenate(parts["tokens"], bool) if token_id_column is not None else None,
+    )
+    logger.info(
+        f"Loaded {len(table)} recipients for {table.total_amount} glow, "
+        f"{result.invalid_count} invalid rows"
+    )
+    return table, result
+
+
+def expand_inputs(patterns):
+    """Return the files of ``patterns``, file names or glob patterns, in order.
+
+    The files matching a pattern are sorted by name and a file is only listed once.
+    Raises ``ValueError`` if a pattern matches no file.
+    """
+    filenames = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise ValueError(f"No file matches {pattern}")
+        else:
+            matches = [pattern]
+        filenames.extend(name for name in matches if name not in filenames)
+    return filenames
+
+
+def load_recipient_files(filenames, validate_addresses, **options):
+    """Read and validate several files into one :class:`FileRecipientTable`.
+
+    Takes the options of :func:`load_recipients`. The rows of each file are numbered
+    after the rows of the files before it, and invalid rows are reported as
+    ``file:line``. With a single file this is :func:`load_recipients`.
+    """
+    if len(filenames) == 1:
+        return load_recipients(filenames[0], validate_addresses, **options)
+    tables = []
+    offsets = []
+    result = ValidationResult()
+    offset = 0
+    for filename in filenames:
+        table, validation = load_recipients(filename, validate_addresses, **options)
+        table.rows += offset
+        tables.append(table)
+        offsets.append(offset)
+        result.validity += validation.validity
+        result.invalid_count += validation.invalid_count
+        for row, address, reason in validation.invalid_rows:
+            if len(result.invalid_rows) < MAX_REPORTED_INVALID_ROWS:
+                result.invalid_rows.append((f"{filename}:{row}", address, reason))
+        # The header is line 1, data rows start on line 2
+        offset += validation.row_count + 1
+
+    def column(name, dtype):
+        return _concatenate([getattr(table, name) for table in tables], dtype)
+
+    first = tables[0]
+    table = FileRecipientTable(
+        list(filenames),
+        first.columns,
+        column("rows", np.int64),
+        column("offsets", np.int64),
+        column("amounts", np.int64),
+        column("_keys", np.uint64).reshape(-1, 2),
+        column("tag_lengths", np.int64) if first.tag_lengths is not None else None,
+        column("token_flags", bool) if first.token_flags is not None else None,
+        (list(filenames), np.array(offsets, dtype=np.int64)),
+        stamps=[stamp for table in tables for stamp in table.stamps],
+    )
+    logger.info(
+        f"Loaded {len(table)} recipients from {len(filenames)} files, "
+        f"{result.invalid_count} invalid rows"
+    )
+    return table, result
+
+
+def recipients_from_list(items, validate_addresses, default_amount=None):
+    """Validate a list of ``{"address": ..., "amount": ...}`` recipients.
+
+    Works like :func:`load_recipients` for recipients that do not come from a file,
+    such as a JSON payout request; rows are numbered from 1 in the order of
+    ``items`` and ``amount`` defaults to ``default_amount``.
+    """
+    addresses = []
+    values = []
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        address = item.get("address")
+        addresses.append(address if isinstance(address, str) else None)
+        amount = item.get("amount", default_amount)
+        values.append(None if amount is None else str(amount))
+    checked = iter(validate_addresses([a for a in addresses if a is not None]))
+    reasons = [
+        "missing address" if address is None else next(checked) for address in addresses
+    ]
+    amounts, amount_reasons = _parse_amounts(values)
+
+    result = ValidationResult()
+    valid = []
+    for i, (address, reason) in enumerate(zip(addresses, reasons)):
+        reason = reason or amount_reasons[i]
+        result.add(i + 1, address, reason)
+        if not reason:
+            valid.append(i)
+    valid = np.array(valid, dtype=np.intp)
+    table = RecipientTable(
+        np.arange(1, len(items) + 1, dtype=np.int64)[valid],
+        np.array([addresses[i] for i in valid], dtype="S"),
+        amounts[valid],
+    )
+    return table, result
+
+
+def _parse_tokens(fields, id_column, amount_column):
+    """Return the native token IDs, amounts and failure reasons of rows of ``fields``."""
+    ids = []
+    amounts = []
+    reasons = []
+    for row_fields in fields:
+        token_id = (_field(row_fields, id_column) or "").strip()
+        amount = (_field(row_fields, amount_column) or "").strip()
+        reason = None
+        if not token_id:
+            amount = "0"
+        elif len(token_id) != NATIVE_TOKEN_ID_LENGTH or not token_id.startswith("0x"):
+            reason = "invalid native token id"
+        try:
+            value = int(amount, 0)
+        except ValueError:
+            value = 0
+        if token_id and value <= 0:
+            reason = reason or "invalid native token amount"
+        ids.append(token_id.encode())
+        amounts.append(value)
+        reasons.append(reason)
+    return np.array(ids, dtype="S"), np.array(amounts, dtype=object), reasons
+
+
+def _concatenate(parts, dtype):
+    if not parts:
+        return np.array([], dtype=dtype)
+    return np.concatenate(parts)
@@ -0,0 +1,219 @@
+"""Reconciliation of the crew3 quest exports.
+
+:func:`reconcile` keeps the rows of the SMR address quest export whose ``Name`` is
+also in the airdrop eligibility export, and writes them as the recipients file.
+Both exports are read in chunks with only the ``Name`` and ``answer`` columns as
+strings, so exports larger than memory go through.
+
+The join is a hash semi-join: the eligible names are kept as a sorted array of 64
+bit hashes (8 bytes per name) and every chunk of the address export is matched
+against it at once. A name that answered the address quest several times is
+joined once, with its first answer. The addresses of the matched rows are
+validated a chunk at a time, and an address found twice fails the reconciliation.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from shimmer_address import validate_addresses
+
+logger = logging.getLogger(__name__)
+
+NAME_COLUMN = "Name"
+ADDRESS_COLUMN = "answer"
+CHUNK_SIZE = 1_000_000
+# Number of invalid or duplicate rows kept with their content for the report
+MAX_REPORTED_ROWS = 1000
+
+
+def hash_values(values):
+    """Return the 64 bit hash of every string of the ``values`` Series."""
+    # Most values are distinct, factorizing them first only costs time
+    return pd.util.hash_array(values.to_numpy(dtype=object), categorize=False)
+
+
+def _sorted_unique(hashes):
+    """``np.unique`` for 64 bit hashes, which a plain sort does faster."""
+    hashes = np.sort(np.asarray(hashes, dtype=np.uint64))
+    if len(hashes):
+        hashes = hashes[np.concatenate(([True], hashes[1:] != hashes[:-1]))]
+    return hashes
+
+
+class HashSet:
+    """A set of 64 bit hashes kept as one sorted NumPy array."""
+
+    def __init__(self, hashes=None):
+        self.hashes = _sorted_unique([] if hashes is None else hashes)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def contains(self, hashes):
+        """Return a boolean array telling which of ``hashes`` are in the set."""
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions[positions == len(self.hashes)] = 0
+        return self.hashes[positions] == hashes
+
+    def add(self, hashes):
+        hashes = _sorted_unique(hashes)
+        hashes = hashes[~self.contains(hashes)]
+        # Merge the sorted arrays rather than sorting everything again
+        self.hashes = np.insert(
+            self.hashes, np.searchsorted(self.hashes, hashes), hashes
+        )
+
+    def seen_before(self, hashes):
+        """Tell which of ``hashes`` are in the set or earlier in ``hashes`` itself."""
+        return pd.Series(hashes).duplicated().to_numpy() | self.contains(hashes)
+
+
+class ReconcileResult:
+    """Counts and problem rows of a :func:`reconcile` run."""
+
+    def __init__(self):
+        self.address_rows = 0
+        self.eligible_names = 0
+        self.matched = 0
+        self.repeated_names = 0
+        self.invalid_count = 0
+        self.duplicate_count = 0
+        self.already_paid = 0
+        # (row, address, reason) of the first MAX_REPORTED_ROWS problems
+        self.rows = []
+
+    @property
+    def is_valid(self):
+        return not self.invalid_count and not self.duplicate_count
+
+    def add(self, rows, addresses, reasons):
+        for row, address, reason in zip(rows, addresses, reasons):
+            if len(self.rows) >= MAX_REPORTED_ROWS:
+                break
+            self.rows.append((row, address, reason))
+
+    def summary(self):
+        return (
+            f"{self.matched} of {self.address_rows} address rows matched "
+            f"{self.eligible_names} eligible names, {self.repeated_names} repeated "
+            f"names, {self.duplicate_count} duplicate and {self.invalid_count} "
+            f"invalid addresses, {self.already_paid} addresses already paid left out"
+        )
+
+
+def _read(filename, columns, chunksize):
+    """Yield the ``columns`` of ``filename`` as strings, ``chunksize`` rows at a time."""
+    reader = pd.read_csv(
+        filename,
+        usecols=columns,
+        dtype={column: str for column in columns},
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    return [reader] if chunksize is None else reader
+
+
+def read_names(filename, chunksize=CHUNK_SIZE):
+    """Return the :class:`HashSet` of the names of ``filename``."""
+    hashes = [
+        _sorted_unique(hash_values(chunk[NAME_COLUMN]))
+        for chunk in _read(filename, [NAME_COLUMN], chunksize)
+    ]
+    return HashSet(np.concatenate(hashes) if hashes else None)
+
+
+def reconcile(
+    address_filename,
+    eligible_filename,
+    output_filename,
+    chunksize=CHUNK_SIZE,
+    hrp=None,
+    cache=None,
+    paid=None,
+):
+    """Write the rows of ``address_filename`` whose name is in ``eligible_filename``.
+
+    ``chunksize`` rows are processed at a time, ``None`` to read the files at once.
+    ``output_filename`` is only written if every matched address is valid and
+    unique. ``cache`` is an optional :class:`validation_cache.ValidationCache`, and
+    the addresses of ``paid``, a :class:`ledger_index.LedgerIndex`, are left out.
+    Returns a :class:`ReconcileResult`.
+    """
+    result = ReconcileResult()
+    eligible = read_names(eligible_filename, chunksize)
+    result.eligible_names = len(eligible)
+    seen_names = HashSet()
+    seen_addresses = HashSet()
+
+    partial = output_filename + ".partial"
+    header = True
+    offset = 0
+    try:
+        for chunk in _read(address_filename, [NAME_COLUMN, ADDRESS_COLUMN], chunksize):
+            result.address_rows += len(chunk)
+            # Line number of every row in the file, after the header
+            chunk.index = np.arange(offset + 2, offset + 2 + len(chunk))
+            offset += len(chunk)
+
+            names = hash_values(chunk[NAME_COLUMN])
+            first = ~seen_names.seen_before(names)
+            matched = eligible.contains(names)
+            result.repeated_names += int((matched & ~first).sum())
+            seen_names.add(names[matched])
+            chunk = chunk[matched & first]
+            result.matched += len(chunk)
+            if not len(chunk):
+                continue
+
+            addresses = chunk[ADDRESS_COLUMN]
+            reasons = np.array(
+                validate_addresses(addresses.to_numpy(dtype=object), hrp, cache),
+                dtype=object,
+            )
+            invalid = pd.notna(reasons)
+            result.invalid_count += int(invalid.sum())
+            result.add(chunk.index[invalid], addresses[invalid], reasons[invalid])
+
+            hashes = hash_values(addresses.str.strip().str.lower())
+            duplicate = seen_addresses.seen_before(hashes)
+            seen_addresses.add(hashes)
+            result.duplicate_count += int(duplicate.sum())
+            result.add(
+                chunk.index[duplicate],
+                addresses[duplicate],
+                ["duplicate address"] * int(duplicate.sum()),
+            )
+
+            if paid is not None:
+                already_paid = paid.contains(addresses.tolist())
+                result.already_paid += int(already_paid.sum())
+                chunk = chunk[~already_paid]
+
+            if result.is_valid:
+                # usecols keeps the order of the export, the senders read Name, answer
+                chunk[[NAME_COLUMN, ADDRESS_COLUMN]].to_csv(
+                    partial, mode="w" if header else "a", header=header, index=False
+                )
+                header = False
+    except BaseException:
+        _remove(partial)
+        raise
+
+    logger.info(f"Reconciliation: {result.summary()}")
+    if not result.is_valid:
+        _remove(partial)
+        return result
+    if header:
+        # No rows matched: still write the header
+        pd.DataFrame(columns=[NAME_COLUMN, ADDRESS_COLUMN]).to_csv(partial, index=False)
+    os.replace(partial, output_filename)
+    return result
+
+
+def _remove(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,373 @@
+"""Configuration and shared resources of a run, created on first use.
+
+Importing a script only defines its functions. The ``.env`` file is read, the log
+file opened, and the backend, node pool, Stronghold secret manager, wallet session,
+sent-to ledger and confirmation tracker created the first time a run asks for them
+through its :class:`Runtime`. A run that only verifies the CSV file never touches
+Stronghold or the network.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+import dedup
+from backend import get_backend
+from confirmation import ConfirmationTracker
+from ledger import LedgerWriter
+from ledger_index import open_index
+from log_handlers import queue_handlers, rotating_file_handler
+from node_pool import NodePool, node_urls
+from packing import ALLOW, REUSE
+from validation_cache import DEFAULT_MAX_ENTRIES, ValidationCache
+from wallet_session import WalletSession
+
+logger = logging.getLogger(__name__)
+
+
+class Network:
+    """The default node, coin type and address prefix of a Shimmer network."""
+
+    def __init__(self, name, node_url, coin_type, bech32_hrp):
+        self.name = name
+        self.node_url = node_url
+        self.coin_type = coin_type
+        self.bech32_hrp = bech32_hrp
+
+
+MAINNET = Network("mainnet", "https://api.shimmer.network", 4219, "smr")
+TESTNET = Network("testnet", "https://api.testnet.shimmer.network", 4219, "rms")
+
+# Variables every script needs in .env
+REQUIRED_ENV_VARS = [
+    "STRONGHOLD_PASSWORD",
+    "STRONGHOLD_DB_NAME",
+    "WALLET_DB_NAME",
+    "SHIMMER_MNEMONIC",
+    "SHIMMER_ACCOUNT_NAME",
+    "SHIMMER_SMR_TOKEN_AMOUNT",
+    "CONFIG_DONE",
+    "SHIMMER_ADDRESS_READ_FROM_FILENAME",
+    "SHIMMER_ADDRESS_SENT_TO_FILENAME",
+]
+# Variables needed to verify the CSV file without the wallet
+VALIDATE_ENV_VARS = [
+    "SHIMMER_SMR_TOKEN_AMOUNT",
+    "SHIMMER_ADDRESS_READ_FROM_FILENAME",
+    "SHIMMER_ADDRESS_SENT_TO_FILENAME",
+]
+
+
+def load_env():
+    """Read the ``.env`` file of the working directory, once."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
+
+_env_loaded = False
+
+
+def missing_env_vars(names=REQUIRED_ENV_VARS):
+    """Return the variables of ``names`` that are not set or empty."""
+    load_env()
+    return [name for name in names if not os.getenv(name)]
+
+
+def parse_bool(value):
+    """Parse a ``True`` / ``False`` setting such as ``CONFIG_DONE``."""
+    return str(value).strip().strip("'\"").lower() in ("true", "1", "yes")
+
+
+def setup_logging(logger=None, level=logging.DEBUG, filename="app.log", queued=False):
+    """Log to ``filename`` and to the console, once per logger (the root by default).
+
+    With ``queued``, the records are written by a background thread to a log file
+    rotated and compressed by size, see log_handlers.py; the thread is stopped, and
+    the queue written out, at exit.
+    """
+    logger = logger or logging.getLogger()
+    if logger.name in _logging_done:
+        return logger
+    _logging_done.add(logger.name)
+    logger.setLevel(level)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    if queued:
+        file_handler = rotating_file_handler(filename)
+    else:
+        file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    if queued:
+        listener = queue_handlers(logger, [file_handler, stream_handler])
+        atexit.register(listener.stop)
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(stream_handler)
+    return logger
+
+
+_logging_done = set()
+
+
+class Config:
+    """The settings of a run, read from the environment once ``.env`` is loaded."""
+
+    def __init__(self):
+        load_env()
+        self.stronghold_password = os.getenv("STRONGHOLD_PASSWORD")
+        self.stronghold_db_name = os.getenv("STRONGHOLD_DB_NAME")
+        self.wallet_db_name = os.getenv("WALLET_DB_NAME")
+        self.shimmer_mnemonic = os.getenv("SHIMMER_MNEMONIC")
+        self.shimmer_account_name = os.getenv("SHIMMER_ACCOUNT_NAME")
+        self.shimmer_smr_token_amount = os.getenv("SHIMMER_SMR_TOKEN_AMOUNT")
+        self.config_done = parse_bool(os.getenv("CONFIG_DONE"))
+        self.shimmer_address_read_from_filename = os.getenv(
+            "SHIMMER_ADDRESS_READ_FROM_FILENAME"
+        )
+        self.shimmer_address_sent_to_filename = os.getenv(
+            "SHIMMER_ADDRESS_SENT_TO_FILENAME"
+        )
+        self.input_filenames = [self.shimmer_address_read_from_filename]
+        self.job_journal_filename = os.getenv(
+            "SHIMMER_JOB_JOURNAL_FILENAME",
+            f"{self.shimmer_address_read_from_filename}.journal",
+        )
+        # Optional columns of the CSV file, as letters: the amount in glow of each
+        # row (SHIMMER_SMR_TOKEN_AMOUNT when not set), a tag and a native token with
+        # its amount
+        self.shimmer_amount_column = os.getenv("SHIMMER_AMOUNT_COLUMN")
+        self.shimmer_tag_column = os.getenv("SHIMMER_TAG_COLUMN")
+        self.shimmer_native_token_id_column = os.getenv(
+            "SHIMMER_NATIVE_TOKEN_ID_COLUMN"
+        )
+        self.shimmer_native_token_amount_column = os.getenv(
+            "SHIMMER_NATIVE_TOKEN_AMOUNT_COLUMN"
+        )
+        # What to do with duplicate addresses (allow, reject, keep-first or sum) and
+        # with addresses already in SHIMMER_ADDRESS_SENT_TO_FILENAME (allow, skip or
+        # reject), see dedup.py; by default every row is sent as it is
+        self.shimmer_duplicates = os.getenv("SHIMMER_DUPLICATES", dedup.ALLOW)
+        self.shimmer_already_sent = os.getenv("SHIMMER_ALREADY_SENT", dedup.ALLOW)
+        # What to do with amounts below the storage deposit of their output (allow,
+        # raise or reject) and where transaction remainders go (reuse or change),
+        # see packing.py
+        self.shimmer_below_deposit = os.getenv("SHIMMER_BELOW_DEPOSIT", ALLOW)
+        self.shimmer_remainder = os.getenv("SHIMMER_REMAINDER", REUSE)
+        # File of the addresses validated by earlier runs and its maximum number of
+        # addresses, see validation_cache.py; no cache when not set
+        self.validation_cache_filename = os.getenv("SHIMMER_VALIDATION_CACHE_FILENAME")
+        self.validation_cache_size = int(
+            os.getenv("SHIMMER_VALIDATION_CACHE_SIZE", DEFAULT_MAX_ENTRIES)
+        )
+        # Token the clients of the payout service must send, the directory its
+        # CSV jobs are read from and the journal of its blocks, see service.py
+        self.shimmer_service_token = os.getenv("SHIMMER_SERVICE_TOKEN")
+        self.shimmer_service_csv_dir = os.getenv("SHIMMER_SERVICE_CSV_DIR")
+        self.service_journal_filename = os.getenv(
+            "SHIMMER_SERVICE_JOURNAL_FILENAME",
+            f"{(self.shimmer_address_sent_to_filename or '').rstrip(os.sep)}"
+            ".service.journal",
+        )
+
+    @property
+    def multi_input(self):
+        return len(self.input_filenames) > 1
+
+    def set_inputs(self, filenames):
+        """Read the recipients from ``filenames`` instead of the configured file.
+
+        Unless ``SHIMMER_JOB_JOURNAL_FILENAME`` is set, several files get a journal
+        named after the list, next to the first one.
+        """
+        self.input_filenames = list(filenames)
+        if os.getenv("SHIMMER_JOB_JOURNAL_FILENAME"):
+            return
+        if self.multi_input:
+            digest = hashlib.sha256("\n".join(filenames).encode()).hexdigest()[:12]
+            directory = os.path.dirname(self.input_filenames[0])
+            self.job_journal_filename = os.path.join(
+                directory, f"merged-{digest}.journal"
+            )
+        else:
+            self.job_journal_filename = f"{self.input_filenames[0]}.journal"
+
+
+class Runtime:
+    """Lazily created resources of one run on ``network``.
+
+    Every accessor creates its resource on first use and returns the same one
+    afterwards. They may be called from several threads: each resource has its own
+    lock, so that reading the CSV file does not wait for the wallet to open.
+    :meth:`close` stops and closes what was created. A ``read_only`` run, such as a
+    check of the CSV file, writes neither the ledger index nor the validation cache.
+    """
+
+    RESOURCES = (
+        "config",
+        "backend",
+        "client",
+        "secret_manager",
+        "session",
+        "validation_cache",
+    )
+
+    def __init__(self, network, read_only=False):
+        self.network = network
+        self.read_only = read_only
+        self._resources = {}
+        self._locks = {name: threading.RLock() for name in self.RESOURCES}
+        self._ledger = None
+        self._ledger_index = None
+        self._tracker = None
+        self._lock = threading.RLock()
+
+    def _get(self, name, create):
+        with self._locks[name]:
+            if name not in self._resources:
+                self._resources[name] = create()
+            return self._resources[name]
+
+    @property
+    def bech32_hrp(self):
+        return self.network.bech32_hrp
+
+    @property
+    def config(self):
+        return self._get("config", Config)
+
+    @property
+    def backend(self):
+        """The real wallet and node, or the mock node with ``SHIMMER_BACKEND=mock``."""
+        load_env()
+        return self._get("backend", get_backend)
+
+    @property
+    def validation_cache(self):
+        """The cache of ``SHIMMER_VALIDATION_CACHE_FILENAME``, ``None`` if not set."""
+        return self._get("validation_cache", self._create_validation_cache)
+
+    def _create_validation_cache(self):
+        if not self.config.validation_cache_filename:
+            return None
+        return ValidationCache(
+            self.config.validation_cache_filename, self.config.validation_cache_size
+        )
+
+    def validate_addresses(self, addresses):
+        """Validate ``addresses`` for the network of the run, through the cache."""
+        return self.backend.validate_addresses(
+            addresses, self.bech32_hrp, self.validation_cache
+        )
+
+    def save_validation_cache(self):
+        cache = self._resources.get("validation_cache")
+        if cache is not None and not self.read_only:
+            cache.save()
+
+    @property
+    def client(self):
+        """The pool of the nodes of ``SHIMMER_NODE_URLS``, see node_pool.py."""
+        return self._get("client", self._create_client)
+
+    def _create_client(self):
+        load_env()
+        urls = node_urls([self.network.node_url])
+        return NodePool.from_urls(urls, self.backend.client)
+
+    @property
+    def secret_manager(self):
+        return self._get(
+            "secret_manager",
+            lambda: self.backend.secret_manager(
+                self.config.stronghold_db_name, self.config.stronghold_password
+            ),
+        )
+
+    def wallet(self):
+        """Create the wallet, on the fastest node of the pool.
+
+        The nodes are probed first, so that they are ranked by their measured
+        latency rather than in the order of ``SHIMMER_NODE_URLS``.
+        """
+        pool = self.client
+        pool.probe()
+        return self.backend.wallet(
+            self.config.wallet_db_name,
+            pool.client_options(),
+            self.network.coin_type,
+            self.secret_manager,
+        )
+
+    def has_session(self):
+        return "session" in self._resources
+
+    def session(self):
+        """Return the wallet session of the run, opening it on first use."""
+        return self._get(
+            "session",
+            lambda: WalletSession(
+                self.wallet(),
+                self.config.shimmer_account_name,
+                self.config.stronghold_password,
+            ).open(),
+        )
+
+    def ledger_index(self):
+        """Return the index of the sent-to ledger, see ledger_index.py."""
+        with self._lock:
+            if self._ledger_index is None:
+                self._ledger_index = open_index(
+                    self.config.shimmer_address_sent_to_filename, self.read_only
+                )
+            return self._ledger_index
+
+    def ledger(self):
+        """Return the writer of the sent-to ledger, opening it on first use."""
+        with self._lock:
+            if self._ledger is None:
+                self._ledger = LedgerWriter(
+                    self.config.shimmer_address_sent_to_filename,
+                    sources=self.config.multi_input,
+                    index=self.ledger_index(),
+                )
+            return self._ledger
+
+    def close_ledger(self):
+        with self._lock:
+            if self._ledger is not None:
+                self._ledger.close()
+                self._ledger = None
+            if self._ledger_index is not None:
+                self._ledger_index.close()
+                self._ledger_index = None
+
+    def tracker(self):
+        """Return the confirmation tracker, starting it on first use."""
+        with self._lock:
+            if self._tracker is None:
+                self._tracker = ConfirmationTracker(self.client)
+            return self._tracker
+
+    def close_tracker(self):
+        with self._lock:
+            if self._tracker is not None:
+                self._tracker.close()
+                self._tracker = None
+
+    def close(self):
+        """Close the tracker, the ledger and the node pool if they were created.
+
+        The validation cache is saved.
+        """
+        self.close_tracker()
+        self.close_ledger()
+        self.save_validation_cache()
+        client = self._resources.pop("client", None)
+        if client is not None:
+            client.close()
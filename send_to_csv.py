@@ -1,93 +1,53 @@
-import csv
+import argparse
+import atexit
 import logging
 import os
 import sys
-import time
 import traceback
 
-from dotenv import load_dotenv, set_key
-from iota_client import IotaClient
-from iota_wallet import IotaWallet, StrongholdSecretManager
-
-load_dotenv()
-
-# Global constants
-stronghold_password = os.getenv("STRONGHOLD_PASSWORD")
-stronghold_db_name = os.getenv("STRONGHOLD_DB_NAME")
-wallet_db_name = os.getenv("WALLET_DB_NAME")
-shimmer_mnemonic = os.getenv("SHIMMER_MNEMONIC")
-shimmer_account_name = os.getenv("SHIMMER_ACCOUNT_NAME")
-shimmer_smr_token_amount = os.getenv("SHIMMER_SMR_TOKEN_AMOUNT")
-config_done = os.getenv("CONFIG_DONE")
-config_done = eval(config_done)
-shimmer_address_read_from_filename = os.getenv("SHIMMER_ADDRESS_READ_FROM_FILENAME")
-shimmer_address_sent_to_filename = os.getenv("SHIMMER_ADDRESS_SENT_TO_FILENAME")
-
-##########################
-# Configure Logger
-##########################
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-# Create a file handler
-file_handler = logging.FileHandler("app.log")
-file_handler.setFormatter(formatter)
-
-# Add the file handler to the logger
-logger.addHandler(file_handler)
-
-# Create a stream handler
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-
-# Add the stream handler to the logger
-logger.addHandler(stream_handler)
-
-##########################
-# Shimmer wallet configurations
-##########################
-client_options = {
-    "nodes": ["https://api.testnet.shimmer.network"],
-}
-coin_type = 4219
-secret_manager = StrongholdSecretManager(stronghold_db_name, stronghold_password)
-client = IotaClient(client_options)
-
+from dotenv import set_key
+
+import metrics
+from confirmation import INCLUDED
+from consolidation import Consolidator
+from dedup import ALLOW, deduplicate
+from dry_run import plan_dry_run, probe_latency
+from packing import apply_deposits
+from planner import build_plan
+from recipients import load_recipients
+from runtime import (
+    REQUIRED_ENV_VARS,
+    TESTNET,
+    VALIDATE_ENV_VARS,
+    Runtime,
+    missing_env_vars,
+    setup_logging,
+)
+
+# The Shimmer network of this script. The .env settings, the log file, the wallet
+# and the nodes are only set up when a run needs them, see runtime.py
+runtime = Runtime(TESTNET)
+
+# The root logger, so that the helper modules log to the same handlers
+logger = logging.getLogger()
 
 ##########################
 # Start
 ##########################
 
 
-def basic_checks():
+def basic_checks(env_vars=REQUIRED_ENV_VARS):
     """Verify that all variables have non-empty values"""
-    env_vars = [
-        "STRONGHOLD_PASSWORD",
-        "STRONGHOLD_DB_NAME",
-        "WALLET_DB_NAME",
-        "SHIMMER_MNEMONIC",
-        "SHIMMER_ACCOUNT_NAME",
-        "SHIMMER_SMR_TOKEN_AMOUNT",
-        "CONFIG_DONE",
-        "SHIMMER_ADDRESS_READ_FROM_FILENAME",
-        "SHIMMER_ADDRESS_SENT_TO_FILENAME",
-    ]
-
-    # iterate through each environment variable and check if it has a non-empty value
-    for var in env_vars:
-        if os.getenv(var) is None or os.getenv(var) == "":
-            return False
-
-    # all variables have a non-empty value
-    return True
+    missing = missing_env_vars(env_vars)
+    if missing:
+        logger.debug(f"Missing variables: {missing}")
+    return not missing
 
 
 def create_shimmer_profile():
     """Create a new Shimmer wallet profile."""
     logger.debug("I am in create_shimmer_profile")
-    if config_done:
+    if runtime.config.config_done:
         logger.info("Configuration is OK.")
         return
     else:
@@ -102,11 +62,9 @@ def create_shimmer_profile():
             print("Creating new profile")
             # This creates a new database and account
             try:
-                wallet = IotaWallet(
-                    wallet_db_name, client_options, coin_type, secret_manager
-                )
-                account = wallet.store_mnemonic(shimmer_mnemonic)
-                account = wallet.create_account(shimmer_account_name)
+                wallet = runtime.wallet()
+                account = wallet.store_mnemonic(runtime.config.shimmer_mnemonic)
+                account = wallet.create_account(runtime.config.shimmer_account_name)
 
                 print(account)
                 set_key(".env", "CONFIG_DONE", "True")
@@ -118,167 +76,243 @@ def create_shimmer_profile():
                 logger.info(traceback.format_exc())
 
 
-def verify_content(csv_content, invalid_rows):
-    """Verify the address for Shimmer and append the invalid rows to the list."""
-    csv_reader = csv.reader(csv_content.splitlines())
+def get_session():
+    """Return the wallet session of this run, opening and consolidating it on first use."""
+    if not runtime.has_session():
+        session = runtime.session()
+        # Consolidate only if a single payment would need too many inputs
+        Consolidator(session, runtime.tracker(), plan_payment).run(plan_payment())
+    return runtime.session()
+
+
+def plan_payment():
+    """Plan one payment of SHIMMER_SMR_TOKEN_AMOUNT against the session outputs."""
+    return build_plan(
+        [(0, 0, 0, [runtime.config.shimmer_smr_token_amount], None)],
+        runtime.session().unspent.values(),
+    )
+
+
+def verify_content(filename):
+    """Load and verify the recipients of the CSV file into a columnar table."""
+    config = runtime.config
+    result = load_recipients(
+        filename,
+        runtime.validate_addresses,
+        default_amount=config.shimmer_smr_token_amount,
+        amount_column=config.shimmer_amount_column,
+        tag_column=config.shimmer_tag_column,
+        token_id_column=config.shimmer_native_token_id_column,
+        token_amount_column=config.shimmer_native_token_amount_column,
+    )
+    runtime.save_validation_cache()
+    return result
+
+
+def deduplicate_recipients(table):
+    """Drop or merge duplicate recipients and skip the addresses already paid.
+
+    Returns ``None`` if the duplicates are rejected.
+    """
+    config = runtime.config
+    sent = None
+    if config.shimmer_already_sent != ALLOW:
+        sent = runtime.ledger_index()
+    table, report = deduplicate(
+        table, config.shimmer_duplicates, sent, config.shimmer_already_sent
+    )
+    if report.rejected:
+        logger.info(f"{report.summary()}\n {report.rows}")
+        logger.info(
+            "Please remove the duplicates, or set SHIMMER_DUPLICATES / "
+            "SHIMMER_ALREADY_SENT, and try again."
+        )
+        return None
+    return table
+
+
+def check_deposits(table):
+    """Apply the storage deposit policy to the amounts of ``table``.
+
+    Returns ``None`` if amounts below their storage deposit are rejected.
+    """
+    table, report = apply_deposits(table, runtime.config.shimmer_below_deposit)
+    if report.rejected:
+        logger.info(f"{report.summary()}\n {report.rows}")
+        logger.info(
+            "Please raise these amounts, or set SHIMMER_BELOW_DEPOSIT=raise, "
+            "and try again."
+        )
+        return None
+    return table
+
+
+def check_list():
+    """Verify the CSV file and deduplicate it, without the wallet or the nodes.
+
+    Returns the recipients to send, ``None`` if the file cannot be sent as it is.
+    """
+    table, validation = verify_content(
+        runtime.config.shimmer_address_read_from_filename
+    )
+    if not validation.is_valid:
+        logger.info(
+            f"{validation.invalid_count} invalid rows found\n {validation.invalid_rows}"
+        )
+        return None
+    table = deduplicate_recipients(table)
+    if table is not None:
+        table = check_deposits(table)
+    if table is not None:
+        logger.info(
+            f"{len(table)} recipients to send, {table.total_amount} glow in total"
+        )
+    return table
+
+
+def validate_list():
+    """Verify the CSV file and its duplicates, without the wallet or the nodes.
 
-    shimmer_client = IotaClient()
-    next(csv_reader)  # skip the header row
-    for i, row in enumerate(csv_reader):
-        if not shimmer_client.is_address_valid(
-            str(row[1])
-        ):  # address in column B, [0] for column A
-            invalid_rows.append(str(row[1]))  # address in column B, [0] for column A
-    return invalid_rows
+    Returns True if the file can be sent as it is.
+    """
+    logger.debug("I am in validate_list")
+    return check_list() is not None
+
+
+def dry_run(probe=True, send_seconds=None, confirm_seconds=None):
+    """Report what sending the CSV file costs and how long it should take.
+
+    Every recipient is sent in its own block. Nothing is signed or sent and
+    Stronghold is not opened. Returns True if the file can be sent as it is.
+    """
+    logger.debug("I am in dry_run")
+    table = check_list()
+    if table is None:
+        return False
+    latency = None
+    if probe:
+        try:
+            latency = probe_latency(runtime.client)
+        finally:
+            runtime.close()
+    report = plan_dry_run(
+        table,
+        1,
+        latency=latency,
+        send_seconds=send_seconds,
+        confirm_seconds=confirm_seconds,
+    )
+    logger.info(f"Dry run: {report.summary()}")
+    return True
 
 
 def send_to_list():
     """Read the CSV file and send SMR tokens to the corresponding addresses."""
     logger.debug("I am in send_to_list")
-    invalid_rows = []
 
     try:
-        # Read the CSV list of receiver addresses (all addresses are in column A)
-        with open(shimmer_address_read_from_filename, encoding="UTF8") as file:
-            csv_file = file
-            csv_content = csv_file.read()
-
-            # Verify the addresses and log any invalid rows
-            if verify_content(csv_content, invalid_rows):
-                logger.info(f"Invalid rows found\n {invalid_rows}")
-                logger.info("Please correct the addresses and try again.")
-            else:
-                logger.info("Addresses are valid. We continue.")
-                logger.debug(f"CSV content: {csv_content}")
-                # Iterate over each row in the CSV and send SMR tokens
-                csv_reader = csv.reader(csv_content.splitlines())
-                next(csv_reader)  # skip the header row
-                for row in enumerate(csv_reader):
-                    try:
-                        logger.debug(f"Line: {row[1]}")
-                        address = str(
-                            row[1][1]
-                        )  # address in column B, [1][0] for column A
-                        send_smr_tokens(address)
-                    except Exception:
-                        logger.info(traceback.format_exc())
+        # Verify the addresses and log any invalid rows
+        table, validation = verify_content(
+            runtime.config.shimmer_address_read_from_filename
+        )
+        if not validation.is_valid:
+            logger.info(
+                f"{validation.invalid_count} invalid rows found\n {validation.invalid_rows}"
+            )
+            logger.info("Please correct the addresses and try again.")
+            return
+        logger.info("Addresses are valid. We continue.")
+
+        table = deduplicate_recipients(table)
+        if table is not None:
+            table = check_deposits(table)
+        if table is None:
+            return
+        # Send SMR tokens to each recipient, building one output at a time
+        for i in range(len(table)):
+            try:
+                (output,) = table.outputs(i, i + 1)
+                logger.debug("Line %s: %s", table.rows[i], output["address"])
+                send_smr_tokens(output["address"], output["amount"], output)
+            except Exception:
+                logger.info(traceback.format_exc())
     except Exception:
         logger.info(traceback.format_exc())
+    finally:
+        runtime.close_tracker()
+        runtime.close()
 
 
-def get_transaction_status(pending_transactions, shimmer_receiver_address):
+def get_transaction_status(pending_transactions, shimmer_receiver_address, amount):
     """Gets the transaction status and returns the block ID and shimmer receiver address."""
     logger.debug(pending_transactions)
 
     block_id = pending_transactions[0]["blockId"]
     logger.debug(f"Block ID: {block_id}")
-    check_transaction_confirm(block_id, shimmer_receiver_address)
+    block_id = check_transaction_confirm(block_id, shimmer_receiver_address, amount)
 
     return block_id, shimmer_receiver_address
 
 
-def check_transaction_confirm(block_id, shimmer_receiver_address):
-    """Checks whether the transaction has been confirmed by the ledger and waits until it has been."""
+def check_transaction_confirm(block_id, shimmer_receiver_address, amount):
+    """Wait until the transaction of ``block_id`` is included or has failed.
+
+    Returns the ID of the block that was included, ``None`` if the transaction is
+    conflicting or could not be included.
+    """
     logger.debug(f"block_id: {block_id}")
+    logger.info("Checking transaction status...")
+    tracked = runtime.tracker().track(block_id)
+    if tracked.wait() != INCLUDED:
+        logger.info(f"Transaction was not confirmed: {tracked.state}")
+        return None
 
-    # Loop until the transaction has been confirmed
-    while True:
-        # Get the ledger inclusion state for the block
-        ledger_inclusion_state = client.get_block_metadata(block_id).get(
-            "ledgerInclusionState"
-        )
-        logger.info("Checking transaction status...")
-        logger.debug(f"Ledger inclusion state: {ledger_inclusion_state}")
-
-        if ledger_inclusion_state is not None:
-            # Transaction has been confirmed
-            logger.info("Transaction has been confirmed.")
-            write_to_csv(
-                shimmer_receiver_address,
-                shimmer_smr_token_amount,
-                block_id,
-            )
-            return block_id
-        else:
-            # Wait for 10 seconds before checking again
-            time.sleep(10)
+    logger.info("Transaction has been confirmed.")
+    runtime.ledger().write_chunk(
+        [{"address": shimmer_receiver_address, "amount": amount}],
+        tracked.block_id,
+    )
+    return tracked.block_id
 
 
-def check_enough_balance(account_status, shimmer_receiver_address):
-    global shimmer_smr_token_amount
-    available_balance = int(account_status["baseCoin"]["available"])
-    if available_balance >= int(shimmer_smr_token_amount):
-        return
-    else:
+def check_enough_balance(session, shimmer_receiver_address, amount):
+    try:
+        session.ensure_balance(int(amount))
+    except ValueError:
         logger.info(f"Impossible to send to {shimmer_receiver_address}")
-        raise ValueError("Not enough balance")
-
-
-def write_to_csv(shimmer_receiver_address, shimmer_smr_token_amount, block_id):
-    """Writes the transaction details to a CSV file."""
-    # assuming you have the following variables available:
-    # - address
-    # - token_amount
-    # - date_time
-    # - block_id
-
-    # construct the explorer link
-    explorer_link = f"https://explorer.shimmer.network/shimmer/block/{block_id}"
-    # Get the current date and time
-    date_time = time.strftime("%Y-%m-%d %H:%M:%S")
-
-    # create a list with the data to write to the CSV file
-    data = [
-        [shimmer_receiver_address, explorer_link, shimmer_smr_token_amount, date_time]
-    ]
-
-    # open the CSV file in 'append' mode
-    with open(shimmer_address_sent_to_filename, "a", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        # write the data to the CSV file
-        writer.writerows(data)
-        logger.info(
-            f"Transaction details appended to CSV file for address: {shimmer_receiver_address}"
-        )
+        raise
 
 
-def send_smr_tokens(shimmer_receiver_address):
-    """Sends SMR tokens to a single address."""
-    global shimmer_smr_token_amount
+def send_smr_tokens(shimmer_receiver_address, amount, output=None):
+    """Sends ``amount`` glow to a single address.
+
+    ``output`` is the whole output of the recipient, with its tag and native token
+    if the CSV file has them.
+    """
     try:
-        # Sync account with the node
-        wallet = IotaWallet(wallet_db_name, client_options, coin_type, secret_manager)
-        account = wallet.get_account(shimmer_account_name)
-        account_status = account.sync()
-        logger.info("Account Synced")
-        logger.debug(f"Account status: {account_status}")
-        consolidate_account = account.consolidate_outputs(foce=True, max_outputs=100)
-        logger.info("Account Consolidated")
-        logger.debug(f"Account consolidation: {consolidate_account}")
+        # The session is opened, consolidated and synced once for the whole run
+        session = get_session()
 
         # Verify if there is enough balance
-        check_enough_balance(account_status, shimmer_receiver_address)
-
-        # Set the Stronghold password
-        wallet.set_stronghold_password(stronghold_password)
+        check_enough_balance(session, shimmer_receiver_address, amount)
 
         # Define the output transaction
         logger.debug(f"Shimmer address: {shimmer_receiver_address}")
-        logger.debug(f"Shimmer amount: {shimmer_smr_token_amount}")
-        outputs = [
-            {
-                "address": shimmer_receiver_address,
-                "amount": shimmer_smr_token_amount,
-            }
-        ]
-        logger.debug(f"Outputs: {outputs}")
+        logger.debug(f"Shimmer amount: {amount}")
+        outputs = [output or {"address": shimmer_receiver_address, "amount": amount}]
+        logger.debug("Outputs: %s", outputs)
 
         try:
             # Send the transaction with the defined outputs
-            account.send_amount(outputs)
+            transaction = session.send_amount(outputs)
             logger.info("Transaction sent")
-            pending_transactions = account.pending_transactions()
-            get_transaction_status(pending_transactions, shimmer_receiver_address)
+            block_id, _ = get_transaction_status(
+                [transaction], shimmer_receiver_address, amount
+            )
+            if block_id is None:
+                session.failed(transaction)
+            else:
+                session.confirmed(transaction)
 
         except Exception:
             logger.info(traceback.format_exc())
@@ -292,7 +326,77 @@ def send_smr_tokens(shimmer_receiver_address):
         logger.info(traceback.format_exc())
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Send SMR tokens to the addresses listed in a CSV file, one by one."
+    )
+    parser.add_argument(
+        "--validate-only",
+        action="store_true",
+        help="Only verify the CSV file and report its duplicates, without opening "
+        "the wallet or contacting a node; exits with 1 if it cannot be sent",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Verify the CSV file and estimate the cost and duration of sending it, "
+        "without opening Stronghold or sending anything",
+    )
+    parser.add_argument(
+        "--no-probe",
+        dest="probe",
+        action="store_false",
+        help="With --dry-run, do not contact the nodes to measure their latency",
+    )
+    parser.add_argument(
+        "--send-seconds",
+        type=float,
+        help="With --dry-run, seconds to send one block instead of the estimate",
+    )
+    parser.add_argument(
+        "--confirm-seconds",
+        type=float,
+        help="With --dry-run, seconds to confirm one block instead of the estimate",
+    )
+    parser.add_argument(
+        "--log-queue",
+        action="store_true",
+        help="Write the log from a background thread to an app.log rotated and "
+        "compressed by size, with one summary per chunk instead of the outputs of "
+        "every recipient (see --verbose)",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="With --log-queue, also log the outputs and polls of every chunk",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Save the timings and counters of the run to FILE at exit: Prometheus "
+        "text for a .prom or .txt file, a JSON summary otherwise",
+    )
+    return parser.parse_args(argv)
+
+
 def main():
+    args = parse_args()
+    if args.log_queue and not args.verbose:
+        setup_logging(level=logging.INFO, queued=True)
+    else:
+        setup_logging(queued=args.log_queue)
+    if args.metrics:
+        atexit.register(metrics.write, args.metrics)
+    if args.validate_only or args.dry_run:
+        # The checks leave no file behind but the log
+        runtime.read_only = True
+        if not basic_checks(VALIDATE_ENV_VARS):
+            logger.info("Make sure to fill out the information in the .env file.")
+            sys.exit(1)
+        if args.validate_only:
+            sys.exit(0 if validate_list() else 1)
+        valid = dry_run(args.probe, args.send_seconds, args.confirm_seconds)
+        sys.exit(0 if valid else 1)
     if basic_checks():
         create_shimmer_profile()
         send_to_list()
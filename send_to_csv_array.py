@@ -1,96 +1,92 @@
-import csv
-import itertools
+import argparse
+import asyncio
+import atexit
 import logging
 import os
 import sys
-import time
 import traceback
 
-from dotenv import load_dotenv, set_key
-from iota_client import IotaClient
-from iota_wallet import IotaWallet, StrongholdSecretManager
-
-load_dotenv()
-
-# Global constants
-stronghold_password = os.getenv("STRONGHOLD_PASSWORD")
-stronghold_db_name = os.getenv("STRONGHOLD_DB_NAME")
-wallet_db_name = os.getenv("WALLET_DB_NAME")
-shimmer_mnemonic = os.getenv("SHIMMER_MNEMONIC")
-shimmer_account_name = os.getenv("SHIMMER_ACCOUNT_NAME")
-shimmer_smr_token_amount = os.getenv("SHIMMER_SMR_TOKEN_AMOUNT")
-config_done = os.getenv("CONFIG_DONE")
-config_done = eval(config_done)
-shimmer_address_read_from_filename = os.getenv("SHIMMER_ADDRESS_READ_FROM_FILENAME")
-shimmer_address_sent_to_filename = os.getenv("SHIMMER_ADDRESS_SENT_TO_FILENAME")
-
-##########################
-# Configure Logger
-##########################
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-# Create a file handler
-file_handler = logging.FileHandler("app.log")
-file_handler.setFormatter(formatter)
-
-# Add the file handler to the logger
-logger.addHandler(file_handler)
-
-# Create a stream handler
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-
-# Add the stream handler to the logger
-logger.addHandler(stream_handler)
-
-##########################
-# Shimmer wallet configurations
-##########################
-client_options = {
-    "nodes": ["https://api.shimmer.network"],
-}
-coin_type = 4219
-secret_manager = StrongholdSecretManager(stronghold_db_name, stronghold_password)
-client = IotaClient(client_options)
+from dotenv import set_key
+
+import metrics
+from async_engine import AsyncEngine, EngineChunk
+from confirmation import INCLUDED
+from consolidation import Consolidator
+from dedup import ALLOW, deduplicate
+from dry_run import plan_dry_run, probe_latency
+from job_journal import CONFIRMED, PLANNED, SENT, SUBMITTED, JobJournal
+from packing import apply_deposits, remainder_option
+from pipeline import PipelinedSender
+from planner import build_plan
+from recipients import expand_inputs, load_recipient_files
+from runtime import (
+    MAINNET,
+    REQUIRED_ENV_VARS,
+    VALIDATE_ENV_VARS,
+    Runtime,
+    missing_env_vars,
+    setup_logging,
+)
+from sharding import (
+    FundingFailed,
+    assign_chunks,
+    fund_shards,
+    open_shards,
+    run_shards,
+    sweep_shards,
+)
+from wallet_session import InsufficientBalance
+
+# The Shimmer network of this script. The .env settings, the log file, the wallet
+# and the nodes are only set up when a run needs them, see runtime.py
+runtime = Runtime(MAINNET)
+
+# The root logger, so that the helper modules log to the same handlers
+logger = logging.getLogger()
 
 # Define the chunk size of bulk transactions
 chunk_size = 127
+# Chunks in flight with the async engine when --window is not given
+ASYNC_WINDOW = 8
 
 ##########################
 # Start
 ##########################
 
 
-def basic_checks():
-    """Verify that all variables have non-empty values"""
-    env_vars = [
-        "STRONGHOLD_PASSWORD",
-        "STRONGHOLD_DB_NAME",
-        "WALLET_DB_NAME",
-        "SHIMMER_MNEMONIC",
-        "SHIMMER_ACCOUNT_NAME",
-        "SHIMMER_SMR_TOKEN_AMOUNT",
-        "CONFIG_DONE",
-        "SHIMMER_ADDRESS_READ_FROM_FILENAME",
-        "SHIMMER_ADDRESS_SENT_TO_FILENAME",
-    ]
-
-    # iterate through each environment variable and check if it has a non-empty value
-    for var in env_vars:
-        if os.getenv(var) is None or os.getenv(var) == "":
-            return False
-
-    # all variables have a non-empty value
+def basic_checks(env_vars=REQUIRED_ENV_VARS, inputs=None):
+    """Verify that all variables have non-empty values and select the input files.
+
+    ``inputs`` are the files or glob patterns of ``--input``; without them the
+    recipients are read from ``SHIMMER_ADDRESS_READ_FROM_FILENAME``, which may be a
+    glob pattern too.
+    """
+    if inputs:
+        env_vars = [v for v in env_vars if v != "SHIMMER_ADDRESS_READ_FROM_FILENAME"]
+    missing = missing_env_vars(env_vars)
+    if missing:
+        logger.debug(f"Missing variables: {missing}")
+        return False
+    config = runtime.config
+    try:
+        config.set_inputs(
+            expand_inputs(inputs or [config.shimmer_address_read_from_filename])
+        )
+    except ValueError as e:
+        logger.info(e)
+        return False
+    if config.multi_input:
+        logger.info(
+            f"Sending {len(config.input_filenames)} files together: "
+            f"{', '.join(config.input_filenames)}"
+        )
     return True
 
 
 def create_shimmer_profile():
     """Create a new Shimmer wallet profile."""
     logger.debug("I am in create_shimmer_profile")
-    if config_done:
+    if runtime.config.config_done:
         logger.info("Configuration is OK.")
         return
     else:
@@ -105,11 +101,9 @@ def create_shimmer_profile():
             print("Creating new profile")
             # This creates a new database and account
             try:
-                wallet = IotaWallet(
-                    wallet_db_name, client_options, coin_type, secret_manager
-                )
-                account = wallet.store_mnemonic(shimmer_mnemonic)
-                account = wallet.create_account(shimmer_account_name)
+                wallet = runtime.wallet()
+                account = wallet.store_mnemonic(runtime.config.shimmer_mnemonic)
+                account = wallet.create_account(runtime.config.shimmer_account_name)
 
                 print(account)
                 set_key(".env", "CONFIG_DONE", "True")
@@ -121,71 +115,458 @@ def create_shimmer_profile():
                 logger.info(traceback.format_exc())
 
 
-def verify_content(csv_content, invalid_rows):
-    """Verify the address for Shimmer and append the invalid rows to the list."""
-    csv_reader = csv.reader(csv_content.splitlines())
+def verify_content(filenames):
+    """Load and verify the recipients of the CSV files into one columnar table."""
+    config = runtime.config
+    result = load_recipient_files(
+        filenames,
+        runtime.validate_addresses,
+        default_amount=config.shimmer_smr_token_amount,
+        amount_column=config.shimmer_amount_column,
+        tag_column=config.shimmer_tag_column,
+        token_id_column=config.shimmer_native_token_id_column,
+        token_amount_column=config.shimmer_native_token_amount_column,
+    )
+    runtime.save_validation_cache()
+    return result
+
 
-    shimmer_client = IotaClient()
-    next(csv_reader)  # skip the header row
-    for i, row in enumerate(csv_reader):
-        if not shimmer_client.is_address_valid(
-            str(row[1])
-        ):  # address in column B, [0] for column A
-            invalid_rows.append(str(row[1]))  # address in column B, [0] for column A
-    return invalid_rows
+def check_deposits(table):
+    """Apply the storage deposit policy to the amounts of ``table``.
+
+    Returns ``None`` if amounts below their storage deposit are rejected.
+    """
+    table, report = apply_deposits(table, runtime.config.shimmer_below_deposit)
+    if report.rejected:
+        logger.info(f"{report.summary()}\n {report.rows}")
+        logger.info(
+            "Please raise these amounts, or set SHIMMER_BELOW_DEPOSIT=raise, "
+            "and try again."
+        )
+        return None
+    return table
 
 
-def send_to_list():
-    """Read the CSV file and send SMR tokens to the corresponding addresses."""
-    global chunk_size
+def check_list():
+    """Verify the CSV file and deduplicate it, without the wallet or the nodes.
+
+    Returns the recipients to send, ``None`` if the file cannot be sent as it is.
+    """
+    config = runtime.config
+    table, validation = verify_content(config.input_filenames)
+    if not validation.is_valid:
+        logger.info(
+            f"{validation.invalid_count} invalid rows found\n {validation.invalid_rows}"
+        )
+        return None
+    sent = None
+    if config.shimmer_already_sent != ALLOW:
+        sent = runtime.ledger_index()
+    table, report = deduplicate(
+        table, config.shimmer_duplicates, sent, config.shimmer_already_sent
+    )
+    logger.info(report.summary())
+    if report.rejected:
+        logger.info(f"Rejected rows:\n {report.rows}")
+        return None
+    table = check_deposits(table)
+    if table is None:
+        return None
+    logger.info(f"{len(table)} recipients to send, {table.total_amount} glow in total")
+    return table
+
+
+def validate_list():
+    """Verify the CSV file and report its duplicates, without the wallet or the nodes.
+
+    Returns True if the file can be sent as it is.
+    """
+    logger.debug("I am in validate_list")
+    return check_list() is not None
+
+
+def dry_run(window=1, shards=1, probe=True, send_seconds=None, confirm_seconds=None):
+    """Report what sending the CSV file costs and how long it should take.
+
+    Nothing is signed or sent and Stronghold is not opened; with ``probe`` the nodes
+    are asked for their info to measure their latency. Returns True if the file can
+    be sent as it is.
+    """
+    logger.debug("I am in dry_run")
+    table = check_list()
+    if table is None:
+        return False
+    latency = None
+    if probe:
+        try:
+            latency = probe_latency(runtime.client)
+        finally:
+            runtime.close()
+    report = plan_dry_run(
+        table, chunk_size, window, shards, latency, send_seconds, confirm_seconds
+    )
+    logger.info(f"Dry run: {report.summary()}")
+    return True
+
+
+def send_to_list(
+    window=1, resend_in_doubt=False, consolidate=True, engine="sync", shards=1
+):
+    """Read the CSV file and send SMR tokens to the corresponding addresses.
+
+    With ``window`` > 1 up to that many chunks are kept in flight at once. Chunks
+    already confirmed by a previous run of the same file are skipped. With
+    ``consolidate``, the outputs of the account are consolidated first if the plan
+    shows they are too fragmented. ``engine="async"`` sends with the asyncio engine.
+    With ``shards`` > 1 the chunks are spread over that many accounts sending in
+    parallel.
+    """
     logger.debug("I am in send_to_list")
-    invalid_rows = []
-    # Define the outputs array
-    outputs = []
-
-    # Read the CSV file in chunks
-    with open(shimmer_address_read_from_filename, encoding="UTF8") as file:
-        csv_file = file
-        csv_content = csv_file.read()
-        # Verify the addresses and log any invalid rows
-        if verify_content(csv_content, invalid_rows):
-            logger.info(f"Invalid rows found\n {invalid_rows}")
-            logger.info("Please correct the addresses and try again.")
-        else:
-            logger.info("Addresses are valid. We continue.")
-            logger.debug(f"CSV content: {csv_content}")
+    config = runtime.config
+
+    # Verify the addresses and log any invalid rows before sending anything
+    if engine == "async":
+        table, validation = asyncio.run(open_and_verify())
+    else:
+        table, validation = verify_content(config.input_filenames)
+    if not validation.is_valid:
+        logger.info(
+            f"{validation.invalid_count} invalid rows found\n {validation.invalid_rows}"
+        )
+        logger.info("Please correct the addresses and try again.")
+        return
+    logger.info("Addresses are valid. We continue.")
+
+    journal = JobJournal(
+        config.job_journal_filename,
+        config.input_filenames,
+        chunk_size,
+        {
+            "duplicates": config.shimmer_duplicates,
+            "already_sent": config.shimmer_already_sent,
+        },
+    )
+    try:
+        table = deduplicate_recipients(table, journal)
+        if table is not None:
+            table = check_deposits(table)
+        if table is None:
+            return
+
+        in_doubt = journal.in_doubt()
+        if in_doubt and not resend_in_doubt:
+            logger.info(
+                f"Chunks {in_doubt} may have been sent before the previous run stopped."
+            )
+            logger.info(
+                "Check the wallet history, then run again with --resend-in-doubt "
+                "to send them anyway."
+            )
+            return
+
+        plan = plan_job(table, journal)
+        if consolidate:
+            plan = Consolidator(
+                runtime.session(),
+                runtime.tracker(),
+                lambda: plan_job(table, journal),
+            ).run(plan)
+        summary = journal.summary()
+        if not plan.chunks and not any(summary.get(state) for state in SENT):
+            if plan.recipients:
+                logger.info("Not enough balance to send any chunk.")
+            else:
+                logger.info("Nothing left to send.")
+            return
+
+        if shards > 1:
+            send_to_list_sharded(shards, window, table, journal, plan)
+            return
+        if engine == "async":
+            send_to_list_async(window, table, journal, plan)
+            return
+        if window > 1:
+            send_to_list_pipelined(
+                window, read_chunks(table, journal, plan), journal, plan
+            )
+            return
+
+        # Read the CSV file in chunks
+        for index, rows, outputs in read_chunks(table, journal, plan):
+            state, block_id = journal.state(index)
+            if state in SENT:
+                logger.info(f"Chunk {index} was already sent in block {block_id}")
+                if check_transaction_confirm(
+                    block_id,
+                    outputs,
+                    on_failed=lambda state: journal.not_confirmed(index, state),
+                ):
+                    journal.confirmed(index)
+                continue
+
+            journal.planned(index, *rows)
+            try:
+                transaction = send_smr_tokens(
+                    outputs,
+                    on_submitted=lambda tx: journal.submitted(index, tx),
+                    inputs=plan.mandatory_inputs(index),
+                    on_failed=lambda state: journal.not_confirmed(index, state),
+                )
+            except InsufficientBalance as e:
+                journal.failed(index)
+                logger.info(f"Stopping the program: {e}")
+                return
+            if transaction is not None:
+                journal.confirmed(index)
+            elif journal.state(index)[0] in (PLANNED, SUBMITTED):
+                # Sent chunks may still be included, only unsent ones are failed
+                journal.not_confirmed(index)
+    finally:
+        runtime.close_tracker()
+        journal.close()
+        runtime.close()
+
+
+def deduplicate_recipients(table, journal):
+    """Drop or merge duplicate recipients and skip the addresses already paid.
+
+    Returns ``None`` if the duplicates are rejected. The rows skipped as already paid
+    are recorded in the journal, so that resuming does not skip the rows this very
+    job has written to the ledger.
+    """
+    config = runtime.config
+    excluded = journal.excluded_rows()
+    sent = None
+    if excluded is None and config.shimmer_already_sent != ALLOW:
+        sent = runtime.ledger_index()
+    table, report = deduplicate(
+        table,
+        config.shimmer_duplicates,
+        sent,
+        config.shimmer_already_sent,
+        excluded,
+    )
+    if report.rejected:
+        logger.info(f"{report.summary()}\n {report.rows}")
+        logger.info(
+            "Please remove the duplicates, or set SHIMMER_DUPLICATES / "
+            "SHIMMER_ALREADY_SENT, and try again."
+        )
+        return None
+    if excluded is None:
+        journal.exclude(report.sent_rows)
+    return table
+
+
+def read_chunks(table, journal, plan=None):
+    """Yield ``(index, (first_row, last_row), outputs)`` for every chunk of ``table``.
+
+    Chunks already confirmed in ``journal`` are skipped without building their outputs.
+    With a ``plan``, reading stops at the first chunk the balance cannot pay for.
+    """
+    for index, start, stop in pending_chunks(table, journal, plan):
+        yield read_chunk(table, index, start, stop)
+
+
+def read_chunk(table, index, start, stop):
+    rows = (int(table.rows[start]), int(table.rows[stop - 1]))
+    return index, rows, table.outputs(start, stop)
+
+
+def pending_chunks(table, journal, plan=None):
+    """Yield ``(index, start, stop)`` of the chunks :func:`read_chunks` reads."""
+    for index, start, stop in table.chunk_bounds(chunk_size):
+        state = journal.state(index)[0]
+        if state == CONFIRMED:
+            continue
+        if plan is not None and index not in plan and state not in SENT:
+            logger.info(
+                f"Stopping before chunk {index}: {plan.uncovered_recipients} "
+                "recipients are left, top up the account and run again to send them."
+            )
+            return
+        yield index, start, stop
+
+
+def plan_job(table, journal):
+    """Plan the chunks left to send against the unspent outputs of the account."""
+    session = runtime.session()
+    deposits = table.deposits()
+    chunks = (
+        (
+            index,
+            int(table.rows[start]),
+            int(table.rows[stop - 1]),
+            table.amounts[start:stop],
+            None if deposits is None else deposits[start:stop],
+        )
+        for index, start, stop in table.chunk_bounds(chunk_size)
+        # Confirmed and sent chunks are already paid for
+        if journal.state(index)[0] not in (CONFIRMED, *SENT)
+    )
+    plan = build_plan(chunks, session.unspent.values())
+    if not plan.is_complete:
+        logger.info(
+            f"Not enough balance for the whole file, sending the first "
+            f"{plan.coverable_recipients} of {plan.recipients} recipients"
+        )
+    return plan
 
-    with open(shimmer_address_read_from_filename, encoding="UTF8") as file:
-        # csv_reader = csv.reader(file)
-        # header = next(csv_reader)  # skip the header row
 
-        while True:
-            # Create a new csv_reader object for each chunk of rows
-            rows = list(itertools.islice(csv.reader(file), chunk_size))
+def send_to_list_pipelined(window, chunks, journal, plan=None, session=None):
+    """Send ``chunks`` keeping up to ``window`` of them in flight.
 
-            # Check if we've reached the end of the file
-            if not rows:
+    ``chunks`` yields ``(index, rows, outputs)`` as :func:`read_chunks` does. The
+    inputs of the ``plan`` are used if given; ``session`` defaults to the one of
+    the run.
+    """
+    logger.debug("I am in send_to_list_pipelined")
+    if session is None:
+        session = runtime.session()
+
+    def on_confirmed(chunk):
+        session.confirmed(chunk.transaction)
+        runtime.ledger().write_chunk(chunk.outputs, chunk.block_id)
+        journal.confirmed(chunk.key)
+
+    def on_failed(chunk, state):
+        session.failed(chunk.transaction)
+        journal.not_confirmed(chunk.key, state)
+
+    with PipelinedSender(
+        session, runtime.client, on_confirmed, on_failed, window=window
+    ) as sender:
+        for index, rows, outputs in chunks:
+            state, block_id = journal.state(index)
+            if state in SENT:
+                # Reattach to the block sent by the previous run
+                logger.info(f"Chunk {index} was already sent in block {block_id}")
+                transaction = {"blockId": block_id, "transactionId": None}
+                sender.attach(transaction, outputs, key=index)
+                continue
+
+            journal.planned(index, *rows)
+            try:
+                sender.submit(
+                    outputs,
+                    key=index,
+                    on_submitted=lambda tx, index=index: journal.submitted(index, tx),
+                    options=send_options(
+                        None if plan is None else plan.mandatory_inputs(index)
+                    ),
+                )
+            except InsufficientBalance as e:
+                journal.failed(index)
+                logger.info(f"Stopping the program: {e}")
                 break
 
-            # Process the rows in the chunk
-            for row in rows:
-                try:
-                    logger.debug(f"Line: {row}")
-                    address = str(row[1])  # address in column B, [0] for column A
-                    # amount = int(row[2])   # amount in column C, [1] for column B
-                    amount = shimmer_smr_token_amount  # amount from .env
-                    outputs.append({"address": address, "amount": amount})
-                except (IndexError, ValueError) as e:
-                    logger.warning(f"Error processing row {row}: {e}")
-                    invalid_rows.append(row)
-
-            # Call send_smr_tokens with the outputs array
-            # send_smr_tokens(str(outputs))
-            send_smr_tokens(outputs)
-            outputs = []
-
-
-def get_transaction_status(pending_transactions, outputs):
+
+def send_to_list_sharded(shard_count, window, table, journal, plan):
+    """Spread the chunks of the CSV file over ``shard_count`` accounts sending in parallel."""
+    logger.debug("I am in send_to_list_sharded")
+    shards = open_shards(runtime.session(), shard_count)
+    bounds = {
+        index: (start, stop)
+        for index, start, stop in pending_chunks(table, journal, plan)
+    }
+    assign_chunks(
+        shards, [(index, plan[index].cost if index in plan else 0) for index in bounds]
+    )
+    try:
+        fund_shards(shards, runtime.tracker(), window)
+    except (InsufficientBalance, FundingFailed) as e:
+        logger.info(f"Stopping the program: {e}")
+        logger.info(
+            "Funds already in the shard accounts are used by the next run, or "
+            "returned to the main account with --sweep-shards."
+        )
+        return
+
+    def send_shard(shard):
+        chunks = (read_chunk(table, index, *bounds[index]) for index in shard.chunks)
+        # The funding transaction spent the inputs of the plan
+        send_to_list_pipelined(window, chunks, journal, session=shard.session)
+
+    run_shards(shards, send_shard)
+    sweep(shards)
+
+
+def sweep(shards):
+    """Send what is left in the shard accounts back to the main account."""
+    try:
+        swept = sweep_shards(shards, runtime.tracker())
+    except (InsufficientBalance, FundingFailed) as e:
+        logger.info(f"Could not sweep the shard accounts: {e}")
+        logger.info("Run again with --sweep-shards to return their funds.")
+        return
+    logger.info(f"{swept} glow swept back from the shard accounts")
+
+
+def sweep_only(shard_count):
+    """Return the funds of ``shard_count - 1`` shard accounts to the main account."""
+    logger.debug("I am in sweep_only")
+    try:
+        sweep(open_shards(runtime.session(), shard_count))
+    finally:
+        runtime.close_tracker()
+        runtime.close()
+
+
+async def open_and_verify():
+    """Open the wallet session while the CSV file is read and verified."""
+    loop = asyncio.get_running_loop()
+    _, content = await asyncio.gather(
+        loop.run_in_executor(None, runtime.session),
+        loop.run_in_executor(None, verify_content, runtime.config.input_filenames),
+    )
+    return content
+
+
+def send_to_list_async(window, table, journal, plan):
+    """Send the chunks of the CSV file with the asyncio engine."""
+    logger.debug("I am in send_to_list_async")
+    session = runtime.session()
+
+    def chunks():
+        for index, rows, outputs in read_chunks(table, journal, plan):
+            state, block_id = journal.state(index)
+            if state in SENT:
+                # Only wait for the block sent by the previous run
+                yield EngineChunk(index, outputs, block_id=block_id, context=rows)
+            else:
+                options = send_options(plan.mandatory_inputs(index))
+                yield EngineChunk(index, outputs, options, context=rows)
+
+    def on_confirmed(chunk):
+        if chunk.transaction is not None:
+            session.confirmed(chunk.transaction)
+        runtime.ledger().write_chunk(chunk.outputs, chunk.block_id)
+        journal.confirmed(chunk.key)
+
+    def on_failed(chunk, state):
+        if chunk.transaction is not None:
+            session.failed(chunk.transaction)
+            if journal.state(chunk.key)[1] is None:
+                # on_submitted failed: record the block ID, or the chunk is sent twice
+                journal.submitted(chunk.key, chunk.transaction)
+        journal.not_confirmed(chunk.key, state)
+
+    engine = AsyncEngine(
+        session,
+        runtime.client,
+        on_confirmed,
+        on_failed,
+        before_send=lambda chunk: journal.planned(chunk.key, *chunk.context),
+        on_submitted=lambda chunk: journal.submitted(chunk.key, chunk.transaction),
+        window=window,
+    )
+    try:
+        engine.run(chunks())
+    except InsufficientBalance as e:
+        logger.info(f"Stopping the program: {e}")
+
+
+def get_transaction_status(pending_transactions, outputs, on_failed=None):
     """Gets the transaction status and returns the block ID and shimmer receiver address."""
     logger.debug(pending_transactions)
     # Loop through each pending transaction
@@ -195,214 +576,218 @@ def get_transaction_status(pending_transactions, outputs):
             # Get the blockId for this transaction
             block_id = tx["blockId"]
             logger.info(f"Block ID: {block_id}")
-            # Do something with the blockId
-            check_transaction_confirm(block_id, outputs)
+            return check_transaction_confirm(block_id, outputs, on_failed)
 
-    return block_id
 
+def check_transaction_confirm(block_id, outputs, on_failed=None):
+    """Wait until the transaction of ``block_id`` is included or has failed.
 
-def check_transaction_confirm(block_id, outputs):
-    """Checks whether the transaction has been confirmed by the ledger and waits until it has been."""
+    Returns the ID of the block that was included, which differs from ``block_id`` if
+    the block had to be reattached, or ``None`` if the transaction is conflicting or
+    could not be included; ``on_failed`` is then called with the state of the block.
+    """
     logger.debug(f"block_id: {block_id}")
+    logger.info("Checking transaction status...")
+    tracked = runtime.tracker().track(block_id)
+    if tracked.wait() != INCLUDED:
+        logger.info(f"Transaction was not confirmed: {tracked.state}")
+        if on_failed is not None:
+            on_failed(tracked.state)
+        return None
 
-    # Loop until the transaction has been confirmed
-    while True:
-        # Get the ledger inclusion state for the block
-        ledger_inclusion_state = client.get_block_metadata(block_id).get(
-            "ledgerInclusionState"
-        )
-        logger.info("Checking transaction status...")
-        logger.debug(f"Ledger inclusion state: {ledger_inclusion_state}")
-
-        if ledger_inclusion_state is not None:
-            # Transaction has been confirmed
-            logger.info("Transaction has been confirmed.")
-            for item in outputs:
-                address = item["address"]
-                write_to_csv(address, shimmer_smr_token_amount, block_id)
-            return block_id
-        else:
-            # Wait for 10 seconds before checking again
-            time.sleep(10)
-
-
-def get_max_chunk_size(account_status):
-    global shimmer_smr_token_amount
+    logger.info("Transaction has been confirmed.")
+    runtime.ledger().write_chunk(outputs, tracked.block_id)
+    return tracked.block_id
 
-    available_balance = int(account_status["baseCoin"]["available"])
-    max_chunk_size = available_balance // int(shimmer_smr_token_amount)
-    return max_chunk_size
 
+def send_options(inputs):
+    """Return the transaction options that make the wallet spend ``inputs``.
 
-def check_enough_balance(account_status):
+    They also carry the remainder strategy of ``SHIMMER_REMAINDER``.
     """
-    Checks whether the account has enough balance to send the tokens.
+    options = {}
+    if inputs:
+        options["mandatoryInputs"] = inputs
+    remainder = remainder_option(runtime.config.shimmer_remainder)
+    if remainder is not None:
+        options["remainderValueStrategy"] = remainder
+    return options or None
+
+
+def send_smr_tokens(outputs, on_submitted=None, inputs=None, on_failed=None):
+    """Sends SMR tokens to a chunk of addresses.
+
+    Returns the transaction once it is confirmed, ``None`` if it could not be sent.
+    ``on_submitted`` is called with the transaction as soon as it has been sent,
+    ``on_failed`` with the state of its block if it was not confirmed, and
+    ``inputs`` are the outputs the plan assigned to the chunk. Raises
+    ``InsufficientBalance`` if the account cannot pay for the chunk.
     """
-    global shimmer_smr_token_amount
-    global chunk_size
-
-    available_balance = int(account_status["baseCoin"]["available"])
-    required_balance = int(shimmer_smr_token_amount) * int(chunk_size)
-    logger.info(f"Required balance: {required_balance}")
-    logger.info(f"Available balance: {available_balance}")
-
-    if available_balance >= required_balance:
-        return
-    else:
-        get_max_chunk_size(account_status)
-
-        logger.info("Impossible to send")
-        raise ValueError("Not enough balance")
-
-
-def write_to_csv(shimmer_receiver_address, shimmer_smr_token_amount, block_id):
-    """Writes the transaction details to a CSV file."""
-    # assuming you have the following variables available:
-    # - address
-    # - token_amount
-    # - date_time
-    # - block_id
-
-    # construct the explorer link
-    explorer_link = f"https://explorer.shimmer.network/shimmer/block/{block_id}"
-    # Get the current date and time
-    date_time = time.strftime("%Y-%m-%d %H:%M:%S")
-
-    # create a list with the data to write to the CSV file
-    data = [
-        [shimmer_receiver_address, explorer_link, shimmer_smr_token_amount, date_time]
-    ]
-
-    # open the CSV file in 'append' mode
-    with open(shimmer_address_sent_to_filename, "a", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        # write the data to the CSV file
-        writer.writerows(data)
-        logger.info(
-            f"Transaction details appended to CSV file for address: {shimmer_receiver_address}"
-        )
-
-
-def send_smr_tokens(outputs):
-    """Sends SMR tokens to a single address."""
-    global shimmer_smr_token_amount
     logger.info("Received bulk outputs.")
-    logger.debug(f"Received bulk outputs: {outputs}")
+    # Formatted only when debug logging is on, the chunk can hold 127 outputs
+    logger.debug("Received bulk outputs: %s", outputs)
     try:
-        # Sync account with the node
-        wallet = IotaWallet(wallet_db_name, client_options, coin_type, secret_manager)
-        account = wallet.get_account(shimmer_account_name)
-        logger.info("Account retrieved")
-        address = account.addresses()
-        logger.info(f"Address: {address}")
-        balance = account.get_balance()
-        logger.info(f"Balance: {balance}")
-        time.sleep(5)
-        account_status = account.sync()
-        logger.info("Account Synced")
-
-        # Verify if there is enough balance
-        # check_enough_balance(account_status, shimmer_receiver_address)
-        check_enough_balance(account_status)
-
-        # Set the Stronghold password
-        wallet.set_stronghold_password(stronghold_password)
+        # The session is opened and synced once for the whole run
+        session = runtime.session()
 
         # Define the output transaction
-        logger.debug(f"Shimmer amount: {shimmer_smr_token_amount}")
-        logger.debug(f"Outputs: {outputs}")
-
-        try:
-            # Send the transaction with the defined outputs
-            account.send_amount(outputs)
-            logger.info("Transaction sent")
-            pending_transactions = account.pending_transactions()
-            logger.debug(f"Pending transactions: {pending_transactions}")
-            get_transaction_status(pending_transactions, outputs)
-
-        except Exception:
-            logger.info(traceback.format_exc())
-        return
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Chunk amount: {sum(int(o['amount']) for o in outputs)}")
+        logger.debug("Outputs: %s", outputs)
+
+        # Send the transaction with the defined outputs
+        transaction = session.send_amount(outputs, send_options(inputs))
+        logger.info("Transaction sent")
+        if on_submitted is not None:
+            on_submitted(transaction)
+        if get_transaction_status([transaction], outputs, on_failed) is None:
+            session.failed(transaction)
+            return
+        session.confirmed(transaction)
+        return transaction
 
-    except ValueError as e:  # Catch the raised ValueError
-        logger.info(f"Stopping the program: {e}")  # Add a log message
-        sys.exit(1)  # Stop the program
+    except InsufficientBalance:
+        raise
 
     except Exception:
         logger.info(traceback.format_exc())
 
 
-####################
-# DEBUG STUFF
-####################
-
-# def consolidate_accounts():
-#     # Sync account with the node
-#     wallet = IotaWallet(wallet_db_name, client_options, coin_type, secret_manager)
-#     #account = wallet.create_account(alias="ttea", bech32_hrp="smr")
-
-#     account = wallet.get_account("TEst")
-#     #account = wallet.get_account("tea")
-#     #account = wallet.get_account("ttea")
-#     address = wallet.get_account_data("TEst")
-#     logger.debug(f"Address: {address}")
-# accounts = wallet.get_accounts()
-# logger.debug(f"Accounts: {accounts}")
-# time.sleep(15)
-# sys.exit(1)
-
-
-# account_status = account.sync()
-# logger.info("Account Synced")
-# logger.debug(f"Account status: {account_status}")
-# balance = account.get_balance()
-# logger.info(f"Balance: {balance}")
-
-# consolidate_account = account.consolidate_outputs(force=True, output_consolidation_threshold=127)
-# logger.info("Account Consolidated")
-# logger.debug(f"Account consolidation: {consolidate_account}")
-# account_status = account.sync()
-# logger.info("Account Synced")
-# logger.debug(f"Account status: {account_status}")
-# balance = account.get_balance()
-# logger.info(f"Balance: {balance}")
-
-# outputs_count = []
-# outputs = account.unspent_outputs()
-# logger.debug(f"Outputs: {outputs}")
-# outputs_list = outputs
-# for output in outputs_list:
-#     outputs_count.append(output['outputId'])
-
-# output_number = len(outputs_count)
-
-# logger.info(f"Outputs count: {output_number}")
-
-# # while outputs_count > 0:
-# consolidate_account = account.consolidate_outputs(force=True, output_consolidation_threshold=1)
-# logger.info("Account Consolidated")
-# logger.debug(f"Account consolidation: {consolidate_account}")
-
-# time.sleep(15)
-# account_status = account.sync()
-# logger.info("Account Synced")
-# logger.debug(f"Account status: {account_status}")
-# balance = account.get_balance()
-# logger.info(f"Balance: {balance}")
-# outputs = [
-#     {
-#     "address": "smr1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32kt350w",
-#     "amount": "763000000",
-#     }
-# ]
-# account.send_amount(outputs)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Send SMR tokens to the addresses listed in a CSV file."
+    )
+    parser.add_argument(
+        "--input",
+        nargs="+",
+        metavar="FILE",
+        help="CSV files or glob patterns to send together, deduplicated and packed "
+        "into shared chunks, instead of SHIMMER_ADDRESS_READ_FROM_FILENAME",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        help="Number of chunks kept in flight while waiting for confirmations "
+        f"(default 1, {ASYNC_WINDOW} with the async engine)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["sync", "async"],
+        default="sync",
+        help="Send with the asyncio engine, which overlaps reading, sending, "
+        "confirming and writing the ledger",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of accounts of the wallet sending in parallel, funded from "
+        "SHIMMER_ACCOUNT_NAME",
+    )
+    parser.add_argument(
+        "--sweep-shards",
+        action="store_true",
+        help="Only send what is left in the --shards shard accounts back to "
+        "SHIMMER_ACCOUNT_NAME, e.g. after a sharded run that stopped early",
+    )
+    parser.add_argument(
+        "--no-consolidate",
+        dest="consolidate",
+        action="store_false",
+        help="Do not consolidate the outputs of the account, even if fragmented",
+    )
+    parser.add_argument(
+        "--validate-only",
+        action="store_true",
+        help="Only verify the CSV file and report its duplicates, without opening "
+        "the wallet or contacting a node; exits with 1 if it cannot be sent",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Verify and plan the CSV file and estimate the cost and duration of "
+        "sending it, without opening Stronghold or sending anything",
+    )
+    parser.add_argument(
+        "--no-probe",
+        dest="probe",
+        action="store_false",
+        help="With --dry-run, do not contact the nodes to measure their latency",
+    )
+    parser.add_argument(
+        "--send-seconds",
+        type=float,
+        help="With --dry-run, seconds to send one block instead of the estimate",
+    )
+    parser.add_argument(
+        "--confirm-seconds",
+        type=float,
+        help="With --dry-run, seconds to confirm one block instead of the estimate",
+    )
+    parser.add_argument(
+        "--log-queue",
+        action="store_true",
+        help="Write the log from a background thread to an app.log rotated and "
+        "compressed by size, with one summary per chunk instead of the outputs of "
+        "every recipient (see --verbose)",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="With --log-queue, also log the outputs and polls of every chunk",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Save the timings and counters of the run to FILE at exit: Prometheus "
+        "text for a .prom or .txt file, a JSON summary otherwise",
+    )
+    parser.add_argument(
+        "--resend-in-doubt",
+        action="store_true",
+        help="Send again the chunks a previous run may have sent before stopping",
+    )
+    args = parser.parse_args(argv)
+    if args.shards > 1 and args.engine == "async":
+        parser.error("--shards cannot be combined with --engine async")
+    if args.sweep_shards and args.shards < 2:
+        parser.error("--sweep-shards needs the number of accounts in --shards")
+    return args
 
 
 def main():
-    if basic_checks():
-        # consolidate_accounts() # DEBUG
+    args = parse_args()
+    if args.log_queue and not args.verbose:
+        setup_logging(level=logging.INFO, queued=True)
+    else:
+        setup_logging(queued=args.log_queue)
+    if args.metrics:
+        atexit.register(metrics.write, args.metrics)
+    window = args.window or (ASYNC_WINDOW if args.engine == "async" else 1)
+    if args.validate_only or args.dry_run:
+        # The checks leave no file behind but the log
+        runtime.read_only = True
+        if not basic_checks(VALIDATE_ENV_VARS, args.input):
+            logger.info("Make sure to fill out the information in the .env file.")
+            sys.exit(1)
+        if args.validate_only:
+            sys.exit(0 if validate_list() else 1)
+        valid = dry_run(
+            window, args.shards, args.probe, args.send_seconds, args.confirm_seconds
+        )
+        sys.exit(0 if valid else 1)
+    if basic_checks(inputs=args.input):
         create_shimmer_profile()
-        send_to_list()
+        if args.sweep_shards:
+            sweep_only(args.shards)
+            return
+        send_to_list(
+            window=window,
+            resend_in_doubt=args.resend_in_doubt,
+            consolidate=args.consolidate,
+            engine=args.engine,
+            shards=args.shards,
+        )
     else:
         logger.info(
             "Make sure to fill out the information in the .env file. Rename .env.exmple to .env first."
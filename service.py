@@ -0,0 +1,655 @@
+"""Payout service: a long-running sender that takes jobs over a local HTTP API.
+
+``python service.py`` opens the wallet session once (unlocking Stronghold and syncing
+the account), keeps it warm between jobs and listens on ``127.0.0.1:--port`` or on a
+Unix socket (``--socket``). The recipients of the queued jobs are merged into shared
+blocks of up to 127 outputs: a block is sent as soon as it is full, or when its
+oldest recipient has waited ``--batch-seconds``. Up to ``--window`` blocks wait for
+their confirmation at a time and confirmed blocks are written to the sent-to ledger.
+
+The API takes and returns JSON:
+
+- ``POST /jobs`` with ``{"csv": "/path/to/file.csv"}``, read with the columns set in
+  ``.env``, or ``{"recipients": [{"address": "smr1...", "amount": "1000000"}]}``,
+  the amount defaulting to ``SHIMMER_SMR_TOKEN_AMOUNT``: queues a job and returns
+  it with ``202``, or ``400`` with the reason and the numbers of the invalid rows;
+- ``GET /jobs`` and ``GET /jobs/<id>``: the state of the jobs, their counts of sent,
+  confirmed and failed recipients and the blocks they went in;
+- ``GET /status``: balance, queued recipients and blocks in flight;
+- ``GET /metrics``: the metrics of the service in the Prometheus text format.
+
+Every request must carry ``Authorization: Bearer <SHIMMER_SERVICE_TOKEN>`` when the
+token is set, which it must be to listen on a port; without it the service only
+listens on a Unix socket that only its user can open. ``POST`` requests must be
+``application/json``, which a web page cannot send to another origin without asking
+first. CSV jobs are only read from ``SHIMMER_SERVICE_CSV_DIR``, and refused when it
+is not set.
+
+Duplicate addresses within a job follow ``SHIMMER_DUPLICATES``; the sent-to ledger
+is not checked, paying the same addresses again is what recurring payouts do. Jobs
+are kept in memory, the ledger is the record of what was paid. Every block is also
+recorded in a :class:`~job_journal.JobJournal` (``SHIMMER_SERVICE_JOURNAL_FILENAME``)
+as it is planned, sent and settled; on start, the blocks of an earlier run that were
+not seen confirmed are reported, to be checked before their jobs are posted again.
+"""
+import argparse
+import collections
+import hmac
+import itertools
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from dedup import deduplicate
+from job_journal import PLANNED, SENT, JobJournal
+from packing import apply_deposits, remainder_option
+from pipeline import PipelinedSender
+from recipients import load_recipients, recipients_from_list
+from runtime import (
+    MAINNET,
+    REQUIRED_ENV_VARS,
+    TESTNET,
+    Runtime,
+    missing_env_vars,
+    setup_logging,
+)
+
+logger = logging.getLogger()
+
+CHUNK_SIZE = 127
+DEFAULT_PORT = 8127
+BATCH_SECONDS = 2.0
+WINDOW = 4
+# The service reads its files from the API, not from SHIMMER_ADDRESS_READ_FROM_FILENAME
+SERVICE_ENV_VARS = [
+    name for name in REQUIRED_ENV_VARS if name != "SHIMMER_ADDRESS_READ_FROM_FILENAME"
+]
+
+QUEUED = "queued"
+SENDING = "sending"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+class JobRejected(ValueError):
+    """A job that cannot be sent, with the rows at fault."""
+
+    def __init__(self, message, rows=()):
+        super().__init__(message)
+        self.rows = list(rows)
+
+
+class Job:
+    """A payout job and the progress of its recipients."""
+
+    def __init__(self, job_id, source, table):
+        self.id = job_id
+        self.source = source
+        self.recipients = len(table)
+        self.amount = table.total_amount
+        self.sent = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.batches = []
+        self.errors = []
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.confirmed + self.failed == self.recipients
+
+    @property
+    def state(self):
+        if self.done:
+            return CONFIRMED if self.failed == 0 else FAILED
+        return SENDING if self.sent else QUEUED
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "source": self.source,
+            "state": self.state,
+            "recipients": self.recipients,
+            "amount": self.amount,
+            "sent": self.sent,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "blocks": [
+                {
+                    "block_id": batch.block_id,
+                    "recipients": batch.counts[self],
+                    "state": batch.state,
+                }
+                for batch in self.batches
+            ],
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class Batch:
+    """The recipients of one or more jobs sent in the same block.
+
+    ``index`` and the rows from ``first_row`` number the blocks and the recipients
+    of the service across restarts, in its journal.
+    """
+
+    def __init__(self, index, entries, first_row):
+        self.index = index
+        self.outputs = [output for _, output in entries]
+        self.rows = (first_row, first_row + len(self.outputs) - 1)
+        self.counts = collections.Counter(job for job, _ in entries)
+        self.amount = sum(int(output["amount"]) for output in self.outputs)
+        self.block_id = None
+        self.state = SENDING
+
+    def __str__(self):
+        return f"batch {self.index}"
+
+
+class PayoutService:
+    """Queue payout jobs and send them in shared blocks from one wallet session."""
+
+    def __init__(
+        self, runtime, window=WINDOW, batch_seconds=BATCH_SECONDS, chunk_size=CHUNK_SIZE
+    ):
+        self.runtime = runtime
+        self.window = window
+        self.batch_seconds = batch_seconds
+        self.chunk_size = chunk_size
+        self.jobs = {}
+        self.session = None
+        self.sender = None
+        self.journal = None
+        self.in_doubt = []
+        remainder = remainder_option(runtime.config.shimmer_remainder)
+        self._options = (
+            None if remainder is None else {"remainderValueStrategy": remainder}
+        )
+        self._job_ids = itertools.count(1)
+        self._batch_ids = None
+        self._next_row = 0
+        # Threads waiting for the blocks of the senders stopped by an error
+        self._retired = []
+        # (queued at, job, output) of the recipients waiting for a block
+        self._pending = collections.deque()
+        self._pending_amount = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        """Open and sync the wallet session and start sending queued jobs."""
+        self.session = self.runtime.session()
+        self.journal = JobJournal(
+            self.runtime.config.service_journal_filename,
+            [],
+            self.chunk_size,
+            {"service": "payout"},
+        )
+        last_batch, last_row = self.journal.last_recorded()
+        self._batch_ids = itertools.count(last_batch + 1)
+        self._next_row = last_row + 1
+        self.in_doubt = []
+        for batch in range(1, last_batch + 1):
+            state, block_id = self.journal.state(batch)
+            if state == PLANNED or state in SENT:
+                self.in_doubt.append((batch, block_id))
+        if self.in_doubt:
+            logger.warning(
+                f"Blocks (batch, block ID) of an earlier run were not seen confirmed: "
+                f"{self.in_doubt}. Check them before posting their jobs again."
+            )
+        self.sender = self._new_sender()
+        self._thread = threading.Thread(
+            target=self._send_loop, name="payout-sender", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Payout service ready, {self.session.available} glow available")
+        return self
+
+    def _new_sender(self):
+        return PipelinedSender(
+            self.session,
+            self.runtime.client,
+            self._confirmed,
+            self._failed,
+            window=self.window,
+        )
+
+    def _replace_sender(self):
+        """Start a new sender after a callback error stopped the current one.
+
+        The old sender keeps tracking its blocks in flight until they are settled.
+        """
+        logger.warning(f"Restarting the sender after an error: {self.sender.error}")
+        metrics.count("sender_restarts")
+        retired = threading.Thread(
+            target=self.sender.retire, name="payout-retired-sender", daemon=True
+        )
+        retired.start()
+        self._retired.append(retired)
+        self.sender = self._new_sender()
+
+    def close(self):
+        """Stop taking jobs, send the queued recipients and wait for their blocks."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self.sender is not None:
+            self.sender.retire()
+        for thread in self._retired:
+            thread.join()
+        if self.journal is not None:
+            self.journal.close()
+
+    def submit_csv(self, filename):
+        """Queue the recipients of a CSV file and return the :class:`Job`.
+
+        The file must be in ``SHIMMER_SERVICE_CSV_DIR``.
+        """
+        config = self.runtime.config
+        if not config.shimmer_service_csv_dir:
+            raise JobRejected("CSV jobs are disabled, set SHIMMER_SERVICE_CSV_DIR")
+        directory = os.path.realpath(config.shimmer_service_csv_dir)
+        filename = os.path.realpath(os.path.join(directory, filename))
+        if os.path.commonpath([directory, filename]) != directory:
+            raise JobRejected(f"CSV files are only read from {directory}")
+        table, validation = load_recipients(
+            filename,
+            self.runtime.validate_addresses,
+            default_amount=config.shimmer_smr_token_amount,
+            amount_column=config.shimmer_amount_column,
+            tag_column=config.shimmer_tag_column,
+            token_id_column=config.shimmer_native_token_id_column,
+            token_amount_column=config.shimmer_native_token_amount_column,
+        )
+        return self._submit(f"csv:{filename}", table, validation)
+
+    def submit_recipients(self, items):
+        """Queue a list of ``{"address": ..., "amount": ...}`` and return the :class:`Job`."""
+        table, validation = recipients_from_list(
+            items,
+            self.runtime.validate_addresses,
+            self.runtime.config.shimmer_smr_token_amount,
+        )
+        return self._submit("recipients", table, validation)
+
+    def _submit(self, source, table, validation):
+        if not validation.is_valid:
+            raise JobRejected(
+                f"{validation.invalid_count} invalid rows", validation.invalid_rows
+            )
+        if not len(table):
+            raise JobRejected("No recipients")
+        table, report = deduplicate(table, self.runtime.config.shimmer_duplicates)
+        if report.rejected:
+            raise JobRejected(f"Duplicates rejected: {report.summary()}", report.rows)
+        table, deposits = apply_deposits(
+            table, self.runtime.config.shimmer_below_deposit
+        )
+        if deposits.rejected:
+            raise JobRejected(deposits.summary(), deposits.rows)
+
+        outputs = table.outputs(0, len(table))
+        with self._condition:
+            if self._closed:
+                raise JobRejected("The service is stopping")
+            required = self._pending_amount + table.total_amount
+            if self.session.available < required:
+                raise JobRejected(
+                    f"Not enough balance: {required} glow queued, "
+                    f"{self.session.available} available"
+                )
+            job = Job(str(next(self._job_ids)), source, table)
+            self.jobs[job.id] = job
+            queued_at = time.monotonic()
+            self._pending.extend((queued_at, job, output) for output in outputs)
+            self._pending_amount += job.amount
+            self._condition.notify_all()
+        metrics.count("jobs_submitted")
+        logger.info(
+            f"Job {job.id} queued from {source}: {job.recipients} recipients, "
+            f"{job.amount} glow"
+        )
+        return job
+
+    def job(self, job_id):
+        """Return the state of a job as a dict, ``None`` if there is no such job."""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            return None if job is None else job.to_dict()
+
+    def job_list(self):
+        with self._condition:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def status(self):
+        with self._condition:
+            return {
+                "network": self.runtime.network.name,
+                "available": self.session.available,
+                "queued_recipients": len(self._pending),
+                "queued_amount": self._pending_amount,
+                "blocks_in_flight": self._in_flight,
+                "jobs": len(self.jobs),
+                "blocks_in_doubt": len(self.in_doubt),
+                "stopping": self._closed,
+            }
+
+    def _next_batch(self):
+        """Wait for a full block of recipients, or for the oldest to wait long enough.
+
+        Returns ``None`` once the service is closed and its queue is empty.
+        """
+        with self._condition:
+            while True:
+                if self._pending:
+                    waited = time.monotonic() - self._pending[0][0]
+                    if (
+                        len(self._pending) >= self.chunk_size
+                        or waited >= self.batch_seconds
+                        or self._closed
+                    ):
+                        break
+                    self._condition.wait(self.batch_seconds - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._condition.wait()
+            count = min(self.chunk_size, len(self._pending))
+            entries = [self._pending.popleft()[1:] for _ in range(count)]
+            batch = Batch(next(self._batch_ids), entries, self._next_row)
+            self._next_row += count
+            self._pending_amount -= batch.amount
+            return batch
+
+    def _send_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.journal.planned(batch.index, *batch.rows)
+            self._send(batch)
+
+    def _send(self, batch):
+        """Submit ``batch``, on a new sender if a callback error stopped the current one."""
+        while True:
+            if self.sender.error is not None:
+                self._replace_sender()
+            sender = self.sender
+            try:
+                sender.submit(
+                    batch.outputs,
+                    key=batch,
+                    options=self._options,
+                    on_submitted=lambda transaction: self._submitted(
+                        batch, transaction
+                    ),
+                )
+                return
+            except Exception as e:
+                if e is sender.error and batch.block_id is None:
+                    # The error of an earlier block, raised before this one was sent
+                    continue
+                logger.error(
+                    f"A block of {len(batch.outputs)} recipients could not be sent: {e}"
+                )
+                # A block sent before the error may still be included
+                self.journal.not_confirmed(batch.index)
+                sent = batch.block_id is not None
+                self._finish(batch, FAILED, f"not sent: {e}", in_flight=sent)
+                return
+
+    def _submitted(self, batch, transaction):
+        self.journal.submitted(batch.index, transaction)
+        with self._condition:
+            batch.block_id = transaction["blockId"]
+            self._in_flight += 1
+            for job, count in batch.counts.items():
+                job.sent += count
+                job.batches.append(batch)
+        logger.info(
+            f"Block {batch.block_id} sent to {len(batch.outputs)} recipients of "
+            f"{len(batch.counts)} job(s)"
+        )
+
+    def _confirmed(self, chunk):
+        self.session.confirmed(chunk.transaction)
+        self.runtime.ledger().write_chunk(chunk.outputs, chunk.block_id)
+        self.journal.confirmed(chunk.key.index)
+        # The transaction may have been included through a reattached block
+        chunk.key.block_id = chunk.block_id
+        self._finish(chunk.key, CONFIRMED, in_flight=True)
+
+    def _failed(self, chunk, state):
+        self.session.failed(chunk.transaction)
+        self.journal.not_confirmed(chunk.key.index, state)
+        self._finish(chunk.key, FAILED, f"block {chunk.block_id} is {state}", True)
+
+    def _finish(self, batch, state, error=None, in_flight=False):
+        with self._condition:
+            batch.state = state
+            if in_flight:
+                self._in_flight -= 1
+            for job, count in batch.counts.items():
+                if state == CONFIRMED:
+                    job.confirmed += count
+                else:
+                    job.failed += count
+                    job.errors.append(error)
+                if job.done:
+                    job.finished_at = time.time()
+                    logger.info(
+                        f"Job {job.id} {job.state}: {job.confirmed} recipients "
+                        f"confirmed, {job.failed} failed"
+                    )
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """The HTTP API of the :class:`PayoutService` of the server."""
+
+    def _authorized(self):
+        """Reply ``401`` and return False unless the request carries the token."""
+        token = self.server.token
+        if token is None:
+            return True
+        scheme, _, value = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            value.strip().encode(), token.encode()
+        ):
+            return True
+        self._reply(401, {"error": "Missing or wrong token"})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        service = self.server.service
+        path = self.path.rstrip("/")
+        if path == "/jobs":
+            self._reply(200, service.job_list())
+        elif path.startswith("/jobs/"):
+            job = service.job(path.rsplit("/", 1)[1])
+            if job is None:
+                self._reply(404, {"error": "No such job"})
+            else:
+                self._reply(200, job)
+        elif path == "/status":
+            self._reply(200, service.status())
+        elif path == "/metrics":
+            self._send(200, metrics.registry.prometheus(), "text/plain; version=0.0.4")
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self._reply(404, {"error": "Not found"})
+            return
+        if self.headers.get_content_type() != "application/json":
+            self._reply(415, {"error": "Expected Content-Type: application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {"error": f"Invalid JSON: {e}"})
+            return
+        service = self.server.service
+        try:
+            if isinstance(request, dict) and isinstance(request.get("csv"), str):
+                job = service.submit_csv(request["csv"])
+            elif isinstance(request, dict) and isinstance(
+                request.get("recipients"), list
+            ):
+                job = service.submit_recipients(request["recipients"])
+            else:
+                self._reply(400, {"error": 'Expected "csv" or "recipients"'})
+                return
+        except JobRejected as e:
+            # The rows are logged but not echoed, only their numbers and reasons
+            logger.info(f"Job rejected: {e}\n {e.rows}")
+            rows = [{"row": row, "reason": reason} for row, _, reason in e.rows]
+            self._reply(400, {"error": str(e), "rows": rows})
+            return
+        except OSError as e:
+            self._reply(400, {"error": f"Cannot read the file: {e.strerror}"})
+            return
+        self._reply(202, service.job(job.id))
+
+    def _reply(self, status, body):
+        self._send(status, json.dumps(body, indent=2) + "\n", "application/json")
+
+    def _send(self, status, text, content_type):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """:class:`http.server.ThreadingHTTPServer` on a Unix socket."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix socket clients have no address, the handler logs this one instead
+        request, _ = super().get_request()
+        return request, ("unix socket",)
+
+
+def create_server(service, port=DEFAULT_PORT, socket_path=None, token=None):
+    """Return the HTTP server of ``service``, on localhost or on ``socket_path``.
+
+    With a ``token``, requests without it are refused. The Unix socket is only
+    usable by the user of the service.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        umask = os.umask(0o177)
+        try:
+            server = UnixHTTPServer(socket_path, ServiceRequestHandler)
+        finally:
+            os.umask(umask)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), ServiceRequestHandler)
+    server.service = service
+    server.token = token
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a payout service that sends the jobs posted to a local API."
+    )
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port on 127.0.0.1 to listen on"
+    )
+    parser.add_argument(
+        "--socket", metavar="PATH", help="Listen on this Unix socket instead of a port"
+    )
+    parser.add_argument(
+        "--testnet", action="store_true", help="Send on the Shimmer testnet"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=WINDOW,
+        help="Number of blocks waiting for confirmation at a time",
+    )
+    parser.add_argument(
+        "--batch-seconds",
+        type=float,
+        default=BATCH_SECONDS,
+        help="Longest a recipient waits for its block to fill up before it is sent",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Also log the outputs and polls of every block",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    setup_logging(level=logging.DEBUG if args.verbose else logging.INFO, queued=True)
+    missing = missing_env_vars(SERVICE_ENV_VARS)
+    if missing:
+        logger.info(f"Make sure to fill out {', '.join(missing)} in the .env file.")
+        sys.exit(1)
+    runtime = Runtime(TESTNET if args.testnet else MAINNET)
+    if not runtime.config.config_done:
+        logger.info("Create the wallet profile with send_to_csv_array.py first.")
+        sys.exit(1)
+    token = runtime.config.shimmer_service_token
+    if not token and not args.socket:
+        logger.info(
+            "Set SHIMMER_SERVICE_TOKEN in the .env file to listen on a port, "
+            "or listen on a Unix socket with --socket."
+        )
+        sys.exit(1)
+
+    service = PayoutService(runtime, args.window, args.batch_seconds).start()
+    server = create_server(service, args.port, args.socket, token)
+    # Stop serving on SIGTERM as on Ctrl+C; shutdown() waits for serve_forever()
+    signal.signal(
+        signal.SIGTERM,
+        lambda *_: threading.Thread(target=server.shutdown, daemon=True).start(),
+    )
+    logger.info(f"Listening on {args.socket or f'http://127.0.0.1:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Stopping: sending the queued recipients")
+        server.server_close()
+        service.close()
+        runtime.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
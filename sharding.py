@@ -0,0 +1,187 @@
+"""Sharded sending over several accounts of the same wallet.
+
+The outputs of one account are spent one transaction after the other, which caps a
+run at the block rate of that account. A sharded run deals the chunks of the job
+round-robin to the main account and to shard accounts of the same mnemonic
+(``<account>-shard1``, ``<account>-shard2``...), moves to every shard the funds its
+chunks cost in one funding transaction, then lets the shards send in parallel
+threads. The confirmed chunks of every shard go to the same ledger and journal.
+
+A shard is funded with one output per chunk it keeps in flight: while a chunk waits
+for its confirmation, its remainder cannot be spent yet, so each of these outputs
+pays for every ``window``-th chunk of the shard in turn.
+
+:func:`sweep_shards` sends what is left in the shard accounts back to the main
+account, at the end of a sharded run or on its own after a run that stopped early.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from confirmation import INCLUDED
+from planner import MAX_CHUNK_SIZE, MIN_STORAGE_DEPOSIT
+from wallet_session import WalletSession
+
+logger = logging.getLogger(__name__)
+
+# The funding transaction pays every other shard and keeps a remainder
+MAX_SHARDS = MAX_CHUNK_SIZE + 1
+
+
+class FundingFailed(RuntimeError):
+    """The funding or sweeping transaction of the shards was not included."""
+
+
+def shard_account_name(account_name, index):
+    """Return the name of shard ``index``, shard 0 being the main account."""
+    return account_name if index == 0 else f"{account_name}-shard{index}"
+
+
+class Shard:
+    """One account of a sharded run and the chunks dealt to it."""
+
+    def __init__(self, index, session):
+        self.index = index
+        self.session = session
+        self.chunks = []
+        self.costs = []
+
+    @property
+    def name(self):
+        return self.session.account_name
+
+    @property
+    def cost(self):
+        return sum(self.costs)
+
+    def assign(self, chunk, cost=0):
+        self.chunks.append(chunk)
+        self.costs.append(cost)
+
+    def funding(self, lanes=1):
+        """Return the amounts of the outputs to send this shard before it starts.
+
+        A shard that holds nothing gets one output per lane of chunks sent in
+        parallel; one holding part of its cost, from an earlier run, gets the rest
+        in one output.
+        """
+        missing = self.cost - self.session.available
+        if missing <= 0:
+            return []
+        if self.session.available:
+            amounts = [missing]
+        else:
+            lanes = max(1, min(lanes, len(self.chunks)))
+            amounts = [sum(self.costs[lane::lanes]) for lane in range(lanes)]
+        # Less than a storage deposit cannot be sent as an output
+        return [max(amount, MIN_STORAGE_DEPOSIT) for amount in amounts if amount]
+
+
+def open_shards(session, count):
+    """Return ``count`` shards, the first one on the open main ``session``.
+
+    Missing shard accounts are created in the wallet of ``session``.
+    """
+    if not 1 <= count <= MAX_SHARDS:
+        raise ValueError(f"Use between 1 and {MAX_SHARDS} shards, not {count}")
+    wallet = session.wallet
+    aliases = {account["alias"] for account in wallet.get_accounts()}
+    shards = [Shard(0, session)]
+    for index in range(1, count):
+        name = shard_account_name(session.account_name, index)
+        if name not in aliases:
+            logger.info(f"Creating shard account {name}")
+            wallet.create_account(name)
+        shard_session = WalletSession(wallet, name, session.stronghold_password)
+        shards.append(Shard(index, shard_session.open()))
+    return shards
+
+
+def assign_chunks(shards, chunks):
+    """Deal ``chunks``, ``(index, cost)`` pairs in sending order, to ``shards``."""
+    for position, (index, cost) in enumerate(chunks):
+        shards[position % len(shards)].assign(index, cost)
+    for shard in shards:
+        logger.info(
+            f"Shard {shard.name}: {len(shard.chunks)} chunks for {shard.cost} glow"
+        )
+
+
+def fund_shards(shards, tracker, window=1):
+    """Send the other shards what they miss from the main account and wait for it.
+
+    Every shard gets up to ``window`` outputs. Raises ``InsufficientBalance`` if the
+    main account cannot pay for the funding and :class:`FundingFailed` if the funding
+    transaction is not included.
+    """
+    source = shards[0].session
+    # Every output of the funding transaction but the remainder goes to a shard
+    lanes = max(1, min(window, MAX_CHUNK_SIZE // max(1, len(shards) - 1)))
+    funding = [(shard, shard.funding(lanes)) for shard in shards[1:]]
+    funding = [(shard, amounts) for shard, amounts in funding if amounts]
+    if not funding:
+        logger.info("Every shard already holds the funds of its chunks")
+        return
+    outputs = [
+        {"address": shard.session.address(), "amount": str(amount)}
+        for shard, amounts in funding
+        for amount in amounts
+    ]
+    transaction = source.send_amount(outputs)
+    logger.info(
+        f"Funding {len(funding)} shards with "
+        f"{sum(int(output['amount']) for output in outputs)} glow "
+        f"in {len(outputs)} outputs, block {transaction['blockId']}"
+    )
+    tracked = tracker.track(transaction["blockId"])
+    if tracked.wait() != INCLUDED:
+        source.failed(transaction)
+        raise FundingFailed(f"Funding block {tracked.block_id} is {tracked.state}")
+    source.confirmed(transaction)
+    for shard, _ in funding:
+        shard.session.sync()
+
+
+def sweep_shards(shards, tracker):
+    """Send the whole balance of every other shard back to the main account.
+
+    Balances below a storage deposit cannot be sent and stay in their shard. Returns
+    the glow swept; raises :class:`FundingFailed` if a sweep is not included.
+    """
+    main = shards[0].session
+    swept = 0
+    for shard in shards[1:]:
+        shard.session.sync()
+        amount = shard.session.available
+        if amount < MIN_STORAGE_DEPOSIT:
+            continue
+        transaction = shard.session.send_amount(
+            [{"address": main.address(), "amount": str(amount)}]
+        )
+        logger.info(
+            f"Sweeping {amount} glow from {shard.name} back to {main.account_name}, "
+            f"block {transaction['blockId']}"
+        )
+        tracked = tracker.track(transaction["blockId"])
+        if tracked.wait() != INCLUDED:
+            shard.session.failed(transaction)
+            raise FundingFailed(f"Sweep block {tracked.block_id} is {tracked.state}")
+        shard.session.confirmed(transaction)
+        swept += amount
+    if swept:
+        main.sync()
+    return swept
+
+
+def run_shards(shards, send_shard):
+    """Call ``send_shard(shard)`` for every shard with chunks, each in its own thread.
+
+    Waits for all of them and raises the first error.
+    """
+    busy = [shard for shard in shards if shard.chunks]
+    if not busy:
+        return
+    with ThreadPoolExecutor(len(busy), "shard") as executor:
+        futures = [executor.submit(send_shard, shard) for shard in busy]
+    errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        raise errors[0]
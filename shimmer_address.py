@@ -0,0 +1,250 @@
+"""Offline validation of Shimmer bech32 addresses.
+
+Replaces the per-row ``IotaClient().is_address_valid`` round trip through the Rust
+binding. An address is valid when it is a lower or upper case bech32 string (not
+bech32m) with a known HRP, a correct checksum and a 33 byte payload made of a known
+address type byte followed by a 32 byte hash.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_CONST = 1
+BECH32M_CONST = 0x2BC830A3
+GENERATOR = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+MAX_LENGTH = 90
+CHECKSUM_LENGTH = 6
+
+# Shimmer mainnet and testnet
+HRPS = ("smr", "rms")
+ED25519_ADDRESS = 0
+ALIAS_ADDRESS = 8
+NFT_ADDRESS = 16
+ADDRESS_TYPES = (ED25519_ADDRESS, ALIAS_ADDRESS, NFT_ADDRESS)
+ADDRESS_HASH_LENGTH = 32
+# "smr1" / "rms1" followed by 53 data and 6 checksum characters
+_ADDRESS_LENGTH = 4 + ((1 + ADDRESS_HASH_LENGTH) * 8 + 4) // 5 + CHECKSUM_LENGTH
+
+# Failure reasons returned by validate_address()
+EMPTY = "empty"
+TOO_LONG = "too long"
+MIXED_CASE = "mixed case"
+NO_SEPARATOR = "missing separator"
+INVALID_CHARACTER = "invalid character"
+UNKNOWN_HRP = "unknown hrp"
+WRONG_HRP = "wrong hrp"
+BECH32M_CHECKSUM = "bech32m checksum"
+INVALID_CHECKSUM = "invalid checksum"
+INVALID_LENGTH = "invalid length"
+INVALID_PADDING = "invalid padding"
+UNKNOWN_ADDRESS_TYPE = "unknown address type"
+
+# Maps the ASCII code of every data character to its 5-bit value, 0xFF otherwise
+_VALUES = bytes(
+    CHARSET.index(chr(i)) if chr(i) in CHARSET else 0xFF for i in range(256)
+)
+
+
+def _polymod_step(checksum, value):
+    top = checksum >> 25
+    checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+    for i in range(5):
+        if (top >> i) & 1:
+            checksum ^= GENERATOR[i]
+    return checksum
+
+
+# _polymod_step() folded into one table lookup per character
+_TOP_TABLE = tuple(_polymod_step(top << 25, 0) for top in range(32))
+
+
+def _polymod(values, checksum=1):
+    table = _TOP_TABLE
+    for value in values:
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value ^ table[checksum >> 25]
+    return checksum
+
+
+def _hrp_expand(hrp):
+    return [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+
+
+# Checksum state after the expanded HRP, which is the same for every address
+_HRP_STATES = {hrp: _polymod(_hrp_expand(hrp)) for hrp in HRPS}
+
+
+def _convert_bits(data, from_bits, to_bits, pad):
+    accumulator = 0
+    bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & max_value)
+    if pad and bits:
+        result.append((accumulator << (to_bits - bits)) & max_value)
+    elif bits >= from_bits or ((accumulator << (to_bits - bits)) & max_value):
+        raise ValueError(INVALID_PADDING)
+    return bytes(result)
+
+
+def encode(hrp, payload):
+    """Encode ``payload`` (type byte + hash) as a bech32 address."""
+    data = list(_convert_bits(payload, 8, 5, pad=True))
+    checksum = _polymod(_hrp_expand(hrp) + data + [0] * CHECKSUM_LENGTH) ^ BECH32_CONST
+    data += [(checksum >> 5 * (5 - i)) & 31 for i in range(CHECKSUM_LENGTH)]
+    return hrp + "1" + "".join(CHARSET[d] for d in data)
+
+
+def decode(address):
+    """Return ``(hrp, payload)`` of a valid address, raise ``ValueError`` otherwise."""
+    reason = validate_address(address)
+    if reason is not None:
+        raise ValueError(reason)
+    address = address.lower()
+    data_start = address.rfind("1") + 1
+    data = address[data_start:-CHECKSUM_LENGTH].encode("ascii").translate(_VALUES)
+    return address[: data_start - 1], _convert_bits(data, 5, 8, pad=False)
+
+
+def validate_address(address, hrp=None):
+    """Return ``None`` if ``address`` is valid, the reason of the failure otherwise.
+
+    ``hrp`` restricts the accepted HRP, by default both ``smr`` and ``rms`` are.
+    """
+    if not address:
+        return EMPTY
+    if len(address) > MAX_LENGTH:
+        return TOO_LONG
+    lower = address.lower()
+    if lower != address and address.upper() != address:
+        return MIXED_CASE
+    separator = lower.rfind("1")
+    if separator < 1:
+        return NO_SEPARATOR
+
+    address_hrp = lower[:separator]
+    state = _HRP_STATES.get(address_hrp)
+    if state is None:
+        return UNKNOWN_HRP
+    if hrp is not None and address_hrp != hrp:
+        return WRONG_HRP
+
+    data_start = separator + 1
+    try:
+        values = lower[data_start:].encode("ascii").translate(_VALUES)
+    except UnicodeEncodeError:
+        return INVALID_CHARACTER
+    if 0xFF in values:
+        return INVALID_CHARACTER
+    if len(values) <= CHECKSUM_LENGTH:
+        return INVALID_LENGTH
+
+    checksum = _polymod(values, state)
+    if checksum == BECH32M_CONST:
+        return BECH32M_CHECKSUM
+    if checksum != BECH32_CONST:
+        return INVALID_CHECKSUM
+
+    data_length = len(values) - CHECKSUM_LENGTH
+    bits = data_length * 5
+    if bits // 8 != 1 + ADDRESS_HASH_LENGTH:
+        return INVALID_LENGTH
+    padding = bits % 8
+    if padding >= 5 or values[data_length - 1] & ((1 << padding) - 1):
+        return INVALID_PADDING
+    if ((values[0] << 3) | (values[1] >> 2)) not in ADDRESS_TYPES:
+        return UNKNOWN_ADDRESS_TYPE
+    return None
+
+
+def is_address_valid(address, hrp=None):
+    """Drop-in replacement for ``IotaClient.is_address_valid``."""
+    return validate_address(address, hrp) is None
+
+
+def _normalize(address):
+    if address is None or address != address:  # None or NaN
+        return ""
+    return str(address)
+
+
+def validate_addresses(addresses, hrp=None, cache=None):
+    """Validate a whole column of addresses at once.
+
+    ``addresses`` may be a list, a NumPy array or a pandas Series. Returns the failure
+    reason of every row (``None`` for valid ones), as a Series with the same index
+    when given a Series and as a list otherwise.
+
+    Lower case addresses of the usual length are checked together with NumPy, one
+    column of characters at a time; anything else goes through
+    :func:`validate_address`. With a :class:`validation_cache.ValidationCache`,
+    the batched addresses it knows are skipped and the new valid ones added to it.
+    """
+    strings = [_normalize(address) for address in addresses]
+    reasons = [None] * len(strings)
+
+    hrps = HRPS if hrp is None else (hrp,) if hrp in HRPS else ()
+    batches = {prefix + "1": [] for prefix in hrps}
+    for i, address in enumerate(strings):
+        batch = batches.get(address[:4])
+        if (
+            batch is not None
+            and len(address) == _ADDRESS_LENGTH
+            and address.isascii()
+            and address.islower()
+        ):
+            batch.append(i)
+        else:
+            reasons[i] = validate_address(address, hrp)
+
+    for prefix, rows in batches.items():
+        if rows and cache is not None:
+            known = cache.contains([strings[i] for i in rows]).tolist()
+            rows = [row for row, valid in zip(rows, known) if not valid]
+        if rows:
+            failed = _validate_batch(prefix[:-1], [strings[i] for i in rows])
+            for j in failed:
+                reasons[rows[j]] = validate_address(strings[rows[j]], hrp)
+            if cache is not None:
+                cache.add([strings[i] for i in rows if reasons[i] is None])
+
+    if hasattr(addresses, "index") and hasattr(addresses, "dtype"):
+        return type(addresses)(reasons, index=addresses.index, dtype=object)
+    return reasons
+
+
+def _validate_batch(hrp, addresses):
+    """Return the positions of the invalid ``addresses``, all sharing ``hrp``."""
+    data_start = len(hrp) + 1
+    data_length = _ADDRESS_LENGTH - data_start
+    raw = "".join(addresses).encode("ascii")
+    characters = np.frombuffer(raw, dtype=np.uint8).reshape(-1, _ADDRESS_LENGTH)
+    values = np.frombuffer(_VALUES, dtype=np.uint8)[characters[:, data_start:]]
+    values = values.astype(np.uint32)
+
+    checksum = np.full(len(addresses), _HRP_STATES[hrp], dtype=np.uint32)
+    table = np.array(_TOP_TABLE, dtype=np.uint32)
+    for column in range(data_length):
+        checksum = (
+            ((checksum & 0x1FFFFFF) << 5)
+            ^ (values[:, column] & 31)
+            ^ table[checksum >> 25]
+        )
+
+    payload_length = data_length - CHECKSUM_LENGTH
+    padding = payload_length * 5 % 8
+    address_type = (values[:, 0] << 3) | (values[:, 1] >> 2)
+    valid = (
+        (values != 0xFF).all(axis=1)
+        & (checksum == BECH32_CONST)
+        & ((values[:, payload_length - 1] & ((1 << padding) - 1)) == 0)
+        & np.isin(address_type, ADDRESS_TYPES)
+    )
+    return np.flatnonzero(~valid)
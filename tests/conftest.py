@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are flat files at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from confirmation import INCLUDED
+from consolidation import Consolidator, assess
+from planner import MAX_INPUTS
+
+
+def plan(*input_counts):
+    chunks = {
+        index: SimpleNamespace(inputs=[None] * count)
+        for index, count in enumerate(input_counts)
+    }
+    return SimpleNamespace(chunks=chunks)
+
+
+class FakeSession:
+    """An account whose outputs are merged eight into one by every consolidation."""
+
+    def __init__(self, outputs):
+        self.unspent = [None] * outputs
+        self.pending = 0
+
+    def consolidate(self, threshold):
+        if len(self.unspent) - self.pending < threshold:
+            raise RuntimeError("Not enough outputs to consolidate")
+        merged = min(8, len(self.unspent) - self.pending)
+        self.pending += merged - 1
+        return {"blockId": f"0x{self.pending:064x}"}
+
+    def sync(self):
+        self.unspent = [None] * (len(self.unspent) - self.pending)
+        self.pending = 0
+
+
+class FakeTracker:
+    def track(self, block_id):
+        return SimpleNamespace(wait=lambda: INCLUDED)
+
+
+def test_assess():
+    assert not assess(plan(3, 16)).needed
+    assert assess(plan(3, 17)).over_target == 1
+    assessment = assess(plan(MAX_INPUTS + 1, 17))
+    assert assessment.over_limit == 1
+    assert assessment.reason == f"1 chunks need more than {MAX_INPUTS} inputs"
+
+
+def test_consolidates_until_the_plan_no_longer_needs_it():
+    session = FakeSession(200)
+    consolidator = Consolidator(
+        session, FakeTracker(), lambda: plan(len(session.unspent)), parallel=2
+    )
+
+    result = consolidator.run(plan(200))
+
+    assert not assess(result).needed
+    assert len(session.unspent) <= 16
+
+
+def test_no_consolidation_when_not_needed():
+    session = FakeSession(10)
+    consolidator = Consolidator(session, FakeTracker(), lambda: plan(10))
+
+    consolidator.run(plan(10))
+
+    assert consolidator.rounds == 0
+    assert len(session.unspent) == 10
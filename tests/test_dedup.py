@@ -0,0 +1,43 @@
+from dedup import ALLOW, KEEP_FIRST, REJECT, SKIP, deduplicate
+from recipients import recipients_from_list
+
+ADDRESSES = [
+    "rms1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32zv6w5h",
+    "rms1qpw4kcrktm2rkmmsyxj6pkp99tcxw2seufes7u6t8y0jdaepngudyj2y0gg",
+]
+
+
+def table():
+    items = [
+        {"address": ADDRESSES[0], "amount": 100000},
+        {"address": ADDRESSES[1], "amount": 200000},
+        {"address": ADDRESSES[0].upper(), "amount": 300000},
+    ]
+    table, _ = recipients_from_list(items, lambda addresses: [None] * len(addresses))
+    return table
+
+
+def test_every_row_is_sent_by_default():
+    result, report = deduplicate(table(), sent_addresses={ADDRESSES[1]})
+
+    assert not report.rejected
+    assert report.duplicate_count == 1
+    assert result.rows.tolist() == [1, 2, 3]
+
+
+def test_duplicate_policies():
+    _, report = deduplicate(table(), REJECT)
+    assert report.rejected
+
+    result, report = deduplicate(table(), KEEP_FIRST)
+    assert not report.rejected
+    assert result.rows.tolist() == [1, 2]
+
+
+def test_already_sent_policies():
+    result, report = deduplicate(table(), ALLOW, {ADDRESSES[1]}, SKIP)
+    assert report.already_sent_count == 1
+    assert result.rows.tolist() == [1, 3]
+
+    _, report = deduplicate(table(), ALLOW, {ADDRESSES[1]}, REJECT)
+    assert report.rejected
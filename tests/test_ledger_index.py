@@ -0,0 +1,42 @@
+import os
+
+from ledger import LedgerWriter
+from ledger_index import index_filename, open_index
+
+PAID = "rms1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32zv6w5h"
+UNPAID = "rms1qpw4kcrktm2rkmmsyxj6pkp99tcxw2seufes7u6t8y0jdaepngudyj2y0gg"
+
+
+def write_ledger(filename):
+    with LedgerWriter(filename) as ledger:
+        ledger.write_chunk([{"address": PAID, "amount": "1000000"}], "0x" + "0" * 64)
+
+
+def test_read_only_index_is_built_in_memory(tmp_path):
+    filename = str(tmp_path / "sent.csv")
+    write_ledger(filename)
+
+    index = open_index(filename, read_only=True)
+
+    assert index.contains([PAID.upper(), UNPAID]).tolist() == [True, False]
+    assert not os.path.exists(index_filename(filename))
+
+
+def test_read_only_index_of_no_ledger(tmp_path):
+    index = open_index(str(tmp_path / "sent.csv"), read_only=True)
+
+    assert UNPAID not in index
+    assert os.listdir(tmp_path) == []
+
+
+def test_up_to_date_index_file_is_left_as_it_is(tmp_path):
+    filename = str(tmp_path / "sent.csv")
+    write_ledger(filename)
+    open_index(filename).close()
+    stat = os.stat(index_filename(filename))
+
+    index = open_index(filename, read_only=True)
+
+    assert PAID in index
+    index.close()
+    assert os.stat(index_filename(filename)).st_mtime_ns == stat.st_mtime_ns
@@ -0,0 +1,67 @@
+import pytest
+
+from node_pool import NodePool
+
+
+class FakeClient:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.calls = 0
+
+    def get_info(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        return self.name
+
+
+def pool(*clients, **options):
+    return NodePool(
+        {client.name: client for client in clients}, probe_interval=0, **options
+    )
+
+
+def test_fails_over_in_order():
+    a, b, c = FakeClient("a", fail=True), FakeClient("b"), FakeClient("c")
+    with pool(a, b, c) as nodes:
+        assert nodes.get_info() == "b"
+    assert (a.calls, b.calls, c.calls) == (1, 1, 0)
+
+
+def test_failing_node_is_taken_out_of_rotation():
+    a, b = FakeClient("a", fail=True), FakeClient("b")
+    with pool(a, b, max_failures=2, cooldown=60) as nodes:
+        nodes.get_info()
+        nodes.get_info()
+        assert nodes.client_options() == {"nodes": ["b", "a"], "primaryNode": "b"}
+        assert nodes.get_info() == "b"
+    assert a.calls == 2
+
+
+def test_nodes_in_cooldown_are_tried_when_every_node_failed():
+    a, b = FakeClient("a"), FakeClient("b", fail=True)
+    with pool(a, b, max_failures=1, cooldown=60) as nodes:
+        a.fail = True
+        with pytest.raises(ConnectionError):
+            nodes.get_info()
+        # Both are in cooldown now, a for less time than b
+        a.fail = False
+        assert nodes.get_info() == "a"
+    assert b.calls == 1
+
+
+def test_fastest_node_is_primary():
+    a, b, c = FakeClient("a"), FakeClient("b"), FakeClient("c")
+    with pool(a, b, c) as nodes:
+        for node, latency in zip(nodes.nodes, (0.3, 0.1, 0.2)):
+            node.latency = latency
+        assert nodes.client_options() == {"nodes": ["b", "c", "a"], "primaryNode": "b"}
+        assert nodes.get_info() == "b"
+
+
+def test_all_nodes_failing_raises_the_last_error():
+    a, b = FakeClient("a", fail=True), FakeClient("b", fail=True)
+    with pool(a, b) as nodes:
+        with pytest.raises(ConnectionError, match="b is down"):
+            nodes.get_info()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from packing import ALLOW, RAISE, REJECT, apply_deposits
+from recipients import RecipientTable
+
+ADDRESSES = [
+    "rms1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32zv6w5h",
+    "rms1qpw4kcrktm2rkmmsyxj6pkp99tcxw2seufes7u6t8y0jdaepngudyj2y0gg",
+    "rms1qzdyglwh8l8m6ru90u5vufu6zgahmzen6waenh4hndvva8nxarqacvt3rpt",
+]
+
+
+def table(tokens=None):
+    return RecipientTable(
+        np.array([2, 3, 4], dtype=np.int64),
+        np.array(ADDRESSES, dtype="S"),
+        np.array([10000, 42600, 45000], dtype=np.int64),
+        tokens=tokens,
+    )
+
+
+def test_allow_sends_the_amounts_as_listed():
+    result, report = apply_deposits(table(), ALLOW)
+
+    assert not report.rejected
+    assert report.below_count == 1
+    assert report.rows == [(2, ADDRESSES[0], 10000, 42600)]
+    assert result.amounts.tolist() == [10000, 42600, 45000]
+
+
+def test_raise_tops_up_to_the_deposit():
+    result, report = apply_deposits(table(), RAISE)
+
+    assert not report.rejected
+    assert report.top_up == 32600
+    assert result.amounts.tolist() == [42600, 42600, 45000]
+
+
+def test_reject_refuses_the_job():
+    _, report = apply_deposits(table(), REJECT)
+
+    assert report.rejected
+    assert report.below_count == 1
+
+
+def test_native_tokens_raise_the_deposit():
+    tokens = (
+        np.array([b"", b"", b"0x08" + b"ab" * 37], dtype="S"),
+        np.array([0, 0, 5], dtype=np.int64),
+    )
+    result, report = apply_deposits(table(tokens), RAISE)
+
+    assert report.below_count == 2
+    assert result.amounts.tolist() == [42600, 42600, 49600]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        apply_deposits(table(), "drop")
@@ -0,0 +1,26 @@
+import numpy as np
+
+from planner import MIN_STORAGE_DEPOSIT, recipient_cost, storage_deposit
+
+
+def test_plain_output():
+    assert storage_deposit() == MIN_STORAGE_DEPOSIT == 42600
+
+
+def test_one_native_token():
+    # 38 bytes of token ID and 32 bytes of amount, at 100 glow per byte
+    assert storage_deposit(native_tokens=1) == 42600 + 7000
+
+
+def test_tag():
+    # Type and length bytes of the tag feature, then the tag
+    assert storage_deposit(tag_length=5) == 42600 + 700
+
+
+def test_arrays():
+    deposits = storage_deposit(np.array([0, 5, 0]), np.array([False, True, True]))
+    assert deposits.tolist() == [42600, 49600 + 700, 49600]
+
+
+def test_recipient_cost_is_at_least_the_deposits():
+    assert recipient_cost([1000, 100000], [42600, 49600]) == 42600 + 100000
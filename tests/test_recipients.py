@@ -0,0 +1,68 @@
+import pytest
+
+from dedup import SUM, deduplicate
+from recipients import load_recipients
+
+ADDRESSES = [
+    "rms1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32zv6w5h",
+    "rms1qpw4kcrktm2rkmmsyxj6pkp99tcxw2seufes7u6t8y0jdaepngudyj2y0gg",
+]
+
+
+def validate_addresses(addresses):
+    valid = [address.lower().startswith("rms1") for address in addresses]
+    return [None if ok else "invalid" for ok in valid]
+
+
+def write(path, text):
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def test_chunks_are_read_back_from_the_file(tmp_path):
+    filename = write(
+        tmp_path / "recipients.csv",
+        "Name,answer,amount\r\n"
+        f'"two\r\nlines",{ADDRESSES[0]},100000\r\n'
+        "bad,xyz,100000\r\n"
+        f"b,{ADDRESSES[1]},200000\r\n",
+    )
+
+    table, validation = load_recipients(filename, validate_addresses, amount_column="C")
+
+    assert validation.invalid_rows == [(3, "xyz", "invalid")]
+    assert table.rows.tolist() == [2, 4]
+    assert table.outputs(0, 2) == [
+        {"address": ADDRESSES[0], "amount": "100000"},
+        {"address": ADDRESSES[1], "amount": "200000"},
+    ]
+    assert table.outputs(1, 2) == [{"address": ADDRESSES[1], "amount": "200000"}]
+
+
+def test_summed_duplicates_are_sent_once(tmp_path):
+    filename = write(
+        tmp_path / "recipients.csv",
+        "Name,answer,amount\n"
+        f"a,{ADDRESSES[0]},100000\n"
+        f"b,{ADDRESSES[1]},200000\n"
+        f"c,{ADDRESSES[0].upper()},300000\n",
+    )
+    table, _ = load_recipients(filename, validate_addresses, amount_column="C")
+
+    table, report = deduplicate(table, SUM)
+
+    assert report.duplicate_count == 1
+    assert table.outputs(0, len(table)) == [
+        {"address": ADDRESSES[0], "amount": "400000"},
+        {"address": ADDRESSES[1], "amount": "200000"},
+    ]
+
+
+def test_a_file_changed_after_validation_is_not_read(tmp_path):
+    filename = write(tmp_path / "recipients.csv", f"Name,answer\na,{ADDRESSES[0]}\n")
+    table, _ = load_recipients(filename, validate_addresses, default_amount=100000)
+    with open(filename, "a") as file:
+        file.write(f"b,{ADDRESSES[1]}\n")
+
+    with pytest.raises(RuntimeError):
+        table.outputs(0, 1)
@@ -0,0 +1,34 @@
+import csv
+
+from reconcile import reconcile
+
+ADDRESSES = [
+    "rms1qz8vmj53g25ss2ssdm7u3ugm6ehxxepxn05fzqwltdjxu4l9jek32zv6w5h",
+    "rms1qpw4kcrktm2rkmmsyxj6pkp99tcxw2seufes7u6t8y0jdaepngudyj2y0gg",
+]
+
+
+def write(path, rows):
+    with open(path, "w", newline="") as file:
+        csv.writer(file).writerows(rows)
+    return str(path)
+
+
+def test_output_is_name_then_answer(tmp_path):
+    # The address export has the answer before the name
+    address_export = write(
+        tmp_path / "address.csv",
+        [
+            ["answer", "Id", "Name"],
+            [ADDRESSES[0], "1", "aaa"],
+            [ADDRESSES[1], "2", "bbb"],
+        ],
+    )
+    eligible_export = write(tmp_path / "eligible.csv", [["Name"], ["bbb"]])
+    output = str(tmp_path / "recipients.csv")
+
+    result = reconcile(address_export, eligible_export, output, chunksize=1)
+
+    assert result.is_valid
+    with open(output, newline="") as file:
+        assert list(csv.reader(file)) == [["Name", "answer"], ["bbb", ADDRESSES[1]]]
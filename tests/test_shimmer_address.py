@@ -0,0 +1,26 @@
+import os
+import sys
+
+from shimmer_address import validate_address, validate_addresses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+from check_address_corpus import STRICTER, load_corpus  # noqa: E402
+
+
+def test_corpus_reasons():
+    for address, expected, _ in load_corpus():
+        assert validate_address(address) == expected, address
+
+
+def test_corpus_agrees_with_binding():
+    for address, expected, binding_valid in load_corpus():
+        if expected not in STRICTER:
+            assert binding_valid == (expected is None), address
+
+
+def test_batch_matches_single():
+    addresses = [address for address, _, _ in load_corpus()]
+    assert list(validate_addresses(addresses)) == [
+        validate_address(address) for address in addresses
+    ]
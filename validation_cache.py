@@ -0,0 +1,183 @@
+"""Addresses validated by earlier runs, so that a repeat airdrop only checks new ones.
+
+The cache is a NumPy file of two rows: the keys, sorted, and for each key the number
+of the last run that used it. A key is a 64 bit hash of a lower case address, which
+starts with its HRP. It only holds valid addresses of the usual length, the
+ones :func:`shimmer_address.validate_addresses` checks in batches. The file is
+memory-mapped on first use, looked up with a binary search per batch, and rewritten
+by :meth:`ValidationCache.save` with the new addresses; past ``max_entries`` records
+the ones left unused for the most runs are evicted.
+
+A hash collision can only make an invalid address pass as a cached valid one, which
+for 64 bit keys takes billions of cached addresses to become likely. Changing
+:data:`KEY_VERSION` discards every key of older files.
+"""
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Addresses kept in the cache file, 16 bytes each
+DEFAULT_MAX_ENTRIES = 5_000_000
+# Seed of the address hash, to bump when the validation rules change
+KEY_VERSION = 1
+
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MIX = 0xBF58476D1CE4E5B9
+
+
+def hash_rows(characters, seed):
+    """Return a 64 bit hash of every row of the ``uint8`` matrix ``characters``."""
+    count, width = characters.shape
+    # Pad the rows to whole 64 bit words and mix one word of every row at a time
+    padded = np.zeros((count, -(-width // 8) * 8), dtype=np.uint8)
+    padded[:, :width] = characters
+    words = padded.view("<u8")
+    keys = np.full(count, seed << 32 | width, dtype=np.uint64)
+    for column in range(words.shape[1]):
+        keys = (keys ^ words[:, column]) * np.uint64(_MULTIPLIER)
+        keys ^= keys >> np.uint64(29)
+    keys = (keys ^ (keys >> np.uint64(32))) * np.uint64(_MIX)
+    return keys ^ (keys >> np.uint64(29))
+
+
+def hash_row(data, seed):
+    """:func:`hash_rows` of the single row of bytes ``data``."""
+    mask = 0xFFFFFFFFFFFFFFFF
+    width = len(data)
+    data = data.ljust(-(-width // 8) * 8, b"\0")
+    key = seed << 32 | width
+    for word in struct.unpack(f"<{len(data) // 8}Q", data):
+        key = ((key ^ word) * _MULTIPLIER) & mask
+        key ^= key >> 29
+    key = ((key ^ (key >> 32)) * _MIX) & mask
+    return key ^ (key >> 29)
+
+
+def address_keys(addresses):
+    """Return the 64 bit key of every address of ``addresses``, all of the same length."""
+    width = len(addresses[0])
+    raw = "".join(addresses).encode("ascii")
+    return hash_rows(np.frombuffer(raw, dtype=np.uint8).reshape(-1, width), KEY_VERSION)
+
+
+class ValidationCache:
+    """The valid addresses seen by earlier runs, in the file ``filename``.
+
+    :meth:`contains` and :meth:`add` are called by
+    :func:`shimmer_address.validate_addresses`; nothing is written before
+    :meth:`save`.
+    """
+
+    def __init__(self, filename, max_entries=DEFAULT_MAX_ENTRIES):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._keys = None
+        self._runs = None
+        self._run = 1
+        self._used = []
+        self._new = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._keys is not None:
+            return
+        self._keys = self._runs = np.zeros(0, dtype=np.uint64)
+        if not os.path.exists(self.filename):
+            return
+        try:
+            records = np.load(self.filename, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring the validation cache {self.filename}: {e}")
+            return
+        if records.dtype != np.uint64 or records.ndim != 2 or len(records) != 2:
+            logger.warning(f"Ignoring the validation cache {self.filename}: bad format")
+            return
+        self._keys, self._runs = records
+        if len(self._runs):
+            self._run = int(self._runs.max()) + 1
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._keys)
+
+    def contains(self, addresses):
+        """Return a boolean array telling which of ``addresses`` are known valid.
+
+        ``addresses`` are lower case strings of the same length.
+        """
+        found = np.zeros(len(addresses), dtype=bool)
+        with self._lock:
+            self._load()
+            if addresses and len(self._keys):
+                keys = address_keys(addresses)
+                # Sorted keys walk the file in order, much faster than random probes
+                order = np.argsort(keys)
+                positions = np.searchsorted(self._keys, keys[order])
+                positions[positions == len(self._keys)] = 0
+                hit = self._keys[positions] == keys[order]
+                found[order[hit]] = True
+                self._used.append(positions[hit])
+            hits = int(found.sum())
+            self.hits += hits
+            self.misses += len(addresses) - hits
+        metrics.count("validation_cache_hits", hits)
+        return found
+
+    def add(self, addresses):
+        """Remember ``addresses``, lower case valid addresses of the same length."""
+        if addresses:
+            keys = address_keys(addresses)
+            with self._lock:
+                self._new.append(keys)
+
+    def save(self):
+        """Write the cache with the addresses added and used since it was loaded."""
+        with self._lock:
+            if not self._new and not self._used:
+                return
+            self._load()
+            keys = np.array(self._keys)
+            runs = np.array(self._runs)
+            for positions in self._used:
+                runs[positions] = self._run
+            if self._new:
+                # np.unique, which a plain sort does faster for 64 bit keys
+                new = np.sort(np.concatenate(self._new))
+                new = new[np.concatenate(([True], new[1:] != new[:-1]))]
+                if len(keys):
+                    positions = np.searchsorted(keys, new)
+                    positions[positions == len(keys)] = 0
+                    new = new[keys[positions] != new]
+                keys = np.concatenate((keys, new))
+                runs = np.concatenate((runs, np.full(len(new), self._run, np.uint64)))
+                order = np.argsort(keys)
+                keys, runs = keys[order], runs[order]
+            evicted = len(keys) - self.max_entries
+            if evicted > 0:
+                # Keep the most recently used records, then restore the key order
+                keep = np.sort(np.argsort(runs, kind="stable")[evicted:])
+                keys, runs = keys[keep], runs[keep]
+            temporary = f"{self.filename}.tmp"
+            with open(temporary, "wb") as file:
+                np.save(file, np.stack((keys, runs)))
+            # Drop the memory map of the old file before replacing it
+            self._keys = self._runs = None
+            os.replace(temporary, self.filename)
+            self._keys, self._runs = keys, runs
+            self._run += 1
+            self._used = []
+            self._new = []
+        logger.info(
+            f"Validation cache {self.filename}: {self.hits} hits, {self.misses} "
+            f"misses, {len(keys)} addresses"
+        )
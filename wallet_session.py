@@ -0,0 +1,164 @@
+"""A long-lived wallet session shared by every chunk of a run.
+
+The wallet, the account and the Stronghold unlock are set up once in :meth:`open`.
+After that the session keeps its own view of the available balance and of the
+unspent outputs, updated from each transaction result, and only runs a full
+``account.sync()`` when that view can no longer be trusted.
+"""
+import logging
+import threading
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientBalance(ValueError):
+    """The account cannot pay for a transaction."""
+
+
+def output_options(output):
+    """Return the wallet ``OutputOptions`` of an output dict with a tag or native tokens."""
+    options = {"recipientAddress": output["address"], "amount": output["amount"]}
+    if "tag" in output:
+        options["features"] = {"tag": output["tag"]}
+    if "nativeTokens" in output:
+        options["assets"] = {"nativeTokens": output["nativeTokens"]}
+    return options
+
+
+def output_amount(output_data):
+    """Return the amount of an ``OutputData`` / ``OutputWithMetadata`` dict."""
+    return int(output_data["output"]["amount"])
+
+
+class WalletSession:
+    """Wrap an ``IotaWallet`` account and cache its balance between sends."""
+
+    def __init__(self, wallet, account_name, stronghold_password):
+        self.wallet = wallet
+        self.account_name = account_name
+        self.stronghold_password = stronghold_password
+        self.account = None
+        self.available = 0
+        self.unspent = {}
+        self.pending_remainders = {}
+        self.sync_count = 0
+        self._drifted = True
+        # Sends and confirmations may come from different threads
+        self._lock = threading.RLock()
+
+    def open(self):
+        """Load the account, unlock Stronghold and run the initial sync."""
+        if self.account is not None:
+            return self
+        self.account = self.wallet.get_account(self.account_name)
+        logger.info("Account retrieved")
+        self.wallet.set_stronghold_password(self.stronghold_password)
+        self.sync()
+        return self
+
+    def address(self):
+        """Return the first address of the account, where it can be funded."""
+        return self.account.addresses()[0]["address"]
+
+    def sync(self):
+        """Run a full account sync and rebuild the cached view from it."""
+        with self._lock:
+            return self._sync()
+
+    def _sync(self):
+        with metrics.span("sync"):
+            account_status = self.account.sync()
+        self.sync_count += 1
+        self.available = int(account_status["baseCoin"]["available"])
+        self.unspent = {
+            output["outputId"]: output for output in self.account.unspent_outputs()
+        }
+        self.pending_remainders.clear()
+        self._drifted = False
+        logger.info(f"Account Synced, available balance: {self.available}")
+        return account_status
+
+    def ensure_balance(self, required):
+        """Raise ``ValueError`` if ``required`` glow cannot be covered, syncing first if needed."""
+        with self._lock:
+            if self._drifted or self.available < required:
+                # Confirmed remainders may not have been accounted for yet
+                self._sync()
+            logger.info(f"Required balance: {required}")
+            logger.info(f"Available balance: {self.available}")
+            if self.available < required:
+                raise InsufficientBalance("Not enough balance")
+
+    def send_amount(self, outputs, options=None):
+        """Send ``outputs`` and update the cached view from the transaction.
+
+        ``options`` are the wallet transaction options, such as ``mandatoryInputs``.
+        Outputs with a ``tag`` or ``nativeTokens`` are prepared one by one and sent
+        with ``send_outputs``.
+        """
+        with self._lock:
+            self.ensure_balance(sum(int(output["amount"]) for output in outputs))
+            try:
+                with metrics.span("submit"):
+                    if any("tag" in o or "nativeTokens" in o for o in outputs):
+                        prepared = [
+                            self.account.prepare_output(output_options(output))
+                            for output in outputs
+                        ]
+                        # The amounts may have been raised to the storage deposit
+                        outputs = prepared
+                        transaction = self.account.send_outputs(prepared, options)
+                    elif options is None:
+                        transaction = self.account.send_amount(outputs)
+                    else:
+                        transaction = self.account.send_amount(outputs, options)
+            except Exception:
+                self._drifted = True
+                raise
+            metrics.count("blocks_submitted")
+            self._apply(transaction, outputs)
+            return transaction
+
+    def confirmed(self, transaction):
+        """Make the remainder of a confirmed transaction available again."""
+        with self._lock:
+            remainder = self.pending_remainders.pop(transaction["transactionId"], 0)
+            self.available += remainder
+
+    def consolidate(self, threshold):
+        """Merge unspent outputs in one transaction; the next balance check resyncs."""
+        with self._lock:
+            try:
+                return self.account.consolidate_outputs(
+                    force=True, output_consolidation_threshold=threshold
+                )
+            finally:
+                self._drifted = True
+
+    def failed(self, transaction):
+        """Forget a transaction that was not included, its inputs may be unspent again."""
+        with self._lock:
+            self.pending_remainders.pop(transaction.get("transactionId"), None)
+            self._drifted = True
+
+    def _apply(self, transaction, outputs):
+        spent = 0
+        for item in transaction.get("inputs") or []:
+            output_id = item.get("metadata", {}).get("outputId")
+            cached = self.unspent.pop(output_id, None)
+            if "output" in item:
+                spent += output_amount(item)
+            elif cached is not None:
+                spent += output_amount(cached)
+            else:
+                logger.debug(f"Input {output_id} is not in the cached outputs")
+                self._drifted = True
+        sent = sum(int(output["amount"]) for output in outputs)
+        if spent < sent:
+            # Not every input could be accounted for, fall back to a full sync
+            self._drifted = True
+            return
+        self.available -= spent
+        self.pending_remainders[transaction["transactionId"]] = spent - sent